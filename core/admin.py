@@ -1,7 +1,11 @@
 from django.contrib import admin
-from .models import Category, CloudType, Resource, Favorite, Comment, Report
+from .models import BannedTerm, Category, CloudType, Resource, Favorite, Comment, Report, Tag
 from django.urls import reverse
 from django.utils.html import format_html
+from . import bulk
+from .admin_tools import AutocompleteFilter, AutocompleteFilterMixin, EstimatedCountPaginator
+from .moderation import publish_banned_terms
+from .uploads import FILE_TOO_LARGE_MESSAGE, get_oversized_uploads
 
 
 @admin.register(Category)
@@ -20,11 +24,27 @@ class CloudTypeAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'created_at']
 
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'resource_count', 'created_at']
+    search_fields = ['name']
+    readonly_fields = ['resource_count', 'created_at']
+    ordering = ['-resource_count', 'name']
+
+
 @admin.register(Resource)
 class ResourceAdmin(admin.ModelAdmin):
     list_display = ['title', 'category', 'cloud_type', 'user', 'view_count',
                     'copy_count', 'like_count', 'collect_count', 'comment_count',
                     'report_count', 'is_approved', 'is_featured', 'created_at']
+    list_select_related = ['category', 'cloud_type', 'user']
+
+    # 大表：总数用估算值，不再额外统计全表行数
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # 上传者用自动补全，不再渲染全部用户的下拉框
+    autocomplete_fields = ['user']
 
     # 默认按创建时间倒序排列
     ordering = ['-created_at']
@@ -44,6 +64,22 @@ class ResourceAdmin(admin.ModelAdmin):
     readonly_fields = ['view_count', 'copy_count', 'like_count', 'collect_count',
                        'comment_count', 'report_count', 'created_at', 'updated_at']
 
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        oversized = get_oversized_uploads(request)
+        if not oversized:
+            return form
+
+        # 超过大小上限的截图已被上传处理器丢弃，报错而不是当作没有上传
+        class OversizedUploadForm(form):
+            def clean(self):
+                cleaned_data = super().clean()
+                for field in oversized & set(self.fields):
+                    self.add_error(field, FILE_TOO_LARGE_MESSAGE)
+                return cleaned_data
+
+        return OversizedUploadForm
+
     # 为举报数添加自定义排序链接的方法
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -68,35 +104,32 @@ class ResourceAdmin(admin.ModelAdmin):
         return qs
 
     # 批量操作：审核通过
+    # 先取出选中的ID：查询集带着列表页的筛选条件（如 ?is_approved__exact=0），更新之后再求值可能一条也选不到
     def approve_resources(self, request, queryset):
-        updated = queryset.update(is_approved=True)
+        updated = bulk.set_approval(list(queryset.values_list('id', flat=True)), True)
         self.message_user(request, f'已审核通过{updated}个资源')
 
     approve_resources.short_description = "审核通过选中资源"
 
     # 批量操作：审核拒绝
     def reject_resources(self, request, queryset):
-        updated = queryset.update(is_approved=False)
+        updated = bulk.set_approval(list(queryset.values_list('id', flat=True)), False)
         self.message_user(request, f'已拒绝{updated}个资源')
 
     reject_resources.short_description = "审核拒绝选中资源"
 
     # 批量操作：清除举报
     def clear_reports(self, request, queryset):
-        updated = queryset.update(report_count=0)
         # 同时删除举报记录
-        for resource in queryset:
-            Report.objects.filter(resource=resource).delete()
+        updated = bulk.clear_reports(queryset.values_list('id', flat=True))
         self.message_user(request, f'已清除{updated}个资源的举报记录')
 
     clear_reports.short_description = "清除选中资源的举报"
 
     # 批量操作：切换推荐状态
     def toggle_featured(self, request, queryset):
-        for resource in queryset:
-            resource.is_featured = not resource.is_featured
-            resource.save(update_fields=['is_featured'])
-        self.message_user(request, f'已切换{queryset.count()}个资源的推荐状态')
+        updated = bulk.toggle_featured(queryset.values_list('id', flat=True))
+        self.message_user(request, f'已切换{updated}个资源的推荐状态')
 
     toggle_featured.short_description = "切换推荐状态"
 
@@ -142,17 +175,33 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['user', 'resource', 'created_at']
     list_filter = ['created_at']
     search_fields = ['user__username', 'resource__title']
+    list_select_related = ['user', 'resource']
+    autocomplete_fields = ['user', 'resource']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('resource__description')
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     # 修改字段显示顺序，添加view_resource
     list_display = ['user', 'resource', 'content_preview', 'created_at', 'report_count', 'view_resource']
-    list_filter = ['created_at', 'user', 'resource']
+    # 用户和资源用自动补全筛选，不再把全部用户和资源列在侧栏
+    list_filter = ['created_at', ('user', AutocompleteFilter), ('resource', AutocompleteFilter)]
     search_fields = ['user__username', 'resource__title', 'content']
+    list_select_related = ['user', 'resource']
+    autocomplete_fields = ['user', 'resource']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     actions = ['delete_selected_comments']
     date_hierarchy = 'created_at'  # 添加日期层次导航
 
+    def get_queryset(self, request):
+        # 列表只用到资源的标题和举报数
+        return super().get_queryset(request).defer('resource__description')
+
     def content_preview(self, obj):
         """显示评论内容的前50个字符"""
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
@@ -167,15 +216,8 @@ class CommentAdmin(admin.ModelAdmin):
 
     # 添加批量删除操作
     def delete_selected_comments(self, request, queryset):
-        # 更新相关资源的评论计数
-        for comment in queryset:
-            resource = comment.resource
-            if resource.comment_count > 0:
-                resource.comment_count -= 1
-                resource.save(update_fields=['comment_count'])
-
-        count = queryset.count()
-        queryset.delete()
+        # 同时扣减相关资源的评论计数
+        count = bulk.delete_comments(queryset.values_list('id', flat=True))
         self.message_user(request, f'已删除{count}条评论')
 
     delete_selected_comments.short_description = "删除选中评论"
@@ -189,13 +231,20 @@ class CommentAdmin(admin.ModelAdmin):
 
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ['user', 'resource_link', 'resource_status', 'resource_uploader', 'created_at', 'action_buttons']
-    list_filter = ['created_at', 'user', 'resource__user']
+    list_filter = ['created_at', ('user', AutocompleteFilter), ('resource__user', AutocompleteFilter)]
+    list_select_related = ['user', 'resource', 'resource__user']
+    autocomplete_fields = ['user', 'resource']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ['user__username', 'resource__title', 'resource__user__username']
     actions = ['process_reports', 'ignore_reports', 'delete_reports_and_resources']
     date_hierarchy = 'created_at'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('resource__description')
+
     # 显示资源链接（可点击）
     def resource_link(self, obj):
         url = reverse('admin:core_resource_change', args=[obj.resource.id])
@@ -258,48 +307,24 @@ class ReportAdmin(admin.ModelAdmin):
 
     # 批量操作：处理举报（标记资源为需要审核）
     def process_reports(self, request, queryset):
-        for report in queryset:
-            report.resource.is_approved = False  # 设置为需要重新审核
-            report.resource.save(update_fields=['is_approved'])
-
-        count = queryset.count()
+        # 相关资源设置为需要重新审核
+        count, _ = bulk.process_reports(queryset.values_list('id', flat=True))
         self.message_user(request, f'已处理{count}个举报，相关资源已标记为待审核')
 
     process_reports.short_description = "处理举报（标记为待审核）"
 
     # 批量操作：忽略举报（删除举报记录）
     def ignore_reports(self, request, queryset):
-        # 更新相关资源的举报计数
-        for report in queryset:
-            resource = report.resource
-            if resource.report_count > 0:
-                resource.report_count -= 1
-                resource.save(update_fields=['report_count'])
-
-        count = queryset.count()
-        queryset.delete()
+        # 同时扣减相关资源的举报计数
+        count = bulk.ignore_reports(queryset.values_list('id', flat=True))
         self.message_user(request, f'已忽略{count}个举报')
 
     ignore_reports.short_description = "忽略举报（删除记录）"
 
     # 批量操作：删除举报并下架资源
     def delete_reports_and_resources(self, request, queryset):
-        resources_to_delete = set()
-
-        # 收集需要删除的资源
-        for report in queryset:
-            resources_to_delete.add(report.resource)
-
-        # 先删除举报记录
-        count = queryset.count()
-        queryset.delete()
-
-        # 删除相关资源
-        resource_count = 0
-        for resource in resources_to_delete:
-            resource.delete()
-            resource_count += 1
-
+        # 先删除举报记录，再删除相关资源
+        count, resource_count = bulk.delete_reports_and_resources(queryset.values_list('id', flat=True))
         self.message_user(request, f'已删除{count}个举报记录和{resource_count}个资源')
 
     delete_reports_and_resources.short_description = "删除举报并下架资源"
@@ -311,3 +336,28 @@ class ReportAdmin(admin.ModelAdmin):
         }
 
 
+@admin.register(BannedTerm)
+class BannedTermAdmin(admin.ModelAdmin):
+    list_display = ['term', 'is_active', 'created_at']
+    list_editable = ['is_active']
+    search_fields = ['term']
+    list_filter = ['is_active']
+    actions = ['enable_terms', 'disable_terms']
+
+    def _set_active(self, request, queryset, is_active):
+        # update() 不会触发信号，需要手动通知各进程重新加载
+        updated = queryset.update(is_active=is_active)
+        publish_banned_terms()
+        return updated
+
+    def enable_terms(self, request, queryset):
+        updated = self._set_active(request, queryset, True)
+        self.message_user(request, f'已启用{updated}个违禁词')
+
+    enable_terms.short_description = "启用选中的违禁词"
+
+    def disable_terms(self, request, queryset):
+        updated = self._set_active(request, queryset, False)
+        self.message_user(request, f'已停用{updated}个违禁词')
+
+    disable_terms.short_description = "停用选中的违禁词"
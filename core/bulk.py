@@ -0,0 +1,158 @@
+"""
+后台批量操作
+
+管理员在后台一次可能选中几千条资源、评论或举报。这里的每个操作都用固定条数的
+集合语句完成（条件 UPDATE、按减少量分组的计数扣减、批量 DELETE），不再逐行
+save()/delete()；选中的记录按 BULK_CHUNK_SIZE 分块，每块一个事务，避免长事务和大范围锁。
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from . import sitemap
+from .hot import refresh_hot_scores
+from .models import Comment, Report, Resource
+from .page_cache import purge_resource_pages, purge_tags, resource_tag
+from .search import InvertedIndexBackend
+from .tags import refresh_tag_counts, tag_ids_for
+
+# 每个事务处理的记录数
+BULK_CHUNK_SIZE = 1000
+
+
+def chunked(ids, size=None):
+    ids = list(ids)
+    size = size or BULK_CHUNK_SIZE
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def decrement_counters(counter, amounts):
+    """按资源扣减计数：减少量相同的资源合并成一条 UPDATE，计数不小于0"""
+    groups = defaultdict(list)
+    for resource_id, amount in amounts.items():
+        groups[amount].append(resource_id)
+    for amount, resource_ids in groups.items():
+        Resource.objects.filter(id__in=resource_ids).update(
+            **{counter: Greatest(F(counter) - amount, 0)}
+        )
+
+
+def resources_changed(resource_ids):
+    """用 update() 修改了资源的展示/审核字段后，统一刷新页面缓存、站点地图、标签和搜索索引
+
+    update() 不会触发 post_save 信号，这里按整批做一次信号处理器逐条做的事情。
+    """
+    rows = []
+    for chunk in chunked(resource_ids):
+        rows.extend(Resource.objects.filter(id__in=chunk).values_list('id', 'category_id'))
+    resource_ids = [pk for pk, _ in rows]
+
+    purge_resource_pages(resource_ids, {category_id for _, category_id in rows})
+    sitemap.invalidate(resource_ids)
+    tag_ids = set()
+    for chunk in chunked(resource_ids):
+        tag_ids |= tag_ids_for(chunk)
+    refresh_tag_counts(tag_ids)
+    for pk in resource_ids:
+        InvertedIndexBackend.publish_change(pk)
+
+
+def set_approval(resource_ids, approved):
+    """批量设置审核状态并刷新相关缓存，返回处理的资源数"""
+    resource_ids = list(resource_ids)
+    updated = 0
+    for chunk in chunked(resource_ids):
+        with transaction.atomic():
+            updated += Resource.objects.filter(id__in=chunk).update(is_approved=approved)
+    resources_changed(resource_ids)
+    return updated
+
+
+def clear_reports(resource_ids):
+    """删除资源的全部举报记录并清零举报数，返回处理的资源数"""
+    updated = 0
+    for chunk in chunked(resource_ids):
+        with transaction.atomic():
+            Report.objects.filter(resource_id__in=chunk).delete()
+            updated += Resource.objects.filter(id__in=chunk).update(report_count=0)
+    return updated
+
+
+def toggle_featured(resource_ids):
+    """用一条条件 UPDATE 翻转资源的推荐状态，返回处理的资源数"""
+    updated = 0
+    for chunk in chunked(resource_ids):
+        with transaction.atomic():
+            updated += Resource.objects.filter(id__in=chunk).update(
+                is_featured=Case(When(is_featured=True, then=Value(False)), default=Value(True))
+            )
+            transaction.on_commit(lambda ids=chunk: purge_tags(*map(resource_tag, ids)))
+    return updated
+
+
+def delete_comments(comment_ids):
+    """删除评论并按资源扣减评论数，返回删除的评论数"""
+    deleted = 0
+    for chunk in chunked(comment_ids):
+        with transaction.atomic():
+            # 锁住要删除的评论，并发删除同一条评论时不会重复扣减
+            rows = list(Comment.objects.select_for_update().filter(id__in=chunk)
+                        .values_list('id', 'resource_id'))
+            if not rows:
+                continue
+            amounts = Counter(resource_id for _, resource_id in rows)
+            Comment.objects.filter(id__in=[pk for pk, _ in rows]).delete()
+            decrement_counters('comment_count', amounts)
+            refresh_hot_scores(Resource.objects.filter(id__in=list(amounts)))
+            deleted += len(rows)
+    return deleted
+
+
+def ignore_reports(report_ids):
+    """删除举报记录并按资源扣减举报数，返回删除的举报数"""
+    deleted = 0
+    for chunk in chunked(report_ids):
+        with transaction.atomic():
+            rows = list(Report.objects.select_for_update().filter(id__in=chunk)
+                        .values_list('id', 'resource_id'))
+            if not rows:
+                continue
+            Report.objects.filter(id__in=[pk for pk, _ in rows]).delete()
+            decrement_counters('report_count', Counter(resource_id for _, resource_id in rows))
+            deleted += len(rows)
+    return deleted
+
+
+def reported_resource_ids(report_ids):
+    resource_ids = set()
+    for chunk in chunked(report_ids):
+        resource_ids.update(Report.objects.filter(id__in=chunk).values_list('resource_id', flat=True))
+    return resource_ids
+
+
+def process_reports(report_ids):
+    """把被举报的资源标记为待审核，返回 (举报数, 资源数)"""
+    report_ids = list(report_ids)
+    resource_ids = reported_resource_ids(report_ids)
+    set_approval(resource_ids, False)
+    return len(report_ids), len(resource_ids)
+
+
+def delete_reports_and_resources(report_ids):
+    """删除举报记录以及被举报的资源，返回 (举报数, 资源数)"""
+    report_ids = list(report_ids)
+    resource_ids = reported_resource_ids(report_ids)
+
+    reports = 0
+    for chunk in chunked(report_ids):
+        reports += Report.objects.filter(id__in=chunk).delete()[0]
+
+    resources = 0
+    for chunk in chunked(resource_ids):
+        with transaction.atomic():
+            # 级联删除由 Collector 按模型批量执行，信号处理器中的统计也按整批进行
+            resources += Resource.objects.filter(id__in=chunk).delete()[1].get('core.Resource', 0)
+    return reports, resources
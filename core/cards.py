@@ -0,0 +1,71 @@
+"""
+资源卡片的片段缓存
+
+首页、分类页、排行榜、搜索结果和详情页的相关资源都在反复渲染同样的资源卡片。
+每张卡片渲染后的 HTML 按 “卡片类型 + 资源ID + 版本号” 缓存，列表页一次
+``get_many`` 取回整页卡片，只渲染未命中的部分。
+
+版本号由卡片上展示的全部数据（标题、描述摘要、各项计数、分类/网盘名称等）计算得到，
+资源被编辑、计数被 F() 更新，或者分类/网盘类型改名时都会自然换成新的缓存键，
+不需要额外的失效逻辑；旧版本的缓存条目等待过期即可。
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .lookups import attach_lookups
+
+CARD_TEMPLATES = {
+    'resource': 'core/cards/resource.html',
+    'search_result': 'core/cards/search_result.html',
+    'related': 'core/cards/related.html',
+}
+
+CARD_CACHE_TTL = 24 * 60 * 60
+
+# 参与计算版本号的卡片字段
+VERSION_FIELDS = ('title', 'description_excerpt', 'view_count', 'like_count', 'copy_count', 'created_at')
+
+
+def card_version(resource):
+    """根据卡片展示的数据计算版本号"""
+    values = [getattr(resource, field, None) for field in VERSION_FIELDS]
+    values.append(resource.category.name)
+    values.append(resource.cloud_type.name)
+    return hashlib.md5(repr(values).encode()).hexdigest()[:16]
+
+
+def card_cache_key(kind, resource, extra):
+    """卡片缓存键，渲染参数（如搜索词）不同的卡片分开缓存"""
+    key = f'card:{kind}:{resource.id}:{card_version(resource)}'
+    if extra:
+        params = repr(sorted(extra.items())).encode()
+        key = f'{key}:{hashlib.md5(params).hexdigest()[:8]}'
+    return key
+
+
+def render_cards(resources, kind, **extra):
+    """批量渲染资源卡片，命中缓存的直接复用"""
+    # 分类/网盘名称来自查询缓存，资源查询不需要联表
+    resources = attach_lookups(resources)
+    if not resources:
+        return ''
+
+    keys = [card_cache_key(kind, resource, extra) for resource in resources]
+    cached = cache.get_many(keys)
+
+    template = get_template(CARD_TEMPLATES[kind])
+    rendered = {}
+    parts = []
+    for key, resource in zip(keys, resources):
+        html = cached.get(key)
+        if html is None:
+            html = template.render({'resource': resource, **extra})
+            rendered[key] = html
+        parts.append(html)
+
+    if rendered:
+        cache.set_many(rendered, CARD_CACHE_TTL)
+    return mark_safe(''.join(parts))
@@ -0,0 +1,115 @@
+"""
+资源浏览次数的写后缓冲计数器
+
+详情页每次访问只在共享计数存储（生产环境为 Redis，测试/开发环境为本地内存）
+中原子地累加待写入的增量，由 ``flush_view_counts`` 管理命令定期把增量
+用 F() 表达式批量写回 ``Resource.view_count``，避免热门资源行的读-改-写竞争和行锁。
+
+存储结构：
+- ``views:pending:<id>``  尚未写回数据库的浏览增量
+- ``views:dirty:<seq>``   有待写回增量的资源ID日志，按序号递增；与增量一样不设过期时间，
+  由写回后删除，写回长时间中断也不会丢失登记
+- ``views:dirty_seq``     日志的最新序号；``views:flushed_seq`` 为已处理到的序号
+"""
+from collections import defaultdict
+
+from django.core.cache import caches
+from django.db.models import F
+
+from .hot import refresh_hot_scores
+
+PENDING_KEY = 'views:pending:%d'
+DIRTY_KEY = 'views:dirty:%d'
+DIRTY_SEQ_KEY = 'views:dirty_seq'
+FLUSHED_SEQ_KEY = 'views:flushed_seq'
+FLUSH_LOCK_KEY = 'views:flush_lock'
+
+# 写回锁的超时时间，防止进程异常退出后锁无法释放
+FLUSH_LOCK_TTL = 5 * 60
+
+
+def get_counter_cache():
+    """获取计数器使用的缓存"""
+    return caches['counters']
+
+
+def _incr(store, key, delta=1):
+    """原子自增，键不存在时先初始化为0"""
+    try:
+        return store.incr(key, delta)
+    except ValueError:
+        store.add(key, 0, timeout=None)
+        return store.incr(key, delta)
+
+
+def _mark_dirty(store, resource_id):
+    """把资源ID追加到待写回日志"""
+    seq = _incr(store, DIRTY_SEQ_KEY)
+    store.set(DIRTY_KEY % seq, resource_id, timeout=None)
+
+
+def record_view(resource_id):
+    """记录一次浏览，返回该资源尚未写回数据库的浏览增量"""
+    store = get_counter_cache()
+    pending = _incr(store, PENDING_KEY % resource_id)
+    if pending == 1:
+        # 第一次出现待写回增量时登记到日志
+        _mark_dirty(store, resource_id)
+    return pending
+
+
+def get_pending_views(resource_ids):
+    """批量获取资源尚未写回的浏览增量，返回 {资源ID: 增量}"""
+    store = get_counter_cache()
+    keys = {PENDING_KEY % pk: pk for pk in resource_ids}
+    values = store.get_many(list(keys))
+    return {keys[key]: value for key, value in values.items() if value}
+
+
+def flush_view_counts(batch_size=500):
+    """把缓冲的浏览增量批量写回数据库，返回 (写回的资源数, 写回的浏览总数)"""
+    from .models import Resource
+
+    store = get_counter_cache()
+    if not store.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TTL):
+        # 已有其他进程在写回
+        return 0, 0
+
+    try:
+        flushed_seq = store.get(FLUSHED_SEQ_KEY, 0)
+        dirty_seq = store.get(DIRTY_SEQ_KEY, 0)
+        if dirty_seq <= flushed_seq:
+            return 0, 0
+
+        resource_count = 0
+        view_total = 0
+        for start in range(flushed_seq + 1, dirty_seq + 1, batch_size):
+            stop = min(start + batch_size, dirty_seq + 1)
+            dirty_keys = [DIRTY_KEY % seq for seq in range(start, stop)]
+            resource_ids = set(store.get_many(dirty_keys).values())
+
+            pending = get_pending_views(resource_ids)
+            by_delta = defaultdict(list)
+            for resource_id, delta in pending.items():
+                by_delta[delta].append(resource_id)
+
+            # 相同增量的资源合并为一条 UPDATE；写入数据库后才按读到的值扣减，UPDATE 失败时
+            # 增量和日志都原样保留，下次重试。期间新产生的浏览会保留在计数器中并重新登记
+            for delta, ids in by_delta.items():
+                Resource.objects.filter(id__in=ids).update(view_count=F('view_count') + delta)
+                for resource_id in ids:
+                    if store.decr(PENDING_KEY % resource_id, delta) > 0:
+                        _mark_dirty(store, resource_id)
+                view_total += delta * len(ids)
+            resource_count += len(pending)
+
+            # 浏览数变化后刷新这些资源的热度分
+            if pending:
+                refresh_hot_scores(Resource.objects.filter(id__in=list(pending)))
+
+            store.delete_many(dirty_keys)
+            store.set(FLUSHED_SEQ_KEY, stop - 1, timeout=None)
+
+        return resource_count, view_total
+    finally:
+        store.delete(FLUSH_LOCK_KEY)
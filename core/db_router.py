@@ -0,0 +1,137 @@
+"""
+主从读写分离
+
+- 所有写操作走主库（default）。
+- 用 @use_read_replica 标记的只读页面（首页、分类、搜索、详情、站点地图等）在 GET/HEAD
+  请求中从 settings.DATABASE_REPLICAS 里随机选一个只读副本读取；其他请求、后台任务
+  和管理命令的读操作仍然走主库。
+- 读写一致：一次请求中发生过写操作（点赞、评论、上传、登录等），响应会带上一个短期
+  Cookie，该客户端在 REPLICA_STICKY_SECONDS 秒内的所有读操作都回到主库，避免因为
+  复制延迟看不到自己刚写入的数据。
+- 页面缓存、站点地图缓存在失效后的复制延迟窗口内如果由副本回填，则不写入缓存，
+  见 replica_may_be_stale。
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# 写操作后把客户端固定到主库的 Cookie
+PIN_COOKIE = 'db_primary'
+# 始终从主库读取的应用（会话在登录时写入，从副本读取可能因为延迟而“掉线”）
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+class RoutingState:
+    """当前请求的路由状态"""
+
+    __slots__ = ('use_replica', 'wrote')
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    """读请求按请求状态分发到只读副本，写请求全部走主库"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return 'default'
+        replicas = get_replicas()
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本与主库是同一份数据，跨库关联是允许的
+        aliases = {'default', *get_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def replica_may_be_stale(changed_at):
+    """当前请求从只读副本读取，且数据在 changed_at（时间戳）之后的复制延迟窗口内
+
+    用于缓存回填：这种情况下读到的可能是失效前的旧数据，不应写入缓存。
+    """
+    state = _state.get()
+    return bool(state is not None and state.use_replica and get_replicas() and changed_at
+                and time.time() - changed_at < settings.REPLICA_STICKY_SECONDS)
+
+
+def use_read_replica(view):
+    """标记只读视图，GET/HEAD 请求可以从只读副本读取"""
+    view.use_read_replica = True
+    return view
+
+
+class ReplicaRoutingMiddleware:
+    """为每个请求建立路由状态，写操作后设置固定到主库的 Cookie
+
+    同时支持同步和异步调用。异步模式下 process_view 也换成协程函数，否则 Django 会用
+    sync_to_async 包装它，每个请求多一次线程切换。同步视图经 sync_to_async 执行时上下文
+    变量会被复制到执行线程中，线程中的写操作修改的是同一个 RoutingState。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._pin_to_primary(state, response)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._pin_to_primary(state, response)
+
+    def _pin_to_primary(self, state, response):
+        if state.wrote and get_replicas():
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self._route_reads(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._route_reads(request, view_func)
+
+    def _route_reads(self, request, view_func):
+        state = _state.get()
+        if (state is not None
+                and request.method in ('GET', 'HEAD')
+                and getattr(view_func, 'use_read_replica', False)
+                and PIN_COOKIE not in request.COOKIES):
+            state.use_replica = True
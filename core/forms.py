@@ -1,15 +1,19 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from .lookups import get_categories, get_cloud_types
 from .models import Resource, Category, CloudType
-from PIL import Image
-import os
+from .moderation import check_text
+from .tags import split_keywords
+from .uploads import FILE_TOO_LARGE_MESSAGE, inspect_image
 
 
 class ResourceUploadForm(forms.ModelForm):
     """资源上传表单"""
     # 截图字段，允许多个文件上传
     # 修改这一部分：
-    screenshot = forms.ImageField(
+    # 使用 FileField 而不是 ImageField：ImageField 会完整读取并校验整张图片，
+    # 这里由 clean_screenshot 只读取图片头完成校验
+    screenshot = forms.FileField(
         label='资源截图',
         required=False,
         help_text='上传资源截图（可选）'
@@ -63,13 +67,36 @@ class ResourceUploadForm(forms.ModelForm):
             'resource_url': '请输入完整的资源链接，可包含中文',
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, oversized_uploads=(), **kwargs):
         super().__init__(*args, **kwargs)
-        # 只显示激活的分类和网盘类型
+        # 超过大小上限、已被上传处理器丢弃的字段
+        self.oversized_uploads = oversized_uploads
+        # 只显示激活的分类和网盘类型；查询集只用于校验提交的值，下拉选项来自查询缓存
         self.fields['category'].queryset = Category.objects.all()
         self.fields['cloud_type'].queryset = CloudType.objects.filter(is_active=True)
-
-
+        self._set_cached_choices('category', get_categories())
+        self._set_cached_choices('cloud_type', get_cloud_types(active_only=True))
+
+    def _set_cached_choices(self, name, objects):
+        field = self.fields[name]
+        empty = [('', field.empty_label)] if field.empty_label is not None else []
+        field.choices = empty + [(obj.pk, field.label_from_instance(obj)) for obj in objects]
+
+    def clean_title(self):
+        """验证标题"""
+        title = self.cleaned_data.get('title', '').strip()
+        error = check_text(title)
+        if error:
+            raise ValidationError(error)
+        return title
+
+    def clean_description(self):
+        """验证描述（描述中允许出现链接）"""
+        description = self.cleaned_data.get('description', '')
+        error = check_text(description, allow_links=True)
+        if error:
+            raise ValidationError(error)
+        return description
 
     def clean_resource_url(self):
         """验证资源链接"""
@@ -98,7 +125,7 @@ class ResourceUploadForm(forms.ModelForm):
 
         if keywords:
             # 分割关键词并清理
-            keyword_list = [k.strip() for k in keywords.split(',') if k.strip()]
+            keyword_list = split_keywords(keywords)
 
             # 限制关键词数量
             if len(keyword_list) > 10:
@@ -112,24 +139,21 @@ class ResourceUploadForm(forms.ModelForm):
             # 重新组合为字符串
             keywords = ', '.join(keyword_list)
 
+            error = check_text(keywords)
+            if error:
+                raise ValidationError(error)
+
         return keywords
 
     def clean_screenshot(self):
-        """验证截图"""
+        """验证截图：只读取图片头判断真实格式和尺寸"""
+        if 'screenshot' in self.oversized_uploads:
+            raise ValidationError(FILE_TOO_LARGE_MESSAGE)
+
         screenshot = self.cleaned_data.get('screenshot')
 
         if screenshot:
-            # 检查文件大小
-            max_size = 5 * 1024 * 1024  # 5MB
-            if screenshot.size > max_size:
-                raise ValidationError('图片大小不能超过5MB')
-
-            # 检查文件扩展名
-            allowed_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-            import os
-            ext = os.path.splitext(screenshot.name)[1].lower()
-            if ext not in allowed_extensions:
-                raise ValidationError('只支持JPG、PNG、GIF、WebP格式的图片')
+            inspect_image(screenshot)
 
         return screenshot
 
@@ -0,0 +1,82 @@
+"""
+搜索结果的关键词高亮与摘要
+
+查询按搜索引擎的切词规则拆成检索词，编译成一个不区分大小写的正则并按查询缓存，
+同一页的所有卡片共用；描述不再整段处理，而是截取第一个命中附近的一小段。
+输出时逐段转义原文，只有高亮标签本身是安全的 HTML。
+"""
+import html
+import re
+from functools import lru_cache
+
+from django.utils.safestring import SafeData, mark_safe
+
+from .search import tokenize
+
+# 摘要长度（字符数）以及命中位置之前保留的上下文比例
+SNIPPET_LENGTH = 100
+SNIPPET_LEAD = 0.25
+ELLIPSIS = '…'
+
+HIGHLIGHT_TAG = '<span class="highlight">%s</span>'
+
+
+class Highlighter:
+    """一个查询对应的高亮器"""
+
+    def __init__(self, query):
+        # 长词在前，保证 “电影院” 优先于 “电影” 匹配
+        terms = sorted(set(tokenize(query, for_query=True)), key=len, reverse=True)
+        self.pattern = re.compile('|'.join(map(re.escape, terms)), re.IGNORECASE) if terms else None
+
+    def spans(self, text):
+        """命中区间列表，相邻或重叠的区间合并成一段"""
+        if self.pattern is None:
+            return []
+
+        spans = []
+        for match in self.pattern.finditer(text):
+            start, end = match.span()
+            if spans and start <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                spans.append([start, end])
+        return spans
+
+    def highlight(self, text, autoescape=True):
+        """转义文本并为命中的检索词加上高亮标签
+
+        逐段调用 html.escape，而不是每段都经过 Django 的 conditional_escape（惰性包装开销较大）；
+        已经是安全 HTML 的文本不再转义。
+        """
+        escape = html.escape if autoescape and not isinstance(text, SafeData) else str
+        text = str(text)
+        parts = []
+        position = 0
+        for start, end in self.spans(text):
+            parts.append(escape(text[position:start]))
+            parts.append(HIGHLIGHT_TAG % escape(text[start:end]))
+            position = end
+        parts.append(escape(text[position:]))
+        return mark_safe(''.join(parts))
+
+    def snippet(self, text, length=SNIPPET_LENGTH, autoescape=True):
+        """截取第一个命中附近的一段文本并高亮，没有命中时取开头"""
+        autoescape = autoescape and not isinstance(text, SafeData)
+        text = str(text)
+        start = 0
+        if self.pattern is not None and len(text) > length:
+            match = self.pattern.search(text)
+            if match:
+                start = max(0, min(match.start() - int(length * SNIPPET_LEAD), len(text) - length))
+
+        piece = text[start:start + length]
+        prefix = ELLIPSIS if start > 0 else ''
+        suffix = ELLIPSIS if start + length < len(text) else ''
+        return mark_safe(prefix + self.highlight(piece, autoescape) + suffix)
+
+
+@lru_cache(maxsize=256)
+def get_highlighter(query):
+    """按查询缓存编译好的高亮器"""
+    return Highlighter(query)
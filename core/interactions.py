@@ -0,0 +1,180 @@
+"""
+点赞、收藏、评论、举报等互动操作
+
+每个操作都在一个事务内完成：先用 SELECT ... FOR UPDATE 锁住资源行并读出计数，再用
+“删除/插入 + 唯一约束” 判断状态，最后用一条 UPDATE 同时写回新计数和热度分，新计数
+直接返回给前端，不再另外查询。所有操作都先锁资源行、再动关联表，加锁顺序一致，
+同一资源上的并发操作排队执行，不会因为关联表上的间隙锁互相等待而死锁；仍然遇到
+死锁或锁等待超时（OperationalError）时整个事务重试 DEADLOCK_RETRIES 次。
+
+异步视图使用 a 开头的版本：Django 的异步 ORM 还不能在事务中使用，需要事务的操作整体
+放到一次 sync_to_async 调用中执行；只有一条 UPDATE 的操作直接使用异步 ORM。
+"""
+import random
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+
+from .hot import HOT_WEIGHTS, score_for
+from .models import Comment, Favorite, Like, Report, Resource
+from .page_cache import purge_tags, resource_tag
+
+# 死锁或锁等待超时后整个事务的重试次数，以及重试前随机等待的最长时间（秒）
+DEADLOCK_RETRIES = 3
+DEADLOCK_RETRY_DELAY = 0.05
+
+
+def retry_on_deadlock(func):
+    """事务因死锁、锁等待超时失败时重试；已在外层事务中时不重试（外层事务已被回滚）"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = 0 if connection.in_atomic_block else DEADLOCK_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError:
+                if attempt == retries:
+                    raise
+                time.sleep(random.uniform(0, DEADLOCK_RETRY_DELAY))
+    return wrapper
+
+
+def lock_resource(resource_id, counter):
+    """锁住资源行并读出计数（及计算热度分所需的字段），资源不存在时抛出 Resource.DoesNotExist
+
+    需要在事务中调用，且在修改关联表之前调用，保证所有互动操作的加锁顺序一致。
+    """
+    if not connection.features.has_select_for_update:
+        # SQLite 没有行锁：先执行一条不改变数据的 UPDATE，在事务开始时就取得写锁，
+        # 避免两个事务都持有读锁后同时升级为写锁而互相等待
+        Resource.objects.filter(id=resource_id).update(**{counter: F(counter)})
+    fields = ('created_at', *HOT_WEIGHTS) if counter in HOT_WEIGHTS else (counter,)
+    return Resource.objects.select_for_update().only(*fields).get(id=resource_id)
+
+
+def bump_counter(resource, counter, delta):
+    """增减已锁住的资源的计数（不小于0），与热度分一起用一条 UPDATE 写回，返回最新值"""
+    value = max(getattr(resource, counter) + delta, 0)
+    setattr(resource, counter, value)
+    fields = {counter: value}
+    if counter in HOT_WEIGHTS:
+        fields['hot_score'] = resource.hot_score = score_for(resource)
+    Resource.objects.filter(id=resource.id).update(**fields)
+
+    # 计数展示在详情页上，提交后清除该资源的页面缓存
+    transaction.on_commit(lambda: purge_tags(resource_tag(resource.id)))
+    return value
+
+
+@retry_on_deadlock
+def toggle_relation(model, counter, user, resource_id):
+    """切换用户与资源之间的关系（点赞、收藏），返回 (切换后是否存在, 最新计数)"""
+    try:
+        with transaction.atomic():
+            resource = lock_resource(resource_id, counter)
+            forget_interaction_state(user.id, resource_id)
+            if model.objects.filter(user=user, resource_id=resource_id).delete()[0]:
+                return False, bump_counter(resource, counter, -1)
+
+            model.objects.create(user=user, resource_id=resource_id)
+            return True, bump_counter(resource, counter, 1)
+    except IntegrityError:
+        # 绕过资源行锁的写入（如管理后台）已经插入了同一条记录，本次操作整体回滚，以已存在的记录为准
+        return True, Resource.objects.values_list(counter, flat=True).get(id=resource_id)
+
+
+@retry_on_deadlock
+def add_relation(model, counter, user, resource_id):
+    """插入用户与资源之间的关系（举报），已存在时忽略，返回 (是否新插入, 最新计数)"""
+    try:
+        with transaction.atomic():
+            resource = lock_resource(resource_id, counter)
+            forget_interaction_state(user.id, resource_id)
+            model.objects.create(user=user, resource_id=resource_id)
+            return True, bump_counter(resource, counter, 1)
+    except IntegrityError:
+        return False, Resource.objects.values_list(counter, flat=True).get(id=resource_id)
+
+
+@retry_on_deadlock
+def add_comment(user, resource_id, content):
+    """新增评论，返回 (评论, 最新评论数)"""
+    with transaction.atomic():
+        resource = lock_resource(resource_id, 'comment_count')
+        comment = Comment.objects.create(user=user, resource_id=resource_id, content=content)
+        count = bump_counter(resource, 'comment_count', 1)
+    return comment, count
+
+
+async def aincrease_copy_count(resource_id):
+    """增加复制次数并返回最新值，资源不存在时抛出 Resource.DoesNotExist
+
+    复制次数不参与热度计算，一条 UPDATE 即可完成，不需要事务；读回的值可能已经包含
+    并发请求的增量，只用于展示。
+    """
+    if not await Resource.objects.filter(id=resource_id).aupdate(copy_count=F('copy_count') + 1):
+        raise Resource.DoesNotExist
+    copy_count = await Resource.objects.values_list('copy_count', flat=True).aget(id=resource_id)
+    await sync_to_async(purge_tags)(resource_tag(resource_id))
+    return copy_count
+
+
+atoggle_relation = sync_to_async(toggle_relation)
+aadd_relation = sync_to_async(add_relation)
+aadd_comment = sync_to_async(add_comment)
+
+
+@retry_on_deadlock
+def delete_comment(comment):
+    """删除评论，返回最新评论数；评论已被并发删除时不重复扣减"""
+    with transaction.atomic():
+        resource = lock_resource(comment.resource_id, 'comment_count')
+        if Comment.objects.filter(id=comment.id).delete()[0]:
+            return bump_counter(resource, 'comment_count', -1)
+        return resource.comment_count
+
+
+# 用户对资源的互动状态缓存，每个 (用户, 资源) 一个键，用户切换时精确删除
+STATE_KEY = 'istate:%d:%d'
+STATE_CACHE_TTL = 60 * 60
+STATE_MODELS = {'liked': Like, 'favorited': Favorite, 'reported': Report}
+STATE_FIELDS = tuple(STATE_MODELS)
+# 一次最多查询的资源数
+MAX_STATE_IDS = 100
+
+
+def get_interaction_states(user, resource_ids):
+    """批量获取用户对资源的点赞/收藏/举报状态，返回 {资源ID: {'liked': bool, ...}}
+
+    先读缓存，未命中的资源每张表只用一条走 (user, resource) 唯一索引的查询。
+    """
+    resource_ids = list(dict.fromkeys(resource_ids))[:MAX_STATE_IDS]
+    if not user.is_authenticated or not resource_ids:
+        return {}
+
+    keys = {STATE_KEY % (user.id, pk): pk for pk in resource_ids}
+    states = {keys[key]: dict(zip(STATE_FIELDS, value)) for key, value in cache.get_many(list(keys)).items()}
+
+    missing = [pk for pk in resource_ids if pk not in states]
+    if missing:
+        found = {
+            field: set(model.objects.filter(user=user, resource_id__in=missing)
+                       .values_list('resource_id', flat=True))
+            for field, model in STATE_MODELS.items()
+        }
+        fetched = {pk: {field: pk in found[field] for field in STATE_FIELDS} for pk in missing}
+        cache.set_many({
+            STATE_KEY % (user.id, pk): tuple(state[field] for field in STATE_FIELDS)
+            for pk, state in fetched.items()
+        }, STATE_CACHE_TTL)
+        states.update(fetched)
+    return states
+
+
+def forget_interaction_state(user_id, resource_id):
+    """用户的互动状态变化后，提交时删除对应的缓存"""
+    transaction.on_commit(lambda: cache.delete(STATE_KEY % (user_id, resource_id)))
@@ -0,0 +1,162 @@
+"""
+分类、网盘类型的查询缓存
+
+这两张表很小、很少变化，却出现在几乎每个页面上：首页的分类导航、上传表单的下拉框、
+每张资源卡片上的分类/网盘名称。整表缓存分两级：
+
+- 进程内缓存 LOCAL_TTL 秒，期间不访问共享缓存；
+- 共享缓存中的条目带有软过期时间（LOOKUP_TTL 加随机抖动，各表不会同时过期），到期后
+  只有抢到锁的一个进程重新查询数据库，其他进程继续使用旧数据；共享缓存中完全没有数据时，
+  没抢到锁的进程短暂等待锁的持有者写入结果，而不是一起查询数据库。
+
+分类、网盘类型保存或删除时立即删除缓存，事务提交后由写入方重新加载（见 core/signals.py）。
+"""
+import random
+import threading
+import time
+
+from django.core.cache import cache
+
+LOOKUP_TTL = 60 * 60
+# 软过期时间的随机抖动比例
+TTL_JITTER = 0.1
+# 进程内缓存的有效期（秒），也是其他进程看到变化的最长延迟
+LOCAL_TTL = 5
+LOCK_TIMEOUT = 10
+# 共享缓存中没有数据时等待锁持有者的最长时间和轮询间隔（秒）
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+KEY = 'lookups:%s'
+LOCK_KEY = 'lookups:%s:lock'
+
+
+def _load_categories():
+    from .models import Category
+
+    # 修改后由写入方立即重新加载，从主库读取，避免读到副本上的旧数据
+    return list(Category.objects.using('default'))
+
+
+def _load_cloud_types():
+    from .models import CloudType
+
+    return list(CloudType.objects.using('default'))
+
+
+LOADERS = {
+    'categories': _load_categories,
+    'cloud_types': _load_cloud_types,
+}
+
+# 名称 -> (数据, 进程内过期时间)
+_local = {}
+_locks = {name: threading.Lock() for name in LOADERS}
+
+
+def _remember(name, value):
+    _local[name] = (value, time.monotonic() + LOCAL_TTL)
+    return value
+
+
+def _store(name, value):
+    refresh_at = time.time() + LOOKUP_TTL * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)
+    # 条目比软过期多保留一个周期，重新加载期间其他进程仍有旧数据可用
+    cache.set(KEY % name, (value, refresh_at), LOOKUP_TTL * 2)
+    return _remember(name, value)
+
+
+def _recompute(name):
+    """抢到锁时重新加载并写入缓存，否则返回 None"""
+    if not cache.add(LOCK_KEY % name, 1, LOCK_TIMEOUT):
+        return None
+    try:
+        return _store(name, LOADERS[name]())
+    finally:
+        cache.delete(LOCK_KEY % name)
+
+
+def _fetch(name):
+    """从共享缓存读取，过期或缺失时只让一个进程重新加载"""
+    entry = cache.get(KEY % name)
+    if entry is not None:
+        value, refresh_at = entry
+        if time.time() >= refresh_at:
+            fresh = _recompute(name)
+            if fresh is not None:
+                return fresh
+        return _remember(name, value)
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while True:
+        value = _recompute(name)
+        if value is not None:
+            return value
+        if time.monotonic() >= deadline:
+            # 锁的持有者迟迟没有写入（可能已经退出），只好自己查询
+            return LOADERS[name]()
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(KEY % name)
+        if entry is not None:
+            return _remember(name, entry[0])
+
+
+def get_lookup(name):
+    local = _local.get(name)
+    if local is not None and time.monotonic() < local[1]:
+        return local[0]
+    # 同一进程内的多个线程只让一个去访问共享缓存
+    with _locks[name]:
+        local = _local.get(name)
+        if local is not None and time.monotonic() < local[1]:
+            return local[0]
+        return _fetch(name)
+
+
+def get_categories():
+    """全部分类，按默认排序"""
+    return get_lookup('categories')
+
+
+def get_cloud_types(active_only=False):
+    """全部网盘类型，active_only 时只返回激活的"""
+    cloud_types = get_lookup('cloud_types')
+    if active_only:
+        return [cloud_type for cloud_type in cloud_types if cloud_type.is_active]
+    return cloud_types
+
+
+def invalidate_lookups(*names):
+    """删除缓存，之后的读取会重新加载"""
+    for name in names:
+        _local.pop(name, None)
+    cache.delete_many([KEY % name for name in names])
+
+
+def refresh_lookups(*names):
+    """重新加载并写入缓存，不指定时刷新全部"""
+    for name in names or LOADERS:
+        _store(name, LOADERS[name]())
+
+
+def attach_lookups(resources):
+    """把缓存中的分类、网盘类型对象挂到资源上，访问 resource.category 等不再查询数据库
+
+    资源只需要加载 category_id、cloud_type_id 两列；缓存中找不到的（刚新建、其他进程
+    的缓存还没有更新）保持原样，访问时照常查询。
+    """
+    from .models import Resource
+
+    resources = list(resources)
+    if not resources:
+        return resources
+
+    for field_name, objects in (('category', get_categories()), ('cloud_type', get_cloud_types())):
+        field = Resource._meta.get_field(field_name)
+        by_id = {obj.pk: obj for obj in objects}
+        for resource in resources:
+            if not field.is_cached(resource):
+                obj = by_id.get(getattr(resource, field.attname))
+                if obj is not None:
+                    field.set_cached_value(resource, obj)
+    return resources
@@ -0,0 +1,70 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+
+from core.models import Resource
+from core.thumbnails import generate_derivatives
+
+
+def _init_worker():
+    """子进程中初始化 Django，不复用父进程的数据库连接"""
+    django.setup()
+    connections.close_all()
+
+
+def _generate(resource_id, force):
+    try:
+        return resource_id, generate_derivatives(resource_id, force=force), None
+    except Exception as exc:  # 单张图片损坏不影响其他图片
+        return resource_id, False, str(exc)
+
+
+class Command(BaseCommand):
+    help = '为已有的资源截图批量生成缩略图和 WebP 派生图，默认按 CPU 核数并行处理'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='并行进程数，为1时在当前进程中处理')
+        parser.add_argument('--force', action='store_true',
+                            help='重新生成已有派生图的截图')
+
+    def handle(self, *args, **options):
+        queryset = Resource.objects.exclude(screenshot='')
+        if not options['force']:
+            queryset = queryset.exclude(screenshot_derived=F('screenshot'))
+        resource_ids = list(queryset.order_by('id').values_list('id', flat=True))
+        if not resource_ids:
+            self.stdout.write('没有需要处理的截图')
+            return
+
+        workers = max(1, min(options['workers'], len(resource_ids)))
+        force = options['force']
+        if workers == 1:
+            results = (_generate(resource_id, force) for resource_id in resource_ids)
+            generated, failed = self._collect(results)
+        else:
+            # 子进程各自建立数据库连接，派生前关闭父进程的连接
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                chunksize = max(1, len(resource_ids) // (workers * 4))
+                results = executor.map(_generate, resource_ids, [force] * len(resource_ids),
+                                       chunksize=chunksize)
+                generated, failed = self._collect(results)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'共{len(resource_ids)}张截图，生成{generated}张，失败{failed}张（{workers}个进程）'
+        ))
+
+    def _collect(self, results):
+        generated = failed = 0
+        for resource_id, done, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f'资源{resource_id}的截图处理失败：{error}')
+            elif done:
+                generated += 1
+        return generated, failed
@@ -0,0 +1,135 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounts.models import CustomUser
+from core import bulk
+from core.models import Category, CloudType, Comment, Report, Resource
+
+
+def legacy_clear_reports(resources):
+    resources.update(report_count=0)
+    for resource in resources:
+        Report.objects.filter(resource=resource).delete()
+
+
+def legacy_toggle_featured(resources):
+    for resource in resources:
+        resource.is_featured = not resource.is_featured
+        resource.save(update_fields=['is_featured'])
+
+
+def legacy_delete_comments(comments):
+    for comment in comments:
+        resource = comment.resource
+        if resource.comment_count > 0:
+            resource.comment_count -= 1
+            resource.save(update_fields=['comment_count'])
+    comments.delete()
+
+
+def legacy_process_reports(reports):
+    for report in reports:
+        report.resource.is_approved = False
+        report.resource.save(update_fields=['is_approved'])
+
+
+def legacy_ignore_reports(reports):
+    for report in reports:
+        resource = report.resource
+        if resource.report_count > 0:
+            resource.report_count -= 1
+            resource.save(update_fields=['report_count'])
+    reports.delete()
+
+
+def legacy_delete_reports_and_resources(reports):
+    resources = {report.resource for report in reports}
+    reports.delete()
+    for resource in resources:
+        resource.delete()
+
+
+def ids(queryset):
+    return queryset.values_list('id', flat=True)
+
+
+# 操作名 -> (选中的模型, 旧实现, 新实现)
+ACTIONS = {
+    'clear_reports': (Resource, legacy_clear_reports, lambda qs: bulk.clear_reports(ids(qs))),
+    'toggle_featured': (Resource, legacy_toggle_featured, lambda qs: bulk.toggle_featured(ids(qs))),
+    'delete_selected_comments': (Comment, legacy_delete_comments, lambda qs: bulk.delete_comments(ids(qs))),
+    'process_reports': (Report, legacy_process_reports, lambda qs: bulk.process_reports(ids(qs))),
+    'ignore_reports': (Report, legacy_ignore_reports, lambda qs: bulk.ignore_reports(ids(qs))),
+    'delete_reports_and_resources': (Report, legacy_delete_reports_and_resources,
+                                     lambda qs: bulk.delete_reports_and_resources(ids(qs))),
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = '在一个最终回滚的事务中对比后台批量操作旧实现与集合语句实现的查询数和耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000',
+                            help='选中的记录数，逗号分隔')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        try:
+            with transaction.atomic():
+                self.run(sizes)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, size):
+        """创建 size 个资源，每个资源一条评论和一条举报"""
+        user = CustomUser.objects.create_user(username='benchmark-admin-actions')
+        category = Category.objects.create(name='benchmark')
+        cloud_type = CloudType.objects.create(name='benchmark')
+        resources = Resource.objects.bulk_create([
+            Resource(user=user, category=category, cloud_type=cloud_type, title=f'资源{i}',
+                     resource_url='https://pan.baidu.com/s/benchmark', comment_count=1, report_count=1)
+            for i in range(size)
+        ])
+        Comment.objects.bulk_create([Comment(user=user, resource=r, content='benchmark') for r in resources])
+        Report.objects.bulk_create([Report(user=user, resource=r) for r in resources])
+        return [r.id for r in resources]
+
+    def measure(self, size, model, action):
+        sid = transaction.savepoint()
+        try:
+            resource_ids = self.seed(size)
+            queryset = model.objects.filter(
+                **({'id__in': resource_ids} if model is Resource else {'resource_id__in': resource_ids})
+            )
+            # 用执行包装器计数，不受 connection.queries 条数上限的影响
+            executed = []
+
+            def count(execute, sql, params, many, context):
+                executed.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                action(queryset)
+                elapsed = time.perf_counter() - started
+            return len(executed), elapsed
+        finally:
+            transaction.savepoint_rollback(sid)
+
+    def run(self, sizes):
+        for name, (model, legacy, current) in ACTIONS.items():
+            self.stdout.write(name)
+            for size in sizes:
+                legacy_queries, legacy_time = self.measure(size, model, legacy)
+                current_queries, current_time = self.measure(size, model, current)
+                self.stdout.write(
+                    f'  {size:>6}条: 旧实现 {legacy_queries:>6}次查询 {legacy_time * 1000:>9.1f} ms'
+                    f' | 新实现 {current_queries:>4}次查询 {current_time * 1000:>8.1f} ms'
+                )
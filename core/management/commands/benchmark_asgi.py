@@ -0,0 +1,174 @@
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.http.request import validate_host
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from core.models import Category, CloudType, Resource
+
+# 固定的 CSRF 密钥，Cookie 与请求头相同即可通过校验
+CSRF_TOKEN = 'b' * 32
+
+# 接口名 -> 是否需要登录
+ENDPOINTS = {
+    'like_resource': True,
+    'favorite_resource': True,
+    'report_resource': True,
+    'add_comment': True,
+    'increase_copy_count': False,
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('在进程内用同样的并发客户端分别驱动 WSGI 和 ASGI 处理器，对比 JSON 互动接口的吞吐量和 p99 延迟。'
+            'WSGI 按 --threads 个工作线程处理（相当于 gunicorn gthread），ASGI 在事件循环中处理。'
+            '会在数据库中创建并在结束后删除测试数据，请在测试库上运行。')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=list(ENDPOINTS), default='like_resource')
+        parser.add_argument('--requests', type=int, default=2000, help='每种模式的请求总数')
+        parser.add_argument('--concurrency', type=int, default=200, help='同时进行的请求数')
+        parser.add_argument('--threads', type=int, default=32, help='WSGI 工作线程数')
+        parser.add_argument('--resources', type=int, default=100, help='请求分散到的资源数')
+        parser.add_argument('--host', default='localhost', help='请求的 Host，需在 ALLOWED_HOSTS 中')
+
+    def handle(self, *args, **options):
+        allowed = settings.ALLOWED_HOSTS or (['.localhost', '127.0.0.1', '[::1]'] if settings.DEBUG else [])
+        if not validate_host(options['host'], allowed):
+            raise CommandError(f'{options["host"]} 不在 ALLOWED_HOSTS 中，请用 --host 指定允许的域名')
+
+        user, resource_ids = self.seed(options['resources'])
+        try:
+            session = SessionStore()
+            session['_auth_user_id'] = str(user.pk)
+            session['_auth_user_backend'] = 'django.contrib.auth.backends.ModelBackend'
+            session['_auth_user_hash'] = user.get_session_auth_hash()
+            session.save()
+
+            endpoint = options['endpoint']
+            cookies = f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}'
+            if ENDPOINTS[endpoint]:
+                cookies += f'; {settings.SESSION_COOKIE_NAME}={session.session_key}'
+            body = 'content=benchmark'.encode() if endpoint == 'add_comment' else b''
+            paths = [reverse(f'core:{endpoint}', args=[pk]) for pk in resource_ids]
+            request = {'host': options['host'], 'cookies': cookies, 'body': body}
+
+            for name, run in (('WSGI', self.run_wsgi), ('ASGI', self.run_asgi)):
+                statuses, latencies, elapsed = asyncio.run(
+                    run(paths, request, options['requests'], options['concurrency'], options['threads'])
+                )
+                errors = sum(status != 200 for status in statuses)
+                self.stdout.write(
+                    f'{name}: {len(statuses)}个请求 {errors}个失败 | {len(statuses) / elapsed:8.1f} req/s'
+                    f' | p50 {percentile(latencies, 0.5) * 1000:7.1f} ms'
+                    f' | p99 {percentile(latencies, 0.99) * 1000:7.1f} ms'
+                )
+            session.delete()
+        finally:
+            self.cleanup(user)
+
+    def seed(self, count):
+        user = CustomUser.objects.create_user(username='benchmark-asgi')
+        category, _ = Category.objects.get_or_create(name='benchmark-asgi')
+        cloud_type, _ = CloudType.objects.get_or_create(name='benchmark-asgi')
+        resources = Resource.objects.bulk_create([
+            Resource(user=user, category=category, cloud_type=cloud_type, title=f'资源{i}',
+                     resource_url='https://pan.baidu.com/s/benchmark')
+            for i in range(count)
+        ])
+        return user, [r.id for r in resources]
+
+    def cleanup(self, user):
+        Resource.objects.filter(user=user).delete()
+        user.delete()
+        Category.objects.filter(name='benchmark-asgi').delete()
+        CloudType.objects.filter(name='benchmark-asgi').delete()
+
+    async def drive(self, paths, total, concurrency, send):
+        """concurrency 个客户端循环发送请求，返回 (状态码列表, 延迟列表, 总耗时)"""
+        statuses, latencies = [], []
+        counter = iter(range(total))
+
+        async def client():
+            for i in counter:
+                started = time.perf_counter()
+                statuses.append(await send(paths[i % len(paths)]))
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return statuses, latencies, time.perf_counter() - started
+
+    async def run_wsgi(self, paths, request, total, concurrency, threads):
+        application = get_wsgi_application()
+        loop = asyncio.get_running_loop()
+
+        def call(path):
+            environ = {
+                'REQUEST_METHOD': 'POST', 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': '',
+                'SERVER_NAME': request['host'], 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': request['host'], 'HTTP_COOKIE': request['cookies'], 'HTTP_X_CSRFTOKEN': CSRF_TOKEN,
+                'CONTENT_TYPE': 'application/x-www-form-urlencoded', 'CONTENT_LENGTH': str(len(request['body'])),
+                'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(request['body']),
+                'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            response = application(environ, lambda line, headers, exc_info=None: status.append(line))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return int(status[0].split()[0])
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return await self.drive(paths, total, concurrency,
+                                    lambda path: loop.run_in_executor(pool, call, path))
+
+    async def run_asgi(self, paths, request, total, concurrency, threads):
+        application = get_asgi_application()
+        headers = [
+            (b'host', request['host'].encode()),
+            (b'cookie', request['cookies'].encode()),
+            (b'x-csrftoken', CSRF_TOKEN.encode()),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'content-length', str(len(request['body'])).encode()),
+        ]
+
+        async def call(path):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'root_path': '', 'headers': headers, 'client': ('127.0.0.1', 0), 'server': (request['host'], 80),
+            }
+            messages = [{'type': 'http.request', 'body': request['body'], 'more_body': False}]
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # 请求体读完后客户端保持连接，直到响应结束
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            await application(scope, receive, send)
+            return status[0]
+
+        return await self.drive(paths, total, concurrency, call)
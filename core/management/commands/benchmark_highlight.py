@@ -0,0 +1,52 @@
+import random
+import re
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.utils.safestring import mark_safe
+
+from core.highlight import get_highlighter
+
+# 生成测试描述用的词表
+WORDS = ['科幻', '电影', '合集', '高清', '纪录片', '动画', '教程', 'Python', '4K', '蓝光',
+         '经典', '资源', '下载', '全集', '中字', '软件', '素材', '模板']
+
+
+def legacy_highlight(text, query):
+    """旧实现：每次调用重新构造正则，整段描述做一次替换"""
+    return mark_safe(re.sub(f'({re.escape(query)})', r'<span class="highlight">\1</span>',
+                            str(text), flags=re.IGNORECASE))
+
+
+class Command(BaseCommand):
+    help = '对比搜索结果高亮的旧实现与“检索词缓存 + 摘要截取”实现的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=12, help='每页卡片数')
+        parser.add_argument('--length', type=int, default=5000, help='每条描述的字符数')
+        parser.add_argument('--repeat', type=int, default=200, help='重复渲染的页数')
+        parser.add_argument('--query', default='科幻', help='旧实现只能整串匹配，默认用单个词便于对比')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        descriptions = []
+        for _ in range(options['cards']):
+            text = ''
+            while len(text) < options['length']:
+                text += rng.choice(WORDS) + rng.choice(['，', '。', ' ', ''])
+            descriptions.append(text[:options['length']])
+        query = options['query']
+
+        def legacy():
+            for text in descriptions:
+                legacy_highlight(text, query)
+
+        def current():
+            highlighter = get_highlighter(query)
+            for text in descriptions:
+                highlighter.snippet(text)
+
+        repeat = options['repeat']
+        for name, func in (('旧实现（整段替换）', legacy), ('新实现（摘要高亮）', current)):
+            elapsed = min(timeit.repeat(func, number=repeat, repeat=3)) / repeat
+            self.stdout.write(f'{name}: 每页 {elapsed * 1000:.3f} ms')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.sitemap import build_all
+
+
+class Command(BaseCommand):
+    help = '预先生成全部站点地图分片和索引（可在部署后或每天由定时任务执行）'
+
+    def handle(self, *args, **options):
+        count = build_all()
+        self.stdout.write(self.style.SUCCESS(f'已生成{count}个站点地图分片'))
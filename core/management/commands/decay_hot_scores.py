@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.hot import refresh_hot_scores
+
+
+class Command(BaseCommand):
+    help = '按发布时间衰减批量重算资源热度分（建议每小时由定时任务执行一次）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='每批处理的资源数')
+
+    def handle(self, *args, **options):
+        updated = refresh_hot_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已更新{updated}个资源的热度分'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import flush_view_counts
+
+
+class Command(BaseCommand):
+    help = '把缓冲的资源浏览次数批量写回数据库（建议每分钟由定时任务执行一次）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='每批处理的脏资源日志条数')
+
+    def handle(self, *args, **options):
+        resource_count, view_total = flush_view_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'已写回{resource_count}个资源的{view_total}次浏览'
+        ))
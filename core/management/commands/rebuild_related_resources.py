@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.recommend import CHUNK_SIZE, TOP_K, rebuild
+
+
+class Command(BaseCommand):
+    help = '全量计算所有资源的相关资源推荐（建议每天由定时任务执行一次）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K,
+                            help='每个资源保存的相关资源数')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='每次矩阵乘法处理的资源数')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild(k=options['top_k'], chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'已计算{count}个资源的相关资源，耗时{elapsed:.1f}秒'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core.reconcile import COUNTER_MODELS, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = '按实际的点赞/收藏/评论/举报记录校准资源计数，并输出偏差统计（可在线执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='每批处理的资源数')
+        parser.add_argument('--counter', action='append', choices=sorted(COUNTER_MODELS),
+                            help='只校准指定的计数字段，可重复指定；默认全部')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='每批之间休眠的秒数，降低对线上库的压力')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='只统计偏差，不写回数据库')
+
+    def handle(self, *args, **options):
+        scanned, stats = reconcile_counters(
+            counters=options['counter'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            sleep=options['sleep'],
+        )
+
+        for counter, drift in stats.items():
+            if not drift.rows:
+                self.stdout.write(f'{counter}: 无偏差')
+                continue
+            self.stdout.write(
+                f'{counter}: {drift.rows}个资源有偏差，偏差绝对值合计{drift.total}，'
+                f'最大偏差{drift.max_drift:+d}（资源ID {drift.max_resource_id}）'
+            )
+
+        fixed = sum(drift.rows for drift in stats.values())
+        action = '发现' if options['dry_run'] else '已修正'
+        self.stdout.write(self.style.SUCCESS(f'共扫描{scanned}个资源，{action}{fixed}处计数偏差'))
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:52
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_hot_scores(apps, schema_editor):
+    """为已有资源计算初始热度分"""
+    from core.hot import compute_hot_score
+
+    Resource = apps.get_model('core', 'Resource')
+    now = timezone.now()
+    batch = []
+    for resource in Resource.objects.only('id', 'created_at', 'view_count', 'like_count',
+                                          'collect_count', 'comment_count').iterator(chunk_size=1000):
+        resource.hot_score = compute_hot_score(resource.view_count, resource.like_count, resource.collect_count,
+                                               resource.comment_count, resource.created_at, now)
+        batch.append(resource)
+        if len(batch) >= 1000:
+            Resource.objects.bulk_update(batch, ['hot_score'])
+            batch = []
+    if batch:
+        Resource.objects.bulk_update(batch, ['hot_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_like'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='hot_score',
+            field=models.FloatField(default=0, help_text='由浏览、点赞、收藏、评论数按发布时间衰减计算', verbose_name='热度'),
+        ),
+        migrations.RunPython(backfill_hot_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_resource_hot_score'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='resource',
+            name='core_resour_created_b26772_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='resource',
+            name='core_resour_view_co_7561e5_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='resource',
+            name='core_resour_copy_co_9bf2db_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='resource',
+            name='core_resour_like_co_447a7d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['resource', '-created_at', '-id'], name='core_commen_resourc_481494_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_approved', '-created_at', '-id'], name='core_resour_is_appr_e3f24f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_approved', '-hot_score', '-id'], name='core_resour_is_appr_c73afc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_approved', '-view_count', '-id'], name='core_resour_is_appr_1c4768_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_approved', '-like_count', '-id'], name='core_resour_is_appr_fcec83_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_approved', '-collect_count', '-id'], name='core_resour_is_appr_0fd20a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_approved', '-comment_count', '-id'], name='core_resour_is_appr_1f799e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['is_approved', '-copy_count', '-id'], name='core_resour_is_appr_588a4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['category', 'is_approved', '-created_at', '-id'], name='core_resour_categor_0034f7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['category', 'is_approved', '-hot_score', '-id'], name='core_resour_categor_d239b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['category', 'is_approved', '-view_count', '-id'], name='core_resour_categor_11d696_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['category', 'is_approved', '-like_count', '-id'], name='core_resour_categor_9f8822_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['category', 'is_approved', '-copy_count', '-id'], name='core_resour_categor_413bc8_idx'),
+        ),
+    ]
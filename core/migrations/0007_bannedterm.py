@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BannedTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(help_text='不区分大小写和全角/半角', max_length=100, unique=True, verbose_name='违禁词')),
+                ('is_active', models.BooleanField(default=True, verbose_name='是否启用')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='添加时间')),
+            ],
+            options={
+                'verbose_name': '违禁词',
+                'verbose_name_plural': '违禁词',
+                'ordering': ['term'],
+            },
+        ),
+    ]
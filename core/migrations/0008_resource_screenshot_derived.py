@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_bannedterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='screenshot_derived',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='已生成派生图的截图'),
+        ),
+    ]
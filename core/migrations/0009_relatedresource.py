@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_resource_screenshot_derived'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedResource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='排名')),
+                ('score', models.FloatField(verbose_name='相似度')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='core.resource', verbose_name='相关资源')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='core.resource', verbose_name='资源')),
+            ],
+            options={
+                'verbose_name': '相关资源',
+                'verbose_name_plural': '相关资源',
+                'ordering': ['resource', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedresource',
+            constraint=models.UniqueConstraint(fields=('resource', 'rank'), name='related_resource_rank'),
+        ),
+    ]
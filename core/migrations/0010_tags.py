@@ -0,0 +1,96 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_tags(apps, schema_editor):
+    """把已有资源的关键词转换为标签，并统计各标签的已审核资源数
+
+    标签名经 parse_keywords 规范化（小写）后去重；数据库排序规则仍认为相等的名称
+    （如重音不敏感时的 “café” 与 “cafe”）由 ignore_conflicts 合并为一个标签，
+    资源数在关联建立之后按标签统计。
+    """
+    from django.db.models import Count, Q
+
+    from core.tags import parse_keywords
+
+    Resource = apps.get_model('core', 'Resource')
+    Tag = apps.get_model('core', 'Tag')
+    ResourceTag = apps.get_model('core', 'ResourceTag')
+
+    resource_names = []
+    all_names = set()
+    for resource_id, keywords in Resource.objects.values_list('id', 'keywords').iterator(chunk_size=1000):
+        names = parse_keywords(keywords)
+        resource_names.append((resource_id, names))
+        all_names.update(names)
+
+    Tag.objects.bulk_create([Tag(name=name) for name in sorted(all_names)], batch_size=1000,
+                            ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.values_list('name', 'id'))
+    for name in all_names - set(tag_ids):
+        tag_ids[name] = Tag.objects.filter(name=name).values_list('id', flat=True).get()
+
+    batch = []
+    for resource_id, names in resource_names:
+        batch.extend(ResourceTag(resource_id=resource_id, tag_id=tag_ids[name]) for name in names)
+        if len(batch) >= 1000:
+            ResourceTag.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        ResourceTag.objects.bulk_create(batch, ignore_conflicts=True)
+
+    tags = list(Tag.objects.annotate(
+        count=Count('resourcetag', filter=Q(resourcetag__resource__is_approved=True)),
+    ))
+    for tag in tags:
+        tag.resource_count = tag.count
+    Tag.objects.bulk_update(tags, ['resource_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_relatedresource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True, verbose_name='标签名称')),
+                ('resource_count', models.PositiveIntegerField(db_index=True, default=0, help_text='该标签下已审核资源的数量', verbose_name='资源数')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '标签',
+                'verbose_name_plural': '标签',
+                'ordering': ['-resource_count', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResourceTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.resource', verbose_name='资源')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.tag', verbose_name='标签')),
+            ],
+            options={
+                'verbose_name': '资源标签',
+                'verbose_name_plural': '资源标签',
+            },
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='resources', through='core.ResourceTag', to='core.tag', verbose_name='标签'),
+        ),
+        migrations.AddConstraint(
+            model_name='resourcetag',
+            constraint=models.UniqueConstraint(fields=('tag', 'resource'), name='resource_tag_unique'),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Substr
 from django.utils import timezone
 
+from .tags import TAG_FIELDS, parse_keywords
+
 
 class Category(models.Model):
     """资源分类模型"""
@@ -34,6 +38,53 @@ class CloudType(models.Model):
         return self.name
 
 
+class Tag(models.Model):
+    """资源标签，由资源的关键词同步生成"""
+    name = models.CharField(max_length=20, unique=True, verbose_name="标签名称")
+    resource_count = models.PositiveIntegerField(default=0, db_index=True, verbose_name="资源数",
+                                                 help_text="该标签下已审核资源的数量")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "标签"
+        verbose_name_plural = "标签"
+        ordering = ['-resource_count', 'name']
+
+    def __str__(self):
+        return self.name
+
+
+class ResourceQuerySet(models.QuerySet):
+    """资源查询集"""
+
+    # 列表页资源卡片用到的列；分类/网盘名称在渲染时从查询缓存中取（见 core/lookups.py）
+    CARD_FIELDS = ['id', 'title', 'category', 'cloud_type',
+                   'view_count', 'like_count', 'copy_count', 'collect_count', 'comment_count',
+                   'hot_score', 'created_at']
+    # 卡片只显示描述的开头部分
+    EXCERPT_LENGTH = 120
+    # 搜索结果在这段范围内截取命中位置附近的摘要
+    SEARCH_EXCERPT_LENGTH = 1000
+
+    def approved(self):
+        """已审核的资源
+
+        显式写成 is_approved = 1 的等值比较（SQLite 上 filter(is_approved=True) 会生成
+        WHERE is_approved），这样 (is_approved, 排序列) 组合索引才能按等值前缀使用。
+        """
+        return self.filter(is_approved=Value(True))
+
+    def for_cards(self, excerpt_length=EXCERPT_LENGTH):
+        """只加载卡片需要的列，描述只截取开头"""
+        return self.only(*self.CARD_FIELDS).annotate(
+            description_excerpt=Substr('description', 1, excerpt_length)
+        )
+
+    def for_search_results(self):
+        """搜索结果卡片：描述多取一段，供截取命中位置附近的摘要"""
+        return self.for_cards(self.SEARCH_EXCERPT_LENGTH)
+
+
 class Resource(models.Model):
     """资源模型"""
     # 基础信息
@@ -51,6 +102,11 @@ class Resource(models.Model):
     resource_url = models.CharField(max_length=500, verbose_name="资源链接")  # 改为CharField
     extract_code = models.CharField(max_length=20, blank=True, verbose_name="提取码")
     screenshot = models.ImageField(upload_to='screenshots/', blank=True, verbose_name="资源截图")
+    tags = models.ManyToManyField(Tag, through='ResourceTag', blank=True, related_name='resources',
+                                  verbose_name="标签")
+    # 已生成缩略图/WebP 派生图的截图文件名，与 screenshot 不一致时说明派生图尚未生成或已过期
+    screenshot_derived = models.CharField(max_length=100, blank=True, editable=False,
+                                          verbose_name="已生成派生图的截图")
 
     # 统计信息
     view_count = models.PositiveIntegerField(default=0, verbose_name="查看次数")
@@ -59,6 +115,8 @@ class Resource(models.Model):
     collect_count = models.PositiveIntegerField(default=0, verbose_name="收藏数")
     comment_count = models.PositiveIntegerField(default=0, verbose_name="评论数")
     report_count = models.PositiveIntegerField(default=0, verbose_name="举报数")
+    hot_score = models.FloatField(default=0, verbose_name="热度",
+                                  help_text="由浏览、点赞、收藏、评论数按发布时间衰减计算")
 
     # 状态信息
     is_approved = models.BooleanField(default=True, verbose_name="审核通过")
@@ -68,25 +126,78 @@ class Resource(models.Model):
     created_at = models.DateTimeField(default=timezone.now, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
+    objects = ResourceQuerySet.as_manager()
+
     class Meta:
         verbose_name = "资源"
         verbose_name_plural = "资源"
         ordering = ['-created_at']
+        # 公开页面都先按 is_approved（分类页还有 category）过滤，再按 (排序列, id) 倒序做游标分页，
+        # 组合索引与这些查询一一对应，保证走索引范围扫描而不是全表扫描 + 文件排序
         indexes = [
-            models.Index(fields=['-created_at']),
-            models.Index(fields=['-view_count']),
-            models.Index(fields=['-copy_count']),
-            models.Index(fields=['-like_count']),
+            # 首页、热门排行榜
+            models.Index(fields=['is_approved', '-created_at', '-id']),
+            models.Index(fields=['is_approved', '-hot_score', '-id']),
+            models.Index(fields=['is_approved', '-view_count', '-id']),
+            models.Index(fields=['is_approved', '-like_count', '-id']),
+            models.Index(fields=['is_approved', '-collect_count', '-id']),
+            models.Index(fields=['is_approved', '-comment_count', '-id']),
+            models.Index(fields=['is_approved', '-copy_count', '-id']),
+            # 分类页、详情页的相关资源
+            models.Index(fields=['category', 'is_approved', '-created_at', '-id']),
+            models.Index(fields=['category', 'is_approved', '-hot_score', '-id']),
+            models.Index(fields=['category', 'is_approved', '-view_count', '-id']),
+            models.Index(fields=['category', 'is_approved', '-like_count', '-id']),
+            models.Index(fields=['category', 'is_approved', '-copy_count', '-id']),
         ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_tag_state()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None or TAG_FIELDS.issubset(fields):
+            self.remember_tag_state()
+        elif TAG_FIELDS.intersection(fields):
+            # 只刷新了其中一个字段，另一个可能有未保存的修改，不再认为与数据库一致
+            self.__dict__.pop('_saved_tag_state', None)
+
+    def remember_tag_state(self):
+        """记下与数据库一致的关键词和审核状态，保存时据此只调整变化了的标签（见 signals.update_resource_tags）
+
+        两个字段没有都加载时不记录，保存时按原来的方式重新统计。
+        """
+        if TAG_FIELDS.issubset(self.__dict__):
+            self._saved_tag_state = (self.keywords, self.is_approved)
+        else:
+            self.__dict__.pop('_saved_tag_state', None)
+
     def get_keywords_list(self):
-        """将关键词字符串转换为列表"""
-        if self.keywords:
-            return [k.strip() for k in self.keywords.split(',')]
-        return []
+        """将关键词字符串转换为列表（与标签一一对应）"""
+        return parse_keywords(self.keywords)
+
+
+class ResourceTag(models.Model):
+    """资源与标签的关联"""
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, verbose_name="资源")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, verbose_name="标签")
+
+    class Meta:
+        verbose_name = "资源标签"
+        verbose_name_plural = "资源标签"
+        constraints = [
+            # 标签页从标签出发连接资源，(tag, resource) 同时保证不重复
+            models.UniqueConstraint(fields=['tag', 'resource'], name='resource_tag_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource_id} - {self.tag_id}"
 
 
 class Favorite(models.Model):
@@ -118,6 +229,10 @@ class Comment(models.Model):
         verbose_name = "评论"
         verbose_name_plural = "评论"
         ordering = ['-created_at']
+        indexes = [
+            # 详情页按资源取评论，按时间倒序
+            models.Index(fields=['resource', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} 评论了 {self.resource.title}"
@@ -157,3 +272,41 @@ class Like(models.Model):
         return f"{self.user.username} 点赞了 {self.resource.title}"
 
 
+
+
+class BannedTerm(models.Model):
+    """违禁词，评论和资源上传时过滤"""
+    term = models.CharField(max_length=100, unique=True, verbose_name="违禁词",
+                            help_text="不区分大小写和全角/半角")
+    is_active = models.BooleanField(default=True, verbose_name="是否启用")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="添加时间")
+
+    class Meta:
+        verbose_name = "违禁词"
+        verbose_name_plural = "违禁词"
+        ordering = ['term']
+
+    def __str__(self):
+        return self.term
+
+
+class RelatedResource(models.Model):
+    """预先计算的相关资源（按标题、关键词的内容相似度）"""
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='recommendations',
+                                 verbose_name="资源")
+    related = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='recommended_for',
+                                verbose_name="相关资源")
+    rank = models.PositiveSmallIntegerField(verbose_name="排名")
+    score = models.FloatField(verbose_name="相似度")
+
+    class Meta:
+        verbose_name = "相关资源"
+        verbose_name_plural = "相关资源"
+        ordering = ['resource', 'rank']
+        constraints = [
+            # 详情页按 (resource, rank) 读取相关资源
+            models.UniqueConstraint(fields=['resource', 'rank'], name='related_resource_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource_id} -> {self.related_id}"
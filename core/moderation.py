@@ -0,0 +1,147 @@
+"""
+评论和资源上传的内容审核
+
+违禁词由管理员在后台维护，进程内编译成 Aho-Corasick 自动机，检查一段文本只需从头
+到尾扫描一遍，耗时与文本长度成正比，与违禁词数量无关。链接和邮箱地址使用预编译的正则检测。
+
+违禁词变化后在缓存中写入新的版本号，各个 worker 进程检查文本前比对版本号，
+发现变化就重新加载词表，不需要重启服务。
+"""
+import re
+import threading
+import unicodedata
+import uuid
+from collections import deque
+
+from django.core.cache import cache
+
+VERSION_KEY = 'moderation:version'
+
+# 不允许出现在评论中的链接和邮箱地址
+LINK_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'https?://[^\s]+',
+    r'www\.[a-z0-9-]+(?:\.[a-z0-9-]+)+',
+    r'[a-z0-9._%+-]+@[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}',  # 邮箱地址
+)]
+
+LINK_MESSAGE = '内容不能包含链接或邮箱地址'
+BANNED_MESSAGE = '内容包含违禁词“%s”，请修改后重新提交'
+
+
+def normalize(text):
+    """统一全角/半角和大小写后再匹配"""
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+class AhoCorasick:
+    """多模式串匹配自动机"""
+
+    def __init__(self, terms=()):
+        # 每个状态的转移表、失败指针，以及在该状态结束的最短违禁词
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+        for term in terms:
+            self._add(term)
+        self._build()
+
+    def __len__(self):
+        return sum(1 for output in self._output if output is not None)
+
+    def _add(self, term):
+        term = normalize(term.strip())
+        if not term:
+            return
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            state = next_state
+        self._output[state] = term
+
+    def _build(self):
+        """按层序计算失败指针，并把后缀状态上的输出合并进来"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._output[next_state] is None:
+                    self._output[next_state] = self._output[self._fail[next_state]]
+
+    def search(self, text):
+        """返回文本中出现的第一个违禁词，没有则返回 None"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in normalize(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+class BannedTermFilter:
+    """违禁词过滤器，词表版本变化时自动重新加载"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._automaton = AhoCorasick()
+
+    def _sync(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(VERSION_KEY, version, timeout=None)
+            version = cache.get(VERSION_KEY, version)
+        if version == self._version:
+            return
+
+        from .models import BannedTerm
+
+        with self._lock:
+            if version != self._version:
+                terms = BannedTerm.objects.filter(is_active=True).values_list('term', flat=True)
+                self._automaton = AhoCorasick(terms)
+                self._version = version
+
+    def search(self, text):
+        self._sync()
+        return self._automaton.search(text)
+
+
+banned_terms = BannedTermFilter()
+
+
+def publish_banned_terms():
+    """违禁词变化后通知所有进程重新加载"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def contains_link(text):
+    """是否包含链接或邮箱地址（全角字符转换后再检测）"""
+    text = normalize(text)
+    return any(pattern.search(text) for pattern in LINK_PATTERNS)
+
+
+def check_text(text, allow_links=False):
+    """审核文本，通过返回 None，否则返回提示信息"""
+    if not text:
+        return None
+    if not allow_links and contains_link(text):
+        return LINK_MESSAGE
+    term = banned_terms.search(text)
+    if term is not None:
+        return BANNED_MESSAGE % term
+    return None
@@ -0,0 +1,126 @@
+"""
+匿名用户的整页缓存
+
+首页、分类页、排行榜和资源详情页的大部分流量来自未登录用户。对这些请求按
+“路径 + 相关查询参数” 缓存整页响应，并给每个缓存条目打上标签（页面上展示的资源、
+分类等）。资源保存、审核或新增评论时只需让相关标签失效，对应的页面就会在下次访问时重新渲染，
+既不用清空整个缓存，也不用等 TTL 过期。
+
+标签失效采用版本号方式：每个标签在缓存中保存一个版本号，缓存条目记录生成时各标签的版本，
+读取时批量比对，任一标签版本变化即视为未命中。清除标签只是写入新的版本号。
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .db_router import replica_may_be_stale
+
+PAGE_CACHE_TTL = 5 * 60
+PAGE_KEY = 'page:%s'
+TAG_KEY = 'page_tag:%s'
+
+# 所有资源列表页共用的标签，资源新增、审核状态变化时失效
+LIST_TAG = 'resource_list'
+# 分类、网盘类型的名称出现在所有页面上
+LOOKUP_TAG = 'lookups'
+
+
+def resource_tag(resource_id):
+    return f'resource:{resource_id}'
+
+
+def category_tag(category_id):
+    return f'category:{category_id}'
+
+
+def tag_page(request, *tags):
+    """为当前请求的页面缓存添加标签"""
+    page_tags = getattr(request, '_page_cache_tags', None)
+    if page_tags is not None:
+        page_tags.update(tags)
+
+
+def purge_tags(*tags):
+    """让带有这些标签的缓存页面全部失效"""
+    if tags:
+        # 版本号带上失效时间，用于判断只读副本是否可能还没有同步到这次变更
+        version = f'{time.time():.3f}:{uuid.uuid4().hex}'
+        cache.set_many({TAG_KEY % tag: version for tag in tags}, timeout=None)
+
+
+def purge_resource_pages(resource_ids, category_ids=()):
+    """资源变化后清除展示这些资源的页面，以及资源列表页"""
+    purge_tags(LIST_TAG, *map(resource_tag, resource_ids), *map(category_tag, category_ids))
+
+
+def _tag_versions(tags):
+    """读取标签的当前版本，不存在的标签初始化一个版本"""
+    keys = {TAG_KEY % tag: tag for tag in tags}
+    versions = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+    missing = [tag for tag in tags if tag not in versions]
+    if missing:
+        version = uuid.uuid4().hex
+        for tag in missing:
+            cache.add(TAG_KEY % tag, version, timeout=None)
+        versions.update({
+            keys[key]: value for key, value in cache.get_many([TAG_KEY % tag for tag in missing]).items()
+        })
+    return versions
+
+
+def _purged_at(tag_versions):
+    """这些标签中最近一次失效的时间"""
+    times = [float(version.partition(':')[0]) for version in tag_versions.values() if ':' in version]
+    return max(times, default=None)
+
+
+def _page_key(request, params):
+    parts = [request.path]
+    parts.extend(f'{name}={request.GET.get(name, "")}' for name in params)
+    return PAGE_KEY % hashlib.md5('&'.join(parts).encode()).hexdigest()
+
+
+def cache_anonymous_page(params=(), timeout=PAGE_CACHE_TTL, on_hit=None):
+    """缓存匿名用户的 GET 页面
+
+    params: 影响页面内容的查询参数，参与缓存键
+    on_hit: 命中缓存时仍需执行的回调（如记录浏览次数），参数与视图相同
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            key = _page_key(request, params)
+            entry = cache.get(key)
+            if entry is not None:
+                content, content_type, tag_versions = entry
+                current = cache.get_many([TAG_KEY % tag for tag in tag_versions])
+                if all(current.get(TAG_KEY % tag) == version for tag, version in tag_versions.items()):
+                    if on_hit:
+                        on_hit(request, *args, **kwargs)
+                    response = HttpResponse(content, content_type=content_type)
+                    response['X-Page-Cache'] = 'hit'
+                    return response
+
+            request._page_cache_tags = {LOOKUP_TAG}
+            response = view(request, *args, **kwargs)
+
+            # 只缓存不带 Cookie 的正常页面，避免把 CSRF 令牌等个人数据分享给其他访客
+            if (response.status_code == 200 and not response.streaming and not response.cookies
+                    and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')):
+                tag_versions = _tag_versions(request._page_cache_tags)
+                if not replica_may_be_stale(_purged_at(tag_versions)):
+                    cache.set(key, (response.content, response['Content-Type'], tag_versions), timeout)
+            return response
+
+        return wrapper
+
+    return decorator
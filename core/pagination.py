@@ -0,0 +1,224 @@
+"""
+列表页分页工具
+
+Django 自带的 Paginator 每次请求都要执行 COUNT(*)，并用 OFFSET 翻页，页码越大越慢。
+这里提供基于 (排序列, id) 的游标（keyset）分页：翻页时用上一页首/末条记录的排序值
+作为 WHERE 条件，每一页的代价与页码无关；总数来自短时缓存，不再每次 COUNT。
+
+URL 参数：
+- ``after`` / ``before``  游标，分别表示取游标之后/之前的一页
+- ``page``                 当前页码；不带游标时按旧版 OFFSET 方式定位，兼容旧链接（最多到
+                           MAX_OFFSET_PAGE 页，更大的页码不再用 OFFSET）
+"""
+import base64
+import json
+import math
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# 列表总数的缓存时长（秒）
+COUNT_CACHE_TTL = 60
+# 旧链接 ?page=N 按 OFFSET 定位的最大页码
+MAX_OFFSET_PAGE = 10
+
+
+def get_cached_count(cache_key, queryset, timeout=COUNT_CACHE_TTL):
+    """从缓存读取查询集的总数，未命中时执行一次 COUNT 并缓存"""
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, timeout)
+    return count
+
+
+def encode_cursor(value, pk):
+    """把 (排序值, id) 编码为 URL 安全的游标"""
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field):
+    """解析游标，格式不正确时返回 None"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        # 只接受标量；null 会变成 filter(字段__lt=None)，在查询时才抛出异常
+        if not all(isinstance(item, (str, int, float)) and not isinstance(item, bool) for item in (value, pk)):
+            return None
+        value = field.to_python(value)
+        if value is None:
+            return None
+        return value, int(pk)
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+class KeysetPage:
+    """游标分页的一页，接口与 Django 的 Page 保持一致以便模板复用"""
+
+    def __init__(self, object_list, number, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _query(self, **extra):
+        params = dict(self.paginator.params)
+        params.update(extra)
+        return urlencode(params)
+
+    @property
+    def first_query(self):
+        """首页链接的查询字符串"""
+        return self._query()
+
+    @property
+    def next_query(self):
+        """下一页链接的查询字符串"""
+        if not self.object_list:
+            return self.first_query
+        last = self.object_list[-1]
+        return self._query(after=self.paginator.cursor_for(last), page=self.number + 1)
+
+    @property
+    def previous_query(self):
+        """上一页链接的查询字符串"""
+        if not self.object_list:
+            return self.first_query
+        first = self.object_list[0]
+        return self._query(before=self.paginator.cursor_for(first), page=max(self.number - 1, 1))
+
+
+class KeysetPaginator:
+    """按 (order_field 倒序, id 倒序) 进行游标分页"""
+
+    def __init__(self, queryset, per_page, order_field, count_cache_key, params=None, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.order_field = order_field
+        self.count_cache_key = count_cache_key
+        # 翻页链接需要保留的其他参数，如 sort、q
+        self.params = params or {}
+        self.field = queryset.model._meta.get_field(order_field)
+        # 调用方已知总数（如标签上维护的资源数）时不再查询
+        if count is not None:
+            self.count = count
+
+    @cached_property
+    def count(self):
+        return get_cached_count(self.count_cache_key, self.queryset)
+
+    @cached_property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def cursor_for(self, obj):
+        return encode_cursor(getattr(obj, self.order_field), obj.pk)
+
+    def _descending(self):
+        return self.queryset.order_by(f'-{self.order_field}', '-id')
+
+    def _ascending(self):
+        return self.queryset.order_by(self.order_field, 'id')
+
+    def page(self, after=None, before=None, number=None):
+        """取一页数据，每页只多取一条用于判断是否还有下一页"""
+        size = self.per_page
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+
+        after = decode_cursor(after, self.field) if after else None
+        before = decode_cursor(before, self.field) if before else None
+
+        if after:
+            value, pk = after
+            rows = list(self._descending().filter(
+                Q(**{f'{self.order_field}__lt': value}) | Q(**{self.order_field: value, 'id__lt': pk})
+            )[:size + 1])
+            if not rows:
+                return self.last_page()
+            return KeysetPage(rows[:size], number, self, len(rows) > size, True)
+
+        if before:
+            value, pk = before
+            rows = list(self._ascending().filter(
+                Q(**{f'{self.order_field}__gt': value}) | Q(**{self.order_field: value, 'id__gt': pk})
+            )[:size + 1])
+            if not rows:
+                return self.page()
+            has_previous = len(rows) > size
+            rows = rows[:size][::-1]
+            return KeysetPage(rows, number if has_previous else 1, self, True, has_previous)
+
+        # 不带游标：首页，或旧链接中的 ?page=N
+        if number > MAX_OFFSET_PAGE:
+            # OFFSET 要扫描并丢弃前面的所有行，页码很大时不再按页码定位：
+            # 超出总页数的显示最后一页，其余回到首页
+            return self.last_page() if number >= self.num_pages else self.page()
+        offset = (number - 1) * size
+        rows = list(self._descending()[offset:offset + size + 1])
+        if not rows and number > 1:
+            # 页码超出范围时显示最后一页
+            return self.last_page()
+        return KeysetPage(rows[:size], number, self, len(rows) > size, number > 1)
+
+    def last_page(self):
+        rows = list(self._ascending()[:self.per_page])[::-1]
+        return KeysetPage(rows, self.num_pages, self, False, self.count > self.per_page)
+
+
+def paginate_keyset(request, queryset, order_field, count_cache_key, per_page=12, params=None, count=None):
+    """按请求参数对查询集做游标分页"""
+    paginator = KeysetPaginator(queryset, per_page, order_field, count_cache_key, params, count)
+    return paginator.page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        number=request.GET.get('page'),
+    )
+
+
+def load_more(queryset, order_field, after, per_page):
+    """“加载更多”式的游标分页，返回 (本页记录, 下一页游标)，没有更多时游标为 None
+
+    不需要总数和页码，只按 (order_field, id) 倒序取游标之后的 per_page 条。
+    """
+    field = queryset.model._meta.get_field(order_field)
+    queryset = queryset.order_by(f'-{order_field}', '-id')
+
+    cursor = decode_cursor(after, field) if after else None
+    if cursor:
+        value, pk = cursor
+        queryset = queryset.filter(Q(**{f'{order_field}__lt': value}) | Q(**{order_field: value, 'id__lt': pk}))
+
+    rows = list(queryset[:per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, encode_cursor(getattr(rows[-1], order_field), rows[-1].pk)
@@ -0,0 +1,328 @@
+"""
+基于内容的相关资源推荐
+
+批量任务把所有已审核资源的标题、关键词切分为 CJK n-gram（与站内搜索相同的分词），
+计算 TF-IDF 向量并做 L2 归一化，然后分块做矩阵乘法求余弦相似度，每个资源取
+最相似的 TOP_K 个写入 ``RelatedResource`` 表。详情页按 (resource, rank) 索引一次读取。
+
+每个资源只含几十个词，向量矩阵按稀疏的 (行, 列, 值) 三元组保存，只在矩阵乘法时
+把当前处理的若干行展开为稠密矩阵，内存随非零元素数而不是资源数 × 词表大小增长。
+推荐表按资源分批替换，每批一个事务，不会长时间锁住整张表。
+
+全量计算后词表、IDF 和向量矩阵保存在 ``RECOMMEND_DATA_DIR`` 中。新上传的资源用
+已保存的模型单独计算向量，与矩阵相乘得到相似资源，不需要全量重算；
+同时把新资源补充到相似度足够高的旧资源的推荐列表里。新资源在下次全量计算前
+不会出现在其他新资源的推荐中。
+"""
+import json
+import math
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .search import tokenize
+
+TOP_K = 6
+# 词表上限，控制分块展开的稠密矩阵大小（CHUNK_SIZE × MAX_FEATURES 个 float32）
+MAX_FEATURES = 4096
+# 只出现在一个资源里的词对相似度没有贡献；出现在过多资源里的词区分度太低
+MIN_DF = 2
+MAX_DF_RATIO = 0.5
+# 每次矩阵乘法处理的行数，峰值内存约为 CHUNK_SIZE × 资源数 个 float32
+CHUNK_SIZE = 512
+# 每个事务替换推荐的资源数
+WRITE_BATCH_SIZE = 500
+# 相似度低于该值的不推荐
+MIN_SCORE = 0.05
+
+FIELD_WEIGHTS = {'title': 2.0, 'keywords': 1.0}
+
+VECTORS_FILE = 'vectors.npz'
+META_FILE = 'meta.json'
+
+
+def document_terms(title, keywords):
+    """资源的加权词频"""
+    terms = Counter()
+    for field, text in (('title', title), ('keywords', keywords)):
+        for token in tokenize(text or ''):
+            terms[token] += FIELD_WEIGHTS[field]
+    return terms
+
+
+def build_vocabulary(documents):
+    """根据文档频率选出词表，返回 (词 -> 列号, IDF 数组)"""
+    total = len(documents)
+    df = Counter()
+    for terms in documents:
+        df.update(terms.keys())
+
+    max_df = max(MIN_DF, int(total * MAX_DF_RATIO))
+    candidates = [(count, term) for term, count in df.items() if MIN_DF <= count <= max_df]
+    candidates.sort(key=lambda item: (-item[0], item[1]))
+    selected = [term for _, term in candidates[:MAX_FEATURES]]
+
+    vocabulary = {term: column for column, term in enumerate(selected)}
+    idf = np.array([math.log((1 + total) / (1 + df[term])) + 1 for term in selected], dtype=np.float32)
+    return vocabulary, idf
+
+
+class SparseVectors:
+    """按行排序的稀疏矩阵，保存非零元素的 (行, 列, 值)"""
+
+    def __init__(self, rows, columns, values, shape):
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+        self.shape = tuple(shape)
+
+    def dense(self, start, stop):
+        """把第 start 到 stop 行展开为稠密矩阵"""
+        lo, hi = np.searchsorted(self.rows, [start, stop])
+        block = np.zeros((stop - start, self.shape[1]), dtype=np.float32)
+        block[self.rows[lo:hi] - start, self.columns[lo:hi]] = self.values[lo:hi]
+        return block
+
+    def dot(self, vector):
+        """矩阵乘以稠密向量，返回每行的内积"""
+        return np.bincount(self.rows, weights=self.values * vector[self.columns],
+                           minlength=self.shape[0]).astype(np.float32)
+
+
+def vectorize(documents, vocabulary, idf):
+    """把文档转换为 L2 归一化的 TF-IDF 稀疏矩阵（float32）"""
+    rows, columns, values = [], [], []
+    for row, terms in enumerate(documents):
+        entries = [(vocabulary[term], (1 + math.log(weight)) * idf[vocabulary[term]])
+                   for term, weight in terms.items() if term in vocabulary]
+        norm = math.sqrt(sum(value * value for _, value in entries))
+        for column, value in sorted(entries):
+            rows.append(row)
+            columns.append(column)
+            values.append(value / norm)
+    return SparseVectors(
+        np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64),
+        np.array(values, dtype=np.float32), (len(documents), len(vocabulary)),
+    )
+
+
+def _top_k(scores, k):
+    """返回每行得分最高的 k 个列号（按得分降序）"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, columns, axis=1), axis=1)
+    return np.take_along_axis(columns, order, axis=1)
+
+
+def nearest_neighbours(vectors, k=TOP_K, chunk_size=CHUNK_SIZE):
+    """分块计算余弦相似度，逐行返回 [(列号, 相似度), ...]
+
+    行、列都按 chunk_size 分块，每块得分与各行当前最高的 k 个合并后只保留 k 个，
+    峰值内存是 chunk_size × (chunk_size + k)，与资源总数无关。
+    """
+    total = vectors.shape[0]
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        rows = vectors.dense(start, stop)
+        best_scores = np.empty((stop - start, 0), dtype=np.float32)
+        best_columns = np.empty((stop - start, 0), dtype=np.int64)
+        for other in range(0, total, chunk_size):
+            end = min(other + chunk_size, total)
+            block = (rows @ vectors.dense(other, end).T).astype(np.float32, copy=False)
+            # 排除自身
+            own = np.arange(max(start, other), min(stop, end))
+            block[own - start, own - other] = -1
+            scores = np.concatenate([best_scores, block], axis=1)
+            columns = np.concatenate([best_columns, np.broadcast_to(np.arange(other, end), block.shape)], axis=1)
+            top = _top_k(scores, k)
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_columns = np.take_along_axis(columns, top, axis=1)
+        for scores, columns in zip(best_scores, best_columns):
+            yield [(int(column), float(score)) for column, score in zip(columns, scores) if score >= MIN_SCORE]
+
+
+# ---- 模型文件 ----
+
+def data_dir():
+    return settings.RECOMMEND_DATA_DIR
+
+
+_model_lock = threading.Lock()
+_model_cache = {}
+
+
+def save_model(ids, vocabulary, idf, vectors):
+    """保存模型，先写临时文件再替换，读取方不会读到写了一半的文件"""
+    directory = data_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    vectors_path = os.path.join(directory, VECTORS_FILE)
+    with open(vectors_path + '.tmp', 'wb') as fp:
+        np.savez(fp, rows=vectors.rows, columns=vectors.columns, values=vectors.values,
+                 shape=np.array(vectors.shape))
+    meta_path = os.path.join(directory, META_FILE)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as fp:
+        json.dump({'ids': ids, 'terms': list(vocabulary), 'idf': idf.tolist()}, fp, ensure_ascii=False)
+
+    os.replace(vectors_path + '.tmp', vectors_path)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def load_model():
+    """读取模型，返回 (资源ID列表, 词表, IDF, 向量矩阵)，尚未全量计算过时返回 None
+
+    模型文件更新后自动重新加载。
+    """
+    meta_path = os.path.join(data_dir(), META_FILE)
+    vectors_path = os.path.join(data_dir(), VECTORS_FILE)
+    try:
+        mtime = os.stat(meta_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if not os.path.exists(vectors_path):
+        # 旧版本保存的稠密矩阵，下次全量计算后才可用
+        return None
+
+    with _model_lock:
+        if _model_cache.get('mtime') != mtime:
+            with open(meta_path, encoding='utf-8') as fp:
+                meta = json.load(fp)
+            with np.load(vectors_path) as data:
+                vectors = SparseVectors(data['rows'], data['columns'], data['values'], data['shape'])
+            vocabulary = {term: column for column, term in enumerate(meta['terms'])}
+            _model_cache.update(
+                mtime=mtime,
+                model=(meta['ids'], vocabulary, np.array(meta['idf'], dtype=np.float32), vectors),
+            )
+        return _model_cache['model']
+
+
+# ---- 推荐结果 ----
+
+def _relations(resource_id, neighbours):
+    from .models import RelatedResource
+
+    return [
+        RelatedResource(resource_id=resource_id, related_id=related_id, rank=rank, score=score)
+        for rank, (related_id, score) in enumerate(neighbours)
+    ]
+
+
+def rebuild(k=TOP_K, chunk_size=CHUNK_SIZE):
+    """全量计算所有已审核资源的相关资源，返回参与计算的资源数"""
+    from .models import RelatedResource, Resource
+
+    ids = []
+    documents = []
+    rows = Resource.objects.approved().order_by('id').values_list('id', 'title', 'keywords')
+    for resource_id, title, keywords in rows.iterator(chunk_size=2000):
+        ids.append(resource_id)
+        documents.append(document_terms(title, keywords))
+
+    vocabulary, idf = build_vocabulary(documents)
+    vectors = vectorize(documents, vocabulary, idf)
+    del documents
+
+    # 按资源分批替换推荐，每批一个事务；详情页在替换期间读到的是旧推荐或新推荐
+    batch = {}
+    for resource_id, neighbours in zip(ids, nearest_neighbours(vectors, k, chunk_size)):
+        batch[resource_id] = [(ids[column], score) for column, score in neighbours]
+        if len(batch) >= WRITE_BATCH_SIZE:
+            _replace_relations(batch)
+            batch = {}
+    _replace_relations(batch)
+
+    # 不再参与推荐（已删除、取消审核）的资源
+    current = set(ids)
+    owners = RelatedResource.objects.values_list('resource_id', flat=True).distinct()
+    stale = [resource_id for resource_id in owners if resource_id not in current]
+    for start in range(0, len(stale), WRITE_BATCH_SIZE):
+        RelatedResource.objects.filter(resource_id__in=stale[start:start + WRITE_BATCH_SIZE]).delete()
+
+    save_model(ids, vocabulary, idf, vectors)
+    return len(ids)
+
+
+def _replace_relations(batch):
+    """在一个事务中替换一批资源的推荐，batch 为 {资源ID: [(相关资源ID, 相似度), ...]}"""
+    from .models import RelatedResource
+
+    if not batch:
+        return
+    with transaction.atomic():
+        RelatedResource.objects.filter(resource_id__in=list(batch)).delete()
+        RelatedResource.objects.bulk_create([
+            relation for resource_id, neighbours in batch.items()
+            for relation in _relations(resource_id, neighbours)
+        ], batch_size=1000)
+
+
+def update_for_resource(resource_id, k=TOP_K):
+    """用已保存的模型为单个（新上传的）资源计算相关资源，返回推荐数
+
+    同时把该资源加入相似度超过原有推荐的旧资源的推荐列表中。
+    """
+    from .models import RelatedResource, Resource
+
+    model = load_model()
+    row = Resource.objects.approved().filter(id=resource_id).values_list('title', 'keywords').first()
+    if model is None or row is None:
+        return 0
+
+    ids, vocabulary, idf, vectors = model
+    vector = vectorize([document_terms(*row)], vocabulary, idf).dense(0, 1)[0]
+    if not vector.any() or not ids:
+        return 0
+
+    scores = vectors.dot(vector)
+    if resource_id in ids:
+        scores[ids.index(resource_id)] = -1
+    columns = _top_k(scores[np.newaxis, :], k)[0]
+    neighbours = [(ids[column], float(scores[column])) for column in columns if scores[column] >= MIN_SCORE]
+
+    with transaction.atomic():
+        RelatedResource.objects.filter(resource_id=resource_id).delete()
+        RelatedResource.objects.bulk_create(_relations(resource_id, neighbours))
+
+    _add_to_neighbours(resource_id, neighbours, k)
+    return len(neighbours)
+
+
+def _add_to_neighbours(resource_id, neighbours, k):
+    """相似度是对称的：新资源也可能进入其相似资源的推荐列表"""
+    from .models import RelatedResource
+
+    if not neighbours:
+        return
+
+    current = {related_id: [] for related_id, _ in neighbours}
+    rows = RelatedResource.objects.filter(resource_id__in=list(current)).values_list(
+        'resource_id', 'related_id', 'score')
+    for owner, related_id, score in rows:
+        current[owner].append((related_id, score))
+
+    changed = {}
+    for owner, score in neighbours:
+        existing = [item for item in current[owner] if item[0] != resource_id]
+        if len(existing) >= k and score <= min(item[1] for item in existing):
+            continue
+        merged = sorted(existing + [(resource_id, score)], key=lambda item: -item[1])[:k]
+        changed[owner] = merged
+
+    if not changed:
+        return
+    try:
+        with transaction.atomic():
+            RelatedResource.objects.filter(resource_id__in=list(changed)).delete()
+            RelatedResource.objects.bulk_create([
+                relation for owner, merged in changed.items() for relation in _relations(owner, merged)
+            ])
+    except IntegrityError:
+        # 与其他新资源并发更新了同一个推荐列表，等下次全量计算修正
+        pass
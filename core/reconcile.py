@@ -0,0 +1,109 @@
+"""
+资源互动计数校准
+
+点赞/收藏/评论/举报计数由各处代码增量维护，历史上的读改写逻辑会让计数与实际记录数
+产生偏差。这里按 id 区间分批重新统计：
+
+- 每批读出资源上的计数和各关联表的分组计数，找出不一致的行。MySQL 默认的
+  READ COMMITTED 下两次读取不是同一个快照，读到的偏差只用于统计和挑选要修正的行；
+- 修正用一条带关联子查询的 UPDATE（``SET 计数 = (SELECT COUNT(*) ...)``）完成，
+  计数在写入的同一条语句中统计，两次读取之间并发发生的点赞等变化不会被写成偏差；
+- 每批只锁住本批中需要修正的少量行，批与批之间可以休眠，适合在线运行。
+"""
+import time
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .hot import HOT_WEIGHTS, refresh_hot_scores
+from .models import Comment, Favorite, Like, Report, Resource
+from .page_cache import purge_tags, resource_tag
+
+# 计数字段 -> 对应的关联记录模型
+COUNTER_MODELS = {
+    'like_count': Like,
+    'collect_count': Favorite,
+    'comment_count': Comment,
+    'report_count': Report,
+}
+
+
+class DriftStats:
+    """单个计数字段的偏差统计"""
+
+    def __init__(self):
+        self.rows = 0
+        self.total = 0
+        self.max_drift = 0
+        self.max_resource_id = None
+
+    def add(self, resource_id, drift):
+        self.rows += 1
+        self.total += abs(drift)
+        if abs(drift) > abs(self.max_drift):
+            self.max_drift = drift
+            self.max_resource_id = resource_id
+
+
+def _actual_counts(model, first_id, last_id):
+    """一个 id 区间内每个资源的实际关联记录数"""
+    return dict(
+        model.objects.filter(resource_id__gte=first_id, resource_id__lte=last_id)
+        .values_list('resource_id').annotate(total=Count('id')).order_by()
+    )
+
+
+def _count_subquery(model):
+    """外层资源的实际关联记录数，用于 UPDATE 的关联子查询"""
+    counts = (model.objects.filter(resource_id=OuterRef('pk')).order_by()
+              .values('resource_id').annotate(total=Count('id')).values('total'))
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def reconcile_counters(counters=None, batch_size=1000, dry_run=False, sleep=0):
+    """重新统计资源的互动计数并修正偏差，返回 (扫描的资源数, {计数字段: DriftStats})"""
+    counters = list(counters or COUNTER_MODELS)
+    stats = {counter: DriftStats() for counter in counters}
+
+    scanned = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Resource.objects.filter(id__gt=last_id).order_by('id')
+                        .values_list('id', *counters)[:batch_size])
+            if not rows:
+                break
+            first_id, last_id = rows[0][0], rows[-1][0]
+            actual = {counter: _actual_counts(COUNTER_MODELS[counter], first_id, last_id)
+                      for counter in counters}
+
+            fixed_ids = set()
+            hot_ids = set()
+            for counter_index, counter in enumerate(counters, start=1):
+                fixes = []
+                for row in rows:
+                    drift = actual[counter].get(row[0], 0) - row[counter_index]
+                    if drift:
+                        stats[counter].add(row[0], drift)
+                        fixes.append(row[0])
+
+                if fixes and not dry_run:
+                    Resource.objects.filter(id__in=fixes).update(
+                        **{counter: _count_subquery(COUNTER_MODELS[counter])}
+                    )
+                    fixed_ids.update(fixes)
+                    if counter in HOT_WEIGHTS:
+                        hot_ids.update(fixes)
+
+            if hot_ids:
+                # 热度分依赖这些计数，一并重算
+                refresh_hot_scores(Resource.objects.filter(id__in=hot_ids))
+            if fixed_ids:
+                transaction.on_commit(lambda ids=fixed_ids: purge_tags(*map(resource_tag, ids)))
+
+        scanned += len(rows)
+        if sleep:
+            time.sleep(sleep)
+
+    return scanned, stats
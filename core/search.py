@@ -0,0 +1,357 @@
+"""
+站内搜索引擎
+
+基于标题、关键词、描述三个字段构建的进程内倒排索引，替代原先
+``icontains`` 三字段 OR 查询 + COUNT(*) 的全表扫描方案。
+
+- 中文按 CJK 二元组（bigram）切分，同时保留单字以支持单字查询；
+  英文/数字按整词切分并转为小写，另外索引词的前缀（如 “py” 可以搜到 “python”），
+  前缀命中的权重低于整词命中。词中间的片段（如 “thon”）不再能匹配。
+- 资源保存/删除时通过信号增量更新（见 core/signals.py），并借助共享缓存中的
+  变更日志同步到其他 worker 进程。
+- 全量重建在后台线程中进行，同一进程同时只有一个；首次建好之前的查询
+  退回数据库的 ``icontains`` 查询，重建期间已有的索引照常使用。
+- 后端可通过 settings.SEARCH_BACKEND 替换。
+"""
+import math
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+# CJK 统一表意文字（含扩展 A）与兼容表意文字
+_CJK_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+_WORD_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[0-9a-z]+')
+
+# 各字段在相关度评分中的权重
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'keywords': 2.0,
+    'description': 1.0,
+}
+
+# 英文/数字词前缀的最短、最长长度，以及前缀命中相对整词命中的权重
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 20
+PREFIX_WEIGHT = 0.5
+
+# 索引建好之前退回数据库查询时最多返回的结果数
+FALLBACK_LIMIT = 1000
+
+# 参与索引的字段，只更新其他字段时无需重建索引
+INDEXED_FIELDS = {'title', 'description', 'keywords', 'is_approved', 'created_at'}
+
+# 变更日志在共享缓存中的键名与保留时长
+CHANGE_SEQ_KEY = 'search:change_seq'
+CHANGE_KEY = 'search:change:%d'
+CHANGE_TTL = 60 * 60
+# 落后的变更条数超过该值时直接全量重建
+MAX_CATCH_UP = 1000
+
+
+def tokenize(text, for_query=False):
+    """将文本切分为检索词
+
+    建索引时中文输出单字和二元组；查询时连续两个以上汉字只输出二元组，
+    单独的汉字输出单字，保证查询词与索引词一一对应。
+    """
+    if not text:
+        return []
+
+    tokens = []
+    for run in _WORD_RE.findall(str(text).lower()):
+        if not _CJK_RE.match(run):
+            tokens.append(run)
+            continue
+
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+
+        if not for_query:
+            tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def word_prefixes(token):
+    """英文/数字检索词的前缀（不含整词本身），中文检索词没有前缀"""
+    if _CJK_RE.match(token):
+        return []
+    return [token[:n] for n in range(MIN_PREFIX_LENGTH, min(len(token), MAX_PREFIX_LENGTH + 1))]
+
+
+class BaseSearchBackend:
+    """搜索后端基类"""
+
+    def index_resource(self, resource):
+        """新增或更新一条资源的索引"""
+        raise NotImplementedError
+
+    def remove_resource(self, resource_id):
+        """从索引中移除一条资源"""
+        raise NotImplementedError
+
+    def search(self, query, offset=0, limit=None):
+        """返回 (按相关度排序的资源ID列表, 命中总数)"""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """从数据库全量重建索引"""
+        raise NotImplementedError
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """进程内倒排索引搜索后端"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 后台重建进行中时被占用
+        self._rebuild_lock = threading.Lock()
+        self._built = False
+        self._seq = 0
+        # 检索词 -> {资源ID: 加权词频}
+        self._postings = {}
+        # 资源ID -> (创建时间戳, 该资源出现过的检索词)
+        self._docs = {}
+
+    # ---- 索引维护 ----
+
+    def _add_document(self, resource_id, title, description, keywords, created_at):
+        """写入一条文档（调用方需持有锁）"""
+        self._remove_document(resource_id)
+
+        weights = {}
+        for field, text in (('title', title), ('keywords', keywords), ('description', description)):
+            field_weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0.0) + field_weight
+                for prefix in word_prefixes(token):
+                    weights[prefix] = weights.get(prefix, 0.0) + field_weight * PREFIX_WEIGHT
+
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[resource_id] = weight
+
+        timestamp = created_at.timestamp() if created_at else 0.0
+        self._docs[resource_id] = (timestamp, tuple(weights))
+
+    def _remove_document(self, resource_id):
+        """删除一条文档（调用方需持有锁）"""
+        doc = self._docs.pop(resource_id, None)
+        if doc is None:
+            return
+
+        for token in doc[1]:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(resource_id, None)
+            if not posting:
+                del self._postings[token]
+
+    def _load_rows(self, queryset):
+        """从查询集中只取索引所需的列"""
+        # 索引的版本号跟随主库上的变更日志，始终从主库加载
+        return queryset.using('default').filter(is_approved=True).values_list(
+            'id', 'title', 'description', 'keywords', 'created_at'
+        ).iterator(chunk_size=2000)
+
+    def rebuild(self):
+        from .models import Resource
+
+        # 在新实例中建好再替换，建索引期间不阻塞查询；此后的变更由变更日志补上
+        seq = cache.get(CHANGE_SEQ_KEY, 0)
+        fresh = InvertedIndexBackend()
+        for row in self._load_rows(Resource.objects.all()):
+            fresh._add_document(*row)
+
+        with self._lock:
+            self._postings = fresh._postings
+            self._docs = fresh._docs
+            self._seq = seq
+            self._built = True
+
+    def _start_rebuild(self):
+        """在后台线程中全量重建，已有重建在进行时什么也不做"""
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+            # 关闭本线程打开的数据库连接
+            connections.close_all()
+
+    def index_resource(self, resource):
+        with self._lock:
+            if not self._built:
+                return
+            if resource.is_approved:
+                self._add_document(resource.id, resource.title, resource.description,
+                                   resource.keywords, resource.created_at)
+            else:
+                self._remove_document(resource.id)
+
+    def remove_resource(self, resource_id):
+        with self._lock:
+            if self._built:
+                self._remove_document(resource_id)
+
+    # ---- 跨进程同步 ----
+
+    @staticmethod
+    def publish_change(resource_id):
+        """记录一条资源变更，供其他 worker 增量追赶"""
+        try:
+            seq = cache.incr(CHANGE_SEQ_KEY)
+        except ValueError:
+            cache.add(CHANGE_SEQ_KEY, 0, timeout=None)
+            seq = cache.incr(CHANGE_SEQ_KEY)
+        cache.set(CHANGE_KEY % seq, resource_id, CHANGE_TTL)
+
+    def _sync(self):
+        """首次使用时在后台建索引，之后按变更日志追赶其他进程的修改"""
+        if not self._built:
+            self._start_rebuild()
+            return
+
+        remote_seq = cache.get(CHANGE_SEQ_KEY, 0)
+        if remote_seq <= self._seq:
+            return
+
+        if remote_seq - self._seq > MAX_CATCH_UP:
+            self._start_rebuild()
+            return
+
+        keys = [CHANGE_KEY % seq for seq in range(self._seq + 1, remote_seq + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            # 部分日志已过期，无法保证增量正确
+            self._start_rebuild()
+            return
+
+        from .models import Resource
+
+        changed_ids = set(changes.values())
+        with self._lock:
+            for resource_id in changed_ids:
+                self._remove_document(resource_id)
+            for row in self._load_rows(Resource.objects.filter(id__in=changed_ids)):
+                self._add_document(*row)
+            self._seq = remote_seq
+
+    # ---- 查询 ----
+
+    def _search_database(self, query, offset, limit):
+        """索引建好之前的退路：每个词在任一字段中出现即可，按发布时间排序"""
+        from .models import Resource
+
+        words = query.split()
+        if not words:
+            return [], 0
+
+        condition = Q()
+        for word in words:
+            condition &= Q(title__icontains=word) | Q(description__icontains=word) | Q(keywords__icontains=word)
+        ids = list(Resource.objects.filter(condition, is_approved=True).order_by(
+            '-created_at', '-id'
+        ).values_list('id', flat=True)[:FALLBACK_LIMIT])
+
+        end = None if limit is None else offset + limit
+        return ids[offset:end], len(ids)
+
+    def search(self, query, offset=0, limit=None):
+        self._sync()
+        if not self._built:
+            return self._search_database(query, offset, limit)
+
+        terms = set(tokenize(query, for_query=True))
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            postings = []
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    return [], 0
+                postings.append(posting)
+
+            # 从最短的倒排表开始求交集
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return [], 0
+
+            total_docs = len(self._docs)
+            idf = [math.log(1 + total_docs / len(posting)) for posting in postings]
+            ranked = sorted(
+                candidates,
+                key=lambda doc_id: (
+                    -sum(posting[doc_id] * weight for posting, weight in zip(postings, idf)),
+                    -self._docs[doc_id][0],
+                    -doc_id,
+                ),
+            )
+
+        total = len(ranked)
+        end = None if limit is None else offset + limit
+        return ranked[offset:end], total
+
+
+class SearchResultList:
+    """惰性的搜索结果列表，可直接交给 Paginator 分页
+
+    只调用一次搜索后端取得排序后的ID，分页切片时再按ID批量取出当前页的资源。
+    """
+
+    def __init__(self, query, queryset=None, backend=None):
+        from .models import Resource
+
+        self.query = query
+        self.queryset = queryset if queryset is not None else Resource.objects.all()
+        self.backend = backend or get_search_backend()
+
+    @cached_property
+    def ids(self):
+        ids, _ = self.backend.search(self.query)
+        return ids
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            page_ids = self.ids[key]
+            objects = self.queryset.in_bulk(page_ids)
+            return [objects[pk] for pk in page_ids if pk in objects]
+
+        return self[key:key + 1][0]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """获取当前进程的搜索后端单例"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_path = getattr(settings, 'SEARCH_BACKEND', 'core.search.InvertedIndexBackend')
+                _backend = import_string(backend_path)()
+    return _backend
@@ -0,0 +1,182 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import lookups, sitemap
+from .models import BannedTerm, Category, CloudType, Comment, Resource
+from .moderation import publish_banned_terms
+from .page_cache import LOOKUP_TAG, purge_resource_pages, purge_tags, resource_tag
+from .search import INDEXED_FIELDS, InvertedIndexBackend, get_search_backend
+from .suggest import get_suggestion_index
+from .tags import (
+    TAG_FIELDS, adjust_tag_counts, approved_tag_counts, count_changes, refresh_tag_counts, sync_resource_tags,
+)
+from .thumbnails import has_derivatives
+
+# 会影响资源出现在哪些列表页中的字段
+LISTING_FIELDS = INDEXED_FIELDS | {'category', 'cloud_type'}
+# 会影响站点地图的字段（带 update_fields 保存时 updated_at 只有显式列出才会更新）
+SITEMAP_FIELDS = {'is_approved', 'updated_at'}
+
+
+@receiver(post_save, sender=Resource)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """资源保存后增量更新搜索索引和输入联想"""
+    # 只更新计数等字段时无需重建该资源的索引
+    if update_fields and not INDEXED_FIELDS.intersection(update_fields):
+        return
+
+    def apply():
+        get_search_backend().index_resource(instance)
+        get_suggestion_index().index_resource(instance)
+        InvertedIndexBackend.publish_change(instance.id)
+
+    # 事务提交后再更新，避免回滚的数据进入索引
+    transaction.on_commit(apply)
+
+
+@receiver(post_delete, sender=Resource)
+def remove_from_search_index(sender, instance, **kwargs):
+    """资源删除后从搜索索引和输入联想中移除"""
+    resource_id = instance.id
+
+    def apply():
+        get_search_backend().remove_resource(resource_id)
+        get_suggestion_index().remove_resource(resource_id)
+        InvertedIndexBackend.publish_change(resource_id)
+
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=Resource)
+def purge_resource_page_cache(sender, instance, update_fields=None, **kwargs):
+    """资源保存后清除相关的页面缓存"""
+    if update_fields and not LISTING_FIELDS.intersection(update_fields):
+        # 只更新了计数，只需刷新该资源的详情页
+        transaction.on_commit(lambda: purge_tags(resource_tag(instance.id)))
+        return
+
+    transaction.on_commit(lambda: purge_resource_pages([instance.id], [instance.category_id]))
+
+
+@receiver(post_save, sender=Resource)
+def update_resource_tags(sender, instance, created=False, update_fields=None, **kwargs):
+    """关键词或审核状态变化时同步标签关联，并给增减、审核状态变化的标签的资源数加减 1
+
+    保存前的状态在读出资源时记下（见 Resource.remember_tag_state），两个字段都没变时什么都不做。
+    不知道保存前的状态时（如直接构造后保存的实例），同步后重新统计受影响的标签。
+    """
+    if update_fields and not TAG_FIELDS.intersection(update_fields):
+        return
+
+    previous = ('', False) if created else getattr(instance, '_saved_tag_state', None)
+    if previous is None:
+        before, after = sync_resource_tags(instance)
+        affected = before | after
+        transaction.on_commit(lambda: refresh_tag_counts(affected))
+    elif previous != (instance.keywords, instance.is_approved):
+        before, after = sync_resource_tags(instance)
+        adjust_tag_counts(count_changes(before, after, previous[1], instance.is_approved))
+    instance.remember_tag_state()
+
+
+@receiver(pre_delete, sender=Resource)
+def adjust_deleted_resource_tags(sender, instance, origin=None, **kwargs):
+    """删除已审核资源时扣减其标签的资源数
+
+    关联记录会被级联删除，需要在删除前按标签统计；扣减与删除在同一个事务中。对资源查询集
+    批量删除时整批只统计一次，而不是每个资源一次。
+    """
+    if isinstance(origin, QuerySet) and origin.model is Resource:
+        if hasattr(origin, '_tag_counts_adjusted'):
+            return
+        origin._tag_counts_adjusted = True
+        resource_ids = origin.values_list('id', flat=True)
+    else:
+        resource_ids = [instance.id]
+    adjust_tag_counts({tag_id: -total for tag_id, total in approved_tag_counts(resource_ids).items()})
+
+
+@receiver(post_save, sender=Resource)
+def invalidate_sitemap_shard(sender, instance, update_fields=None, **kwargs):
+    """资源审核状态或更新时间变化后重新生成所在的站点地图分片"""
+    if update_fields and not SITEMAP_FIELDS.intersection(update_fields):
+        return
+    resource_id = instance.id
+    transaction.on_commit(lambda: sitemap.invalidate([resource_id]))
+
+
+@receiver(post_delete, sender=Resource)
+def invalidate_deleted_sitemap_shard(sender, instance, **kwargs):
+    resource_id = instance.id
+    transaction.on_commit(lambda: sitemap.invalidate([resource_id]))
+
+
+@receiver(post_save, sender=Resource)
+def queue_related_resources(sender, instance, created=False, **kwargs):
+    """新资源上传后在后台计算相关资源"""
+    if not created or not instance.is_approved:
+        return
+
+    from .tasks import compute_related_resources
+
+    resource_id = instance.id
+    transaction.on_commit(lambda: compute_related_resources.delay(resource_id))
+
+
+@receiver(post_save, sender=Resource)
+def queue_screenshot_derivatives(sender, instance, update_fields=None, **kwargs):
+    """截图上传或替换后在后台生成派生图"""
+    if update_fields and 'screenshot' not in update_fields:
+        return
+    if not instance.screenshot or has_derivatives(instance):
+        return
+
+    from .tasks import generate_screenshot_derivatives
+
+    resource_id = instance.id
+    transaction.on_commit(lambda: generate_screenshot_derivatives.delay(resource_id))
+
+
+@receiver(post_delete, sender=Resource)
+def purge_deleted_resource_page_cache(sender, instance, **kwargs):
+    """资源删除后清除相关的页面缓存"""
+    transaction.on_commit(lambda: purge_resource_pages([instance.id], [instance.category_id]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_page_cache(sender, instance, **kwargs):
+    """评论变化后清除所属资源的详情页缓存"""
+    transaction.on_commit(lambda: purge_tags(resource_tag(instance.resource_id)))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CloudType)
+@receiver(post_delete, sender=CloudType)
+def purge_lookup_page_cache(sender, **kwargs):
+    """分类、网盘类型的名称展示在所有页面上，变化后清除全部页面缓存"""
+    transaction.on_commit(lambda: purge_tags(LOOKUP_TAG))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CloudType)
+@receiver(post_delete, sender=CloudType)
+def refresh_lookup_cache(sender, **kwargs):
+    """分类、网盘类型变化后立即删除查询缓存，事务提交后重新加载
+
+    提交前就删除，这期间其他进程重新加载的旧数据也会在提交后被覆盖。
+    """
+    name = 'categories' if sender is Category else 'cloud_types'
+    lookups.invalidate_lookups(name)
+    transaction.on_commit(lambda: lookups.refresh_lookups(name))
+
+
+@receiver(post_save, sender=BannedTerm)
+@receiver(post_delete, sender=BannedTerm)
+def reload_banned_terms(sender, **kwargs):
+    """违禁词变化后通知各进程重新加载词表"""
+    transaction.on_commit(publish_banned_terms)
@@ -1,26 +1,151 @@
-from django.contrib.sitemaps import Sitemap
+"""
+资源站点地图
+
+站点地图拆分为固定大小的分片：第 n 片包含 id 在 (n*SHARD_SIZE, (n+1)*SHARD_SIZE]
+区间内的已审核资源，每片不超过 SHARD_SIZE 条，远低于单个文件 5 万条的上限。
+/sitemap.xml 是分片索引，各分片的 lastmod 取片内资源 updated_at 的最大值。
+
+分片用 values_list 按主键范围扫描生成，不构造模型实例。生成的 XML 缓存起来，
+资源变化时只删除它所在分片的缓存，爬虫集中抓取时基本只读缓存。
+``build_sitemaps`` 管理命令可以预先生成全部分片。
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Max
 from django.urls import reverse
-from .models import Resource
+from django.utils import timezone
+from django.utils.html import escape
+
+from .db_router import replica_may_be_stale
+
+SHARD_SIZE = 10000
+SITEMAP_TTL = 24 * 60 * 60
+
+SHARD_KEY = 'sitemap:shard:%d'
+INDEX_KEY = 'sitemap:index'
+COUNT_KEY = 'sitemap:shards'
+# 最近一次失效的时间，只读副本可能尚未同步时不回填缓存
+INVALIDATED_KEY = 'sitemap:invalidated_at'
+
+CHANGEFREQ = 'daily'
+PRIORITY = '0.8'
+
+# 缓存的 XML 中用占位符代替站点地址，响应时替换为当前请求的协议和域名
+BASE_PLACEHOLDER = '__SITEMAP_BASE__'
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+INDEX_OPEN = '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+
+
+def shard_for(resource_id):
+    return (resource_id - 1) // SHARD_SIZE
+
+
+def _w3c(value):
+    """W3C 时间格式，数据库中的时间为本地时间"""
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value.replace(microsecond=0).isoformat()
+
+
+def build_shard(shard):
+    """生成一个分片，返回 {'xml': 分片内容, 'count': 条数, 'lastmod': 最近更新时间}"""
+    from .models import Resource
+
+    rows = Resource.objects.approved().filter(
+        id__gt=shard * SHARD_SIZE, id__lte=(shard + 1) * SHARD_SIZE,
+    ).order_by('id').values_list('id', 'updated_at').iterator(chunk_size=2000)
+
+    # 所有资源的链接只有 id 不同，先解析一次 URL 模板
+    location = BASE_PLACEHOLDER + escape(reverse('core:resource_detail', args=[0])).replace('/0/', '/%d/')
+    parts = [XML_HEADER, URLSET_OPEN]
+    count = 0
+    lastmod = None
+    for resource_id, updated_at in rows:
+        count += 1
+        if lastmod is None or updated_at > lastmod:
+            lastmod = updated_at
+        parts.append(
+            f'<url><loc>{location % resource_id}</loc><lastmod>{_w3c(updated_at)}</lastmod>'
+            f'<changefreq>{CHANGEFREQ}</changefreq><priority>{PRIORITY}</priority></url>\n'
+        )
+    parts.append('</urlset>\n')
+    return {'xml': ''.join(parts), 'count': count, 'lastmod': lastmod}
+
+
+def _store(key, value):
+    if not replica_may_be_stale(cache.get(INVALIDATED_KEY)):
+        cache.set(key, value, SITEMAP_TTL)
+
+
+def get_shard(shard):
+    """读取分片，缓存未命中时生成"""
+    data = cache.get(SHARD_KEY % shard)
+    if data is None:
+        data = build_shard(shard)
+        _store(SHARD_KEY % shard, data)
+    return data
+
+
+def shard_count():
+    """分片数，由最大的已审核资源 id 决定"""
+    from .models import Resource
+
+    count = cache.get(COUNT_KEY)
+    if count is None:
+        max_id = Resource.objects.approved().aggregate(max_id=Max('id'))['max_id']
+        count = shard_for(max_id) + 1 if max_id else 0
+        _store(COUNT_KEY, count)
+    return count
+
+
+def build_index():
+    """生成分片索引，只列出包含资源的分片"""
+    count = shard_count()
+    keys = [SHARD_KEY % shard for shard in range(count)]
+    cached = cache.get_many(keys)
+
+    parts = [XML_HEADER, INDEX_OPEN]
+    for shard, key in enumerate(keys):
+        data = cached.get(key)
+        if data is None:
+            data = get_shard(shard)
+        if not data['count']:
+            continue
+        location = BASE_PLACEHOLDER + escape(reverse('core:sitemap_shard', args=[shard]))
+        parts.append(f'<sitemap><loc>{location}</loc><lastmod>{_w3c(data["lastmod"])}</lastmod></sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts)
+
+
+def get_index():
+    xml = cache.get(INDEX_KEY)
+    if xml is None:
+        xml = build_index()
+        _store(INDEX_KEY, xml)
+    return xml
 
-class ResourceSitemap(Sitemap):
-    changefreq = "daily"
-    priority = 0.8
 
-    def items(self):
-        # 返回所有资源（不再按 is_approved 过滤）
-        return Resource.objects.all()
+def build_all():
+    """预先生成全部分片和索引，返回分片数"""
+    cache.delete(COUNT_KEY)
+    count = shard_count()
+    for shard in range(count):
+        cache.set(SHARD_KEY % shard, build_shard(shard), SITEMAP_TTL)
+    cache.set(INDEX_KEY, build_index(), SITEMAP_TTL)
+    return count
 
-    def location(self, obj):
-        return reverse('core:resource_detail', args=[obj.id])
 
-    # 以下三个方法用于提供页面的标题、描述和关键词，帮助搜索引擎理解内容
-    def title(self, obj):
-        return obj.title
+def invalidate(resource_ids):
+    """资源变化后删除所在分片和索引的缓存"""
+    shards = {shard_for(pk) for pk in resource_ids}
+    cache.delete_many([INDEX_KEY, COUNT_KEY] + [SHARD_KEY % shard for shard in shards])
+    cache.set(INVALIDATED_KEY, time.time(), SITEMAP_TTL)
 
-    def description(self, obj):
-        if obj.description:
-            return obj.description[:160]
-        return obj.title
 
-    def keywords(self, obj):
-        return obj.keywords if obj.keywords else ""
\ No newline at end of file
+def render(request, xml):
+    """把占位符替换为当前站点地址"""
+    base = f'{request.scheme}://{request.get_host()}'
+    return xml.replace(BASE_PLACEHOLDER, escape(base))
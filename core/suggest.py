@@ -0,0 +1,283 @@
+"""
+搜索框输入联想
+
+进程内的有序数组前缀索引：把已审核资源的标题和关键词规范化后排序存放，
+查询时用二分查找定位前缀区间，再按热度权重取前几条。
+
+- 权重取自资源的浏览/点赞/收藏/评论计数（不随时间衰减，取对数压缩），
+  同一个关键词出现在多个资源上时权重累加。
+- 每个条目保存各资源权重之和，随资源增删增量更新，查询时不再逐个资源求和。
+- 资源保存/删除时由信号增量更新（见 core/signals.py），其他 worker 进程借助
+  搜索索引的变更日志追赶；计数带来的权重变化由定期全量重建刷新。全量重建与搜索
+  索引一样在后台线程中建好再替换，不占用请求线程；首次建好之前联想为空。
+- 短前缀以及命中区间很大的长前缀，结果按前缀记忆，索引变化时清空。
+"""
+import bisect
+import heapq
+import math
+import threading
+import time
+import unicodedata
+
+from django.core.cache import cache
+from django.db import connections
+from django.urls import reverse
+
+from .hot import HOT_WEIGHTS
+from .search import CHANGE_KEY, CHANGE_SEQ_KEY, MAX_CATCH_UP
+from .tags import parse_keywords
+
+# 联想条目类型
+TITLE = 'title'
+TAG = 'tag'
+
+# 返回的联想条数与允许的最长前缀
+MAX_SUGGESTIONS = 8
+MAX_PREFIX_LENGTH = 50
+# 全量重建的间隔（秒），用于刷新计数带来的权重变化
+REBUILD_INTERVAL = 10 * 60
+# 检查变更日志的最小间隔（秒），避免每次按键都访问共享缓存
+SYNC_INTERVAL = 1.0
+# 记忆结果的前缀长度上限和条数上限；更长的前缀在区间内条目超过 MEMO_RANGE_SIZE 时也记忆
+MEMO_PREFIX_LENGTH = 2
+MEMO_RANGE_SIZE = 256
+MAX_MEMO_SIZE = 10000
+
+
+def normalize(text):
+    """全角转半角、转小写并合并空白"""
+    return ' '.join(unicodedata.normalize('NFKC', str(text or '')).lower().split())
+
+
+def popularity(view_count, like_count, collect_count, comment_count):
+    """资源的热度权重"""
+    base = (view_count * HOT_WEIGHTS['view_count'] +
+            like_count * HOT_WEIGHTS['like_count'] +
+            collect_count * HOT_WEIGHTS['collect_count'] +
+            comment_count * HOT_WEIGHTS['comment_count'])
+    return 1.0 + math.log1p(base)
+
+
+class PrefixIndex:
+    """有序数组前缀索引"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 后台重建进行中时被占用
+        self._rebuild_lock = threading.Lock()
+        self._built = False
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._seq = 0
+        # 有序的 (规范化文本, 类型) 数组，二分查找前缀区间
+        self._keys = []
+        # (规范化文本, 类型) -> [展示文本, {资源ID: 权重}, 权重之和]
+        self._entries = {}
+        # 资源ID -> 该资源贡献的条目
+        self._docs = {}
+        # 短前缀 -> 联想结果
+        self._memo = {}
+
+    # ---- 索引维护 ----
+
+    def _add_document(self, resource_id, title, keywords, weight):
+        """写入一条资源（调用方需持有锁）"""
+        self._remove_document(resource_id)
+
+        items = [(title, TITLE)] + [(keyword, TAG) for keyword in parse_keywords(keywords)]
+        doc_keys = []
+        for text, kind in items:
+            normalized = normalize(text)
+            if not normalized:
+                continue
+            key = (normalized, kind)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [text.strip(), {}, 0.0]
+                if self._built:
+                    bisect.insort(self._keys, key)
+            if resource_id not in entry[1]:
+                entry[1][resource_id] = weight
+                entry[2] += weight
+                doc_keys.append(key)
+
+        if doc_keys:
+            self._docs[resource_id] = doc_keys
+
+    def _remove_document(self, resource_id):
+        """删除一条资源（调用方需持有锁）"""
+        for key in self._docs.pop(resource_id, ()):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            weight = entry[1].pop(resource_id, None)
+            if weight is not None:
+                entry[2] -= weight
+            if not entry[1]:
+                del self._entries[key]
+                index = bisect.bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    del self._keys[index]
+
+    def _load_rows(self, queryset):
+        """只取索引所需的列"""
+        # 与搜索索引一样跟随变更日志，始终从主库加载
+        rows = queryset.using('default').filter(is_approved=True).values_list(
+            'id', 'title', 'keywords', *HOT_WEIGHTS
+        ).iterator(chunk_size=2000)
+        for resource_id, title, keywords, *counts in rows:
+            yield resource_id, title, keywords, popularity(*counts)
+
+    def rebuild(self):
+        from .models import Resource
+
+        # 在新实例中建好再替换，期间查询照常使用旧索引；此后的变更由变更日志补上
+        seq = cache.get(CHANGE_SEQ_KEY, 0)
+        fresh = PrefixIndex()
+        for row in self._load_rows(Resource.objects.all()):
+            fresh._add_document(*row)
+        keys = sorted(fresh._entries)
+
+        with self._lock:
+            self._entries = fresh._entries
+            self._docs = fresh._docs
+            self._keys = keys
+            self._seq = seq
+            self._memo = {}
+            self._built = True
+            self._built_at = self._checked_at = time.monotonic()
+
+    def _start_rebuild(self):
+        """在后台线程中全量重建，已有重建在进行时什么也不做"""
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+            # 关闭本线程打开的数据库连接
+            connections.close_all()
+
+    def index_resource(self, resource):
+        with self._lock:
+            if not self._built:
+                return
+            if resource.is_approved:
+                self._add_document(resource.id, resource.title, resource.keywords, popularity(
+                    *(getattr(resource, field) for field in HOT_WEIGHTS)
+                ))
+            else:
+                self._remove_document(resource.id)
+            self._memo = {}
+
+    def remove_resource(self, resource_id):
+        with self._lock:
+            if self._built:
+                self._remove_document(resource_id)
+                self._memo = {}
+
+    def _sync(self):
+        """首次使用时在后台建索引，之后定期追赶变更日志、定期在后台全量重建"""
+        now = time.monotonic()
+        if not self._built:
+            self._start_rebuild()
+            return
+        if now - self._built_at > REBUILD_INTERVAL:
+            self._start_rebuild()
+        if now - self._checked_at < SYNC_INTERVAL:
+            return
+        self._checked_at = now
+
+        remote_seq = cache.get(CHANGE_SEQ_KEY, 0)
+        if remote_seq <= self._seq:
+            return
+        if remote_seq - self._seq > MAX_CATCH_UP:
+            self._start_rebuild()
+            return
+
+        keys = [CHANGE_KEY % seq for seq in range(self._seq + 1, remote_seq + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            self._start_rebuild()
+            return
+
+        from .models import Resource
+
+        changed_ids = set(changes.values())
+        with self._lock:
+            for resource_id in changed_ids:
+                self._remove_document(resource_id)
+            for row in self._load_rows(Resource.objects.filter(id__in=changed_ids)):
+                self._add_document(*row)
+            self._seq = remote_seq
+            self._memo = {}
+
+    # ---- 查询 ----
+
+    def _range(self, prefix):
+        """前缀在有序数组中的区间 [start, end)（调用方需持有锁）"""
+        start = bisect.bisect_left(self._keys, (prefix,))
+        # 前缀后接一个最大码位即为区间上界
+        end = bisect.bisect_left(self._keys, (prefix + '\U0010ffff',), lo=start)
+        return start, end
+
+    def _lookup(self, start, end, limit):
+        """在区间内按权重取前 limit 条（调用方需持有锁）"""
+        def score(key):
+            return self._entries[key][2]
+
+        # 按下标逐个取，不复制区间
+        keys = map(self._keys.__getitem__, range(start, end))
+        top = heapq.nlargest(limit, keys, key=score) if end - start > limit \
+            else sorted(keys, key=score, reverse=True)
+
+        suggestions = []
+        for key in top:
+            text, weights, _ = self._entries[key]
+            suggestion = {'text': text, 'type': key[1]}
+            if key[1] == TITLE:
+                # 同名资源取最热的一个
+                best = max(weights, key=weights.get)
+                suggestion['url'] = reverse('core:resource_detail', args=[best])
+            else:
+                suggestion['url'] = reverse('core:tag_resources', args=[text])
+            suggestions.append(suggestion)
+        return suggestions
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        """返回以 query 开头的标题和关键词，按热度降序"""
+        prefix = normalize(query)[:MAX_PREFIX_LENGTH]
+        if not prefix:
+            return []
+
+        self._sync()
+        if not self._built:
+            return []
+        with self._lock:
+            memoize = limit == MAX_SUGGESTIONS
+            if memoize and prefix in self._memo:
+                return self._memo[prefix]
+
+            start, end = self._range(prefix)
+            suggestions = self._lookup(start, end, limit)
+            if (memoize and (len(prefix) <= MEMO_PREFIX_LENGTH or end - start > MEMO_RANGE_SIZE)
+                    and len(self._memo) < MAX_MEMO_SIZE):
+                self._memo[prefix] = suggestions
+            return suggestions
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_suggestion_index():
+    """获取当前进程的联想索引单例"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PrefixIndex()
+    return _index
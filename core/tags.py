@@ -0,0 +1,134 @@
+"""
+资源标签
+
+资源的关键词（逗号分隔的字符串）保存时同步为 Tag 多对多关联，标签页通过
+(tag, resource) 索引连接资源。``Tag.resource_count`` 只统计已审核资源：单个资源保存或删除时
+按关联和审核状态的变化给受影响的标签加减 1；后台批量修改审核状态时才重新统计受影响的标签，
+每个标签一次走索引的 COUNT。
+
+标签名统一为 NFKC 规范化后的小写形式：MySQL 默认排序规则不区分大小写，“Python” 和
+“python” 在唯一索引上是同一个值，必须在写入前合并。
+"""
+import unicodedata
+from collections import defaultdict
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+# 与上传表单的限制一致
+MAX_TAGS = 10
+MAX_TAG_LENGTH = 20
+# 会影响标签关联和标签资源数的资源字段
+TAG_FIELDS = {'keywords', 'is_approved'}
+
+
+def split_keywords(keywords):
+    """按逗号拆分关键词并去掉空白"""
+    return [k.strip() for k in (keywords or '').split(',') if k.strip()]
+
+
+def normalize_tag(name):
+    """标签名的规范形式：全角转半角、转小写"""
+    return unicodedata.normalize('NFKC', name).strip().lower()
+
+
+def parse_keywords(keywords):
+    """把关键词字符串转换为标签名列表：规范化、去重，超长的关键词丢弃，最多 MAX_TAGS 个"""
+    names = []
+    for keyword in split_keywords(keywords):
+        name = normalize_tag(keyword)
+        if name and len(name) <= MAX_TAG_LENGTH and name not in names:
+            names.append(name)
+    return names[:MAX_TAGS]
+
+
+def get_tag_ids(names):
+    """按名称取标签ID，返回 {名称: ID}
+
+    先按名称批量查询；数据库排序规则认为相等、但字面不同的名称（如 MySQL 上重音不敏感的
+    “café” 与 “cafe”），返回的是已存在的那一行，再逐个按名称查询对应上。
+    """
+    from .models import Tag
+
+    names = list(names)
+    tag_ids = {name: tag_id for name, tag_id in Tag.objects.filter(name__in=names).values_list('name', 'id')
+               if name in names}
+    for name in names:
+        if name not in tag_ids:
+            tag_ids[name] = Tag.objects.filter(name=name).values_list('id', flat=True).first()
+    return {name: tag_id for name, tag_id in tag_ids.items() if tag_id is not None}
+
+
+def sync_resource_tags(resource):
+    """按资源当前的关键词更新标签关联，返回 (同步前的标签ID, 同步后的标签ID)"""
+    from .models import ResourceTag, Tag
+
+    names = parse_keywords(resource.keywords)
+    current = dict(ResourceTag.objects.filter(resource=resource).values_list('tag__name', 'tag_id'))
+    before = set(current.values())
+    if set(names) == set(current):
+        return before, before
+
+    missing = [name for name in names if name not in current]
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+    tag_ids = get_tag_ids(missing)
+
+    removed = [tag_id for name, tag_id in current.items() if name not in names]
+    if removed:
+        ResourceTag.objects.filter(resource=resource, tag_id__in=removed).delete()
+    ResourceTag.objects.bulk_create(
+        [ResourceTag(resource=resource, tag_id=tag_id) for tag_id in tag_ids.values()],
+        ignore_conflicts=True,
+    )
+    return before, (before - set(removed)) | set(tag_ids.values())
+
+
+def refresh_tag_counts(tag_ids):
+    """重新统计这些标签下已审核资源的数量"""
+    from .models import Tag
+
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    counts = Tag.objects.filter(id__in=tag_ids).annotate(
+        count=Count('resourcetag', filter=Q(resourcetag__resource__is_approved=True)),
+    ).values_list('id', 'count', 'resource_count')
+    changed = [Tag(id=tag_id, resource_count=count) for tag_id, count, old in counts if count != old]
+    if changed:
+        Tag.objects.bulk_update(changed, ['resource_count'])
+
+
+def adjust_tag_counts(deltas):
+    """按 {标签ID: 增减量} 调整标签的资源数，增减量相同的标签合并成一条 UPDATE，计数不小于0"""
+    from .models import Tag
+
+    groups = defaultdict(list)
+    for tag_id, delta in deltas.items():
+        if delta:
+            groups[delta].append(tag_id)
+    for delta, tag_ids in groups.items():
+        Tag.objects.filter(id__in=tag_ids).update(resource_count=Greatest(F('resource_count') + delta, 0))
+
+
+def count_changes(before, after, was_approved, approved):
+    """资源的标签或审核状态变化时各标签资源数的增减量：原来计入的标签减 1，现在计入的加 1"""
+    old = set(before) if was_approved else set()
+    new = set(after) if approved else set()
+    return {**{tag_id: -1 for tag_id in old - new}, **{tag_id: 1 for tag_id in new - old}}
+
+
+def approved_tag_counts(resource_ids):
+    """这些资源中已审核的资源在各标签下的数量，返回 {标签ID: 数量}"""
+    from .models import ResourceTag
+
+    return dict(
+        ResourceTag.objects.filter(resource_id__in=list(resource_ids), resource__is_approved=True)
+        .values('tag_id').annotate(total=Count('id')).values_list('tag_id', 'total')
+    )
+
+
+def tag_ids_for(resource_ids):
+    from .models import ResourceTag
+
+    return set(ResourceTag.objects.filter(resource_id__in=list(resource_ids)).values_list('tag_id', flat=True))
@@ -0,0 +1,19 @@
+"""
+后台任务
+"""
+from celery import shared_task
+
+from .recommend import update_for_resource
+from .thumbnails import generate_derivatives
+
+
+@shared_task(ignore_result=True)
+def generate_screenshot_derivatives(resource_id):
+    """生成资源截图的缩略图和 WebP 派生图"""
+    generate_derivatives(resource_id)
+
+
+@shared_task(ignore_result=True)
+def compute_related_resources(resource_id):
+    """用已保存的推荐模型为新资源计算相关资源"""
+    update_for_resource(resource_id)
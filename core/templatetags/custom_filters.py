@@ -1,25 +1,74 @@
 from django import template
-from django.utils.safestring import mark_safe
-import re
+from django.utils.html import format_html
+
+from core.cards import render_cards
+from core.highlight import get_highlighter
+from core.interactions import get_interaction_states
+from core.thumbnails import derived_urls
 
 register = template.Library()
 
 
-@register.filter(name='highlight')
-def highlight(text, query):
-    """在文本中高亮显示搜索关键词"""
+@register.filter(name='highlight', needs_autoescape=True)
+def highlight(text, query, autoescape=True):
+    """在文本中高亮显示搜索关键词（按检索词逐个匹配，原文正确转义）"""
     if not text or not query:
         return text
+    return get_highlighter(query).highlight(text, autoescape)
 
-    # 转义查询词中的特殊字符
-    pattern = re.escape(query)
 
-    # 使用正则表达式替换，不区分大小写
-    highlighted = re.sub(
-        f'({pattern})',
-        r'<span class="highlight">\1</span>',
-        str(text),
-        flags=re.IGNORECASE
-    )
+@register.filter(name='snippet', needs_autoescape=True)
+def snippet(text, query, autoescape=True):
+    """截取搜索关键词第一次出现位置附近的一段文本并高亮"""
+    if not text:
+        return text
+    return get_highlighter(query or '').snippet(text, autoescape=autoescape)
+
+
+@register.simple_tag
+def resource_cards(resources, kind='resource', **extra):
+    """批量渲染资源卡片，已渲染过的卡片直接从缓存读取"""
+    return render_cards(resources, kind, **extra)
+
+
+@register.simple_tag(takes_context=True)
+def interaction_states(context, *resources):
+    """当前用户对资源的互动状态，{资源ID: {'liked', 'favorited', 'reported'}}
+
+    参数可以是单个资源，也可以是资源列表：{% interaction_states page_obj as states %}
+    """
+    user = context.get('user')
+    if user is None:
+        return {}
 
-    return mark_safe(highlighted)
\ No newline at end of file
+    resource_ids = []
+    for item in resources:
+        if hasattr(item, 'id'):
+            resource_ids.append(item.id)
+        else:
+            resource_ids.extend(resource.id for resource in item)
+    return get_interaction_states(user, resource_ids)
+
+
+@register.filter(name='get_item')
+def get_item(mapping, key):
+    """按键取字典中的值"""
+    return mapping.get(key) if mapping else None
+
+
+@register.simple_tag
+def screenshot_picture(resource, size='detail', alt='', css_class=''):
+    """输出资源截图：派生图已生成时用 <picture> 优先提供 WebP，否则回退到原图"""
+    if not resource.screenshot:
+        return ''
+
+    urls = derived_urls(resource, size)
+    if not urls:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">',
+                           resource.screenshot.url, alt, css_class)
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        urls['webp'], urls['jpeg'], alt, css_class,
+    )
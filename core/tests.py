@@ -1,3 +1,2224 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import F, Q
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.base import BaseHandler
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from .models import (BannedTerm, Category, CloudType, Comment, Favorite, Like, RelatedResource, Report,
+                     Resource, ResourceTag, Tag)
+from .forms import ResourceUploadForm
+from .admin_tools import EstimatedCountPaginator
+from .moderation import AhoCorasick, check_text
+from .templatetags.custom_filters import screenshot_picture
+from .thumbnails import SIZES, derived_name, has_derivatives, render_derivatives
+from .tags import parse_keywords, refresh_tag_counts, sync_resource_tags
+from .uploads import FILE_TOO_LARGE_MESSAGE, MAX_UPLOAD_SIZE
+from . import bulk, interactions, lookups, recommend, reconcile, sitemap, views
+from .pagination import KeysetPaginator
+from .hot import compute_hot_score, refresh_hot_scores
+from .cards import card_cache_key, render_cards
+from .db_router import PIN_COOKIE, PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from .page_cache import LIST_TAG, purge_tags
+from .counters import flush_view_counts, get_pending_views, record_view
+from .reconcile import reconcile_counters
+from .search import InvertedIndexBackend, get_search_backend, tokenize
+from .suggest import MEMO_RANGE_SIZE, REBUILD_INTERVAL, PrefixIndex, get_suggestion_index, popularity
+from .highlight import Highlighter, get_highlighter
+
+
+def create_resource(user, category, cloud_type, **kwargs):
+    """创建测试资源"""
+    defaults = {
+        'title': '测试资源',
+        'description': '',
+        'keywords': '',
+        'resource_url': 'https://pan.baidu.com/s/test',
+    }
+    defaults.update(kwargs)
+    return Resource.objects.create(user=user, category=category, cloud_type=cloud_type, **defaults)
+
+
+class ResourceTestMixin:
+    """提供用户、分类、网盘类型等基础数据"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='tester', password='pass12345')
+        cls.category = Category.objects.create(name='电影')
+        cls.cloud_type = CloudType.objects.create(name='百度网盘')
+
+    def make_resource(self, **kwargs):
+        return create_resource(self.user, self.category, self.cloud_type, **kwargs)
+
+
+class TokenizeTests(TestCase):
+
+    def test_cjk_bigrams_and_unigrams(self):
+        self.assertEqual(tokenize('科幻电影'), ['科', '幻', '电', '影', '科幻', '幻电', '电影'])
+
+    def test_query_uses_bigrams_only(self):
+        self.assertEqual(tokenize('科幻电影', for_query=True), ['科幻', '幻电', '电影'])
+        self.assertEqual(tokenize('电', for_query=True), ['电'])
+
+    def test_latin_words_lowercased(self):
+        self.assertEqual(tokenize('Python3 教程, 2023'), ['python3', '教', '程', '教程', '2023'])
+
+
+class InvertedIndexBackendTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        self.backend = InvertedIndexBackend()
+
+    def test_ranks_title_matches_first(self):
+        in_desc = self.make_resource(title='合集', description='经典科幻电影')
+        in_title = self.make_resource(title='科幻电影合集')
+        self.backend.rebuild()
+
+        ids, total = self.backend.search('科幻')
+        self.assertEqual(total, 2)
+        self.assertEqual(ids, [in_title.id, in_desc.id])
+
+    def test_all_terms_must_match(self):
+        self.make_resource(title='科幻小说')
+        match = self.make_resource(title='科幻电影')
+        self.backend.rebuild()
+
+        self.assertEqual(self.backend.search('科幻电影'), ([match.id], 1))
+
+    def test_unapproved_resources_not_indexed(self):
+        self.make_resource(title='科幻电影', is_approved=False)
+        self.backend.rebuild()
+
+        self.assertEqual(self.backend.search('科幻'), ([], 0))
+
+    def test_offset_and_limit(self):
+        for i in range(5):
+            self.make_resource(title=f'纪录片{i}')
+        self.backend.rebuild()
+
+        ids, total = self.backend.search('纪录片', offset=2, limit=2)
+        self.assertEqual(total, 5)
+        self.assertEqual(len(ids), 2)
+
+    def test_incremental_update_and_remove(self):
+        resource = self.make_resource(title='科幻电影')
+        self.backend.rebuild()
+
+        resource.title = '动画电影'
+        self.backend.index_resource(resource)
+        self.assertEqual(self.backend.search('科幻'), ([], 0))
+        self.assertEqual(self.backend.search('动画')[1], 1)
+
+        self.backend.remove_resource(resource.id)
+        self.assertEqual(self.backend.search('动画'), ([], 0))
+
+    def test_catches_up_from_change_log(self):
+        resource = self.make_resource(title='科幻电影')
+        self.backend.rebuild()
+
+        # 模拟其他进程修改了资源
+        Resource.objects.filter(id=resource.id).update(title='动画电影')
+        InvertedIndexBackend.publish_change(resource.id)
+
+        self.assertEqual(self.backend.search('动画'), ([resource.id], 1))
+
+    def test_latin_prefixes_match_whole_words(self):
+        prefix = self.make_resource(title='Python 入门')
+        exact = self.make_resource(title='py 脚本合集')
+        self.make_resource(title='happy 电影')
+        self.backend.rebuild()
+
+        # 整词命中排在前缀命中之前，词中间的片段不匹配
+        self.assertEqual(self.backend.search('py'), ([exact.id, prefix.id], 2))
+        self.assertEqual(self.backend.search('PYTH'), ([prefix.id], 1))
+        self.assertEqual(self.backend.search('thon'), ([], 0))
+
+    def test_first_search_builds_in_background(self):
+        resource = self.make_resource(title='Python 入门')
+        self.make_resource(title='未审核的 Python', is_approved=False)
+
+        with patch('core.search.threading.Thread') as thread:
+            # 索引建好之前退回数据库查询，并发的查询只启动一次重建
+            self.assertEqual(self.backend.search('python 入门'), ([resource.id], 1))
+            self.assertEqual(self.backend.search('python'), ([resource.id], 1))
+        thread.assert_called_once()
+        self.assertFalse(self.backend._built)
+
+        with patch('core.search.connections.close_all'):
+            thread.call_args.kwargs['target']()
+        self.assertTrue(self.backend._built)
+        self.assertEqual(self.backend.search('pyth'), ([resource.id], 1))
+
+
+class SearchViewTests(ResourceTestMixin, TestCase):
+
+    def test_search_results(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resource = self.make_resource(title='星际穿越 科幻电影')
+            self.make_resource(title='家常菜谱')
+        get_search_backend().rebuild()
+
+        response = self.client.get(reverse('core:search_resources'), {'q': '科幻'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_count'], 1)
+        self.assertEqual(list(response.context['resources']), [resource])
+
+    def test_empty_query_redirects(self):
+        response = self.client.get(reverse('core:search_resources'), {'q': ' '})
+        self.assertRedirects(response, reverse('core:index'))
+
+
+class HighlightTests(ResourceTestMixin, TestCase):
+
+    def test_highlights_each_term_and_merges_adjacent_matches(self):
+        html = Highlighter('科幻 python').highlight('经典科幻电影，Python 入门')
+        self.assertEqual(html, '经典<span class="highlight">科幻</span>电影，'
+                               '<span class="highlight">Python</span> 入门')
+        self.assertEqual(Highlighter('科幻电影').highlight('科幻电影合集'),
+                         '<span class="highlight">科幻电影</span>合集')
+
+    def test_escapes_text(self):
+        html = Highlighter('<b>').highlight('<script>alert(1)</script> b')
+        self.assertNotIn('<script>', html)
+        self.assertIn('&lt;script&gt;alert(1)&lt;/script&gt; <span class="highlight">b</span>', html)
+
+    def test_snippet_centres_on_first_match(self):
+        text = '无关内容' * 100 + '科幻电影' + '结尾' * 100
+        snippet = Highlighter('科幻').snippet(text, length=40)
+        self.assertTrue(snippet.startswith('…'))
+        self.assertTrue(snippet.endswith('…'))
+        self.assertIn('<span class="highlight">科幻</span>', snippet)
+
+        self.assertEqual(Highlighter('科幻').snippet('短文本'), '短文本')
+        self.assertEqual(Highlighter('不存在').snippet('开头' * 100, length=10), '开头' * 5 + '…')
+
+    def test_matcher_cached_per_query(self):
+        self.assertIs(get_highlighter('科幻'), get_highlighter('科幻'))
+
+    def test_search_results_escaped_and_snippeted(self):
+        self.make_resource(title='<i>科幻</i>电影', description='前言' * 200 + '科幻故事')
+        get_search_backend().rebuild()
+
+        response = self.client.get(reverse('core:search_resources'), {'q': '科幻'})
+        self.assertContains(response, '&lt;i&gt;<span class="highlight">科幻</span>&lt;/i&gt;电影')
+        self.assertContains(response, '<span class="highlight">科幻</span>故事')
+
+
+class SuggestionTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex()
+
+    def texts(self, query):
+        return [item['text'] for item in self.index.suggest(query)]
+
+    def test_prefix_match_ranked_by_popularity(self):
+        self.make_resource(title='科幻电影合集', view_count=5)
+        hot = self.make_resource(title='科幻小说', like_count=100)
+        self.make_resource(title='动画电影')
+        self.index.rebuild()
+
+        suggestions = self.index.suggest('科幻')
+        self.assertEqual([item['text'] for item in suggestions], ['科幻小说', '科幻电影合集'])
+        self.assertEqual(suggestions[0]['url'], reverse('core:resource_detail', args=[hot.id]))
+
+    def test_keywords_suggested_as_tags(self):
+        self.make_resource(title='合集', keywords='Python,教程')
+        self.make_resource(title='合集2', keywords='python')
+        self.index.rebuild()
+
+        suggestions = self.index.suggest('ＰＹ')
+        self.assertEqual(len(suggestions), 1)
+        self.assertEqual(suggestions[0]['type'], 'tag')
+        self.assertTrue(suggestions[0]['url'].startswith('/tag/'))
+
+    def test_unapproved_resources_excluded(self):
+        self.make_resource(title='科幻电影', is_approved=False)
+        self.index.rebuild()
+        self.assertEqual(self.index.suggest('科'), [])
+
+    def test_incremental_update_and_remove(self):
+        resource = self.make_resource(title='科幻电影')
+        self.index.rebuild()
+        self.assertEqual(self.texts('科'), ['科幻电影'])
+
+        resource.title = '动画电影'
+        self.index.index_resource(resource)
+        self.assertEqual(self.texts('科'), [])
+        self.assertEqual(self.texts('动画'), ['动画电影'])
+
+        self.index.remove_resource(resource.id)
+        self.assertEqual(self.texts('动'), [])
+
+    def test_catches_up_from_change_log(self):
+        resource = self.make_resource(title='科幻电影')
+        self.index.rebuild()
+        self.assertEqual(self.texts('科'), ['科幻电影'])
+
+        # 模拟其他进程审核通过了一条资源
+        pending = self.make_resource(title='科学纪录片', is_approved=False)
+        Resource.objects.filter(id=pending.id).update(is_approved=True)
+        InvertedIndexBackend.publish_change(pending.id)
+        self.index._checked_at = 0
+
+        self.assertEqual(sorted(self.texts('科')), ['科学纪录片', '科幻电影'])
+        self.assertEqual(self.texts('科幻'), [resource.title])
+
+    def test_scores_kept_per_entry(self):
+        first = self.make_resource(title='合集', keywords='科幻', view_count=10)
+        second = self.make_resource(title='合集2', keywords='科幻', like_count=3)
+        self.make_resource(title='科学', view_count=30)
+        self.index.rebuild()
+
+        expected = popularity(10, 0, 0, 0) + popularity(0, 3, 0, 0)
+        self.assertAlmostEqual(self.index._entries[('科幻', 'tag')][2], expected)
+        self.assertEqual(self.texts('科'), ['科幻', '科学'])
+
+        self.index.remove_resource(second.id)
+        self.assertAlmostEqual(self.index._entries[('科幻', 'tag')][2], popularity(10, 0, 0, 0))
+        self.assertEqual(self.texts('科'), ['科学', '科幻'])
+
+        first.view_count = 100
+        self.index.index_resource(first)
+        self.assertAlmostEqual(self.index._entries[('科幻', 'tag')][2], popularity(100, 0, 0, 0))
+
+    def test_long_prefixes_with_large_ranges_memoized(self):
+        Resource.objects.bulk_create([
+            Resource(user=self.user, category=self.category, cloud_type=self.cloud_type,
+                     title=f'资源合集{i:04d}', keywords='', resource_url='https://pan.baidu.com/s/t')
+            for i in range(MEMO_RANGE_SIZE + 1)
+        ])
+        self.make_resource(title='资源索引')
+        self.index.rebuild()
+
+        first = self.index.suggest('资源合集')
+        with patch.object(self.index, '_lookup') as lookup:
+            self.assertEqual(self.index.suggest('资源合集'), first)
+        lookup.assert_not_called()
+        # 区间小的长前缀不记忆
+        self.assertEqual(self.texts('资源索'), ['资源索引'])
+        self.assertNotIn('资源索', self.index._memo)
+
+    def test_rebuilds_in_background(self):
+        self.make_resource(title='科幻电影')
+
+        with patch('core.suggest.threading.Thread') as thread:
+            # 首次建好之前联想为空，并发的请求只启动一次重建
+            self.assertEqual(self.index.suggest('科'), [])
+            self.assertEqual(self.index.suggest('科幻'), [])
+        thread.assert_called_once()
+        with patch('core.suggest.connections.close_all'):
+            thread.call_args.kwargs['target']()
+        self.assertEqual(self.texts('科'), ['科幻电影'])
+
+        # 到期的全量重建同样在后台进行，期间继续使用旧索引
+        self.make_resource(title='科学纪录片')
+        self.index._built_at -= REBUILD_INTERVAL + 1
+        with patch('core.suggest.threading.Thread') as thread:
+            self.assertEqual(self.texts('科'), ['科幻电影'])
+        thread.assert_called_once()
+        with patch('core.suggest.connections.close_all'):
+            thread.call_args.kwargs['target']()
+        self.assertEqual(sorted(self.texts('科')), ['科学纪录片', '科幻电影'])
+
+    def test_saved_resources_appear_through_signals(self):
+        index = get_suggestion_index()
+        index.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_resource(title='独立游戏精选')
+        self.assertEqual([item['text'] for item in index.suggest('独立')], ['独立游戏精选'])
+
+    def test_lookup_is_fast(self):
+        Resource.objects.bulk_create([
+            Resource(user=self.user, category=self.category, cloud_type=self.cloud_type,
+                     title=f'资源{i:05d}', keywords=f'关键词{i % 500}', resource_url='https://pan.baidu.com/s/t',
+                     view_count=i)
+            for i in range(5000)
+        ])
+        self.index.rebuild()
+
+        queries = ['资', '资源', '资源0', '资源012', '关键词4', 'x']
+        started = time.perf_counter()
+        for _ in range(100):
+            for query in queries:
+                self.index.suggest(query)
+        elapsed = (time.perf_counter() - started) / (100 * len(queries))
+        self.assertLess(elapsed, 0.001)
+
+    def test_view(self):
+        self.make_resource(title='科幻电影')
+        get_suggestion_index().rebuild()
+
+        response = self.client.get(reverse('core:search_suggestions'), {'q': '科幻'})
+        self.assertEqual(response.json()['suggestions'][0]['text'], '科幻电影')
+        self.assertEqual(self.client.get(reverse('core:search_suggestions')).json()['suggestions'], [])
+
+
+class ViewCounterTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        caches['counters'].clear()
+
+    def test_detail_view_buffers_increment(self):
+        resource = self.make_resource(view_count=10)
+        url = reverse('core:resource_detail', args=[resource.id])
+        # 登录用户不走整页缓存
+        self.client.force_login(self.user)
+
+        self.client.get(url)
+        response = self.client.get(url)
+
+        self.assertEqual(response.context['resource'].view_count, 12)
+        resource.refresh_from_db()
+        self.assertEqual(resource.view_count, 10)
+
+    def test_flush_writes_batched_increments(self):
+        first = self.make_resource()
+        second = self.make_resource()
+        for _ in range(3):
+            record_view(first.id)
+        record_view(second.id)
+
+        self.assertEqual(flush_view_counts(), (2, 4))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.view_count, second.view_count), (3, 1))
+        self.assertEqual(get_pending_views([first.id, second.id]), {})
+
+        # 没有新的浏览时不会重复写回
+        self.assertEqual(flush_view_counts(), (0, 0))
+
+    def test_views_after_flush_are_kept(self):
+        resource = self.make_resource()
+        record_view(resource.id)
+        flush_view_counts()
+        record_view(resource.id)
+        record_view(resource.id)
+
+        call_command('flush_view_counts', stdout=StringIO())
+        resource.refresh_from_db()
+        self.assertEqual(resource.view_count, 3)
+
+    def test_pending_views_survive_long_flush_outage(self):
+        resource = self.make_resource()
+        record_view(resource.id)
+        record_view(resource.id)
+
+        # 写回中断两天后，登记仍在，增量不会被遗漏
+        later = time.time() + 2 * 24 * 60 * 60
+        with patch('django.core.cache.backends.base.time.time', return_value=later), \
+                patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            record_view(resource.id)
+            self.assertEqual(flush_view_counts(), (1, 3))
+        resource.refresh_from_db()
+        self.assertEqual(resource.view_count, 3)
+
+    def test_failed_update_keeps_pending_views(self):
+        resource = self.make_resource()
+        record_view(resource.id)
+        record_view(resource.id)
+
+        with patch('django.db.models.query.QuerySet.update', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                flush_view_counts()
+        self.assertEqual(get_pending_views([resource.id]), {resource.id: 2})
+
+        self.assertEqual(flush_view_counts(), (1, 2))
+        resource.refresh_from_db()
+        self.assertEqual(resource.view_count, 2)
+
+
+class KeysetPaginationTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # 部分资源浏览数相同，验证按 id 打破平局
+        self.resources = [self.make_resource(title=f'资源{i}', view_count=i // 2) for i in range(7)]
+
+    def paginator(self, order_field='view_count'):
+        return KeysetPaginator(Resource.objects.all(), 3, order_field, 'count:test')
+
+    def test_walks_forward_and_back_without_gaps(self):
+        paginator = self.paginator()
+        expected = sorted(self.resources, key=lambda r: (r.view_count, r.id), reverse=True)
+
+        first = paginator.page()
+        second = paginator.page(after=paginator.cursor_for(first[-1]), number=2)
+        third = paginator.page(after=paginator.cursor_for(second[-1]), number=3)
+        self.assertEqual(list(first) + list(second) + list(third), expected)
+        self.assertTrue(second.has_next())
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(before=paginator.cursor_for(second[0]), number=1)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_count_is_cached(self):
+        paginator = self.paginator()
+        self.assertEqual(paginator.count, 7)
+        self.make_resource()
+        self.assertEqual(self.paginator().count, 7)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = self.paginator().page(after='not-a-cursor')
+        self.assertEqual(page.number, 1)
+        self.assertFalse(page.has_previous())
+
+    def test_malformed_cursor_values_ignored(self):
+        cursors = [base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+                   for value in ([None, 1], [[1], 1], [{'a': 1}, 1], ['2024-01-01', None], [True, 1])]
+        for cursor in cursors:
+            for param in ('after', 'before'):
+                for url in (reverse('core:index'), reverse('core:hot_resources') + '?sort=hot',
+                            reverse('core:hot_resources') + '?sort=views'):
+                    response = self.client.get(url, {param: cursor})
+                    self.assertEqual(response.status_code, 200, (url, param, cursor))
+        resource = self.resources[0]
+        response = self.client.get(reverse('core:resource_comments', args=[resource.id]), {'after': cursors[0]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_out_of_range_shows_last_page(self):
+        page = self.paginator('created_at').page(number=99)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(list(page), self.resources[2::-1])
+        self.assertFalse(page.has_next())
+
+    def test_large_page_number_skips_offset(self):
+        paginator = self.paginator('created_at')
+        self.assertEqual(paginator.num_pages, 3)
+        with CaptureQueriesContext(connection) as ctx:
+            page = paginator.page(number=10 ** 9)
+        self.assertEqual(list(page), self.resources[2::-1])
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'OFFSET' in q['sql']])
+
+        # 页码超过上限但仍在范围内的旧链接回到首页
+        with patch('core.pagination.MAX_OFFSET_PAGE', 1), CaptureQueriesContext(connection) as ctx:
+            page = paginator.page(number=2)
+        self.assertEqual((page.number, list(page)), (1, self.resources[:3:-1]))
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'OFFSET' in q['sql']])
+
+        response = self.client.get(reverse('core:index'), {'page': 10 ** 9})
+        self.assertEqual(response.status_code, 200)
+
+    def test_category_view_follows_next_link(self):
+        # 视图每页12条，补足到两页
+        for _ in range(6):
+            self.make_resource()
+        url = reverse('core:category_resources', args=[self.category.id])
+        first = self.client.get(url, {'sort': 'views'}).context['resources']
+        response = self.client.get(f'{url}?{first.next_query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['resources'].number, 2)
+        self.assertIn('sort=views', first.next_query)
+
+    def test_index_renders_windowed_navigation(self):
+        for _ in range(6):
+            self.make_resource()
+        response = self.client.get(reverse('core:index'))
+        self.assertContains(response, 'after=')
+        self.assertNotContains(response, 'before=')
+
+
+class QueryBudgetTests(ResourceTestMixin, TestCase):
+    """公开页面的查询次数预算，防止 N+1 查询回归"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other_category = Category.objects.create(name='音乐')
+        other_cloud = CloudType.objects.create(name='阿里云盘')
+        for i in range(30):
+            create_resource(
+                cls.user,
+                cls.category if i % 2 else other_category,
+                cls.cloud_type if i % 3 else other_cloud,
+                title=f'科幻电影{i}',
+                description='很长的描述' * 200,
+            )
+        cls.resource = Resource.objects.filter(category=cls.category).first()
+        RelatedResource.objects.bulk_create([
+            RelatedResource(resource=cls.resource, related=related, rank=rank, score=0.5)
+            for rank, related in enumerate(Resource.objects.exclude(id=cls.resource.id)[:6])
+        ])
+
+    def setUp(self):
+        cache.clear()
+        caches['counters'].clear()
+        get_search_backend().rebuild()
+        # 分类、网盘类型来自查询缓存
+        lookups.refresh_lookups()
+
+    def test_index(self):
+        # 当前页资源 + 总数
+        with self.assertNumQueries(2):
+            self.client.get(reverse('core:index'))
+        # 匿名访问命中整页缓存
+        with self.assertNumQueries(0):
+            self.client.get(reverse('core:index'))
+
+    def test_category(self):
+        url = reverse('core:category_resources', args=[self.category.id])
+        # 分类 + 当前页资源 + 总数
+        with self.assertNumQueries(3):
+            self.client.get(url, {'sort': 'likes'})
+
+    def test_hot(self):
+        # 当前页资源 + 总数
+        with self.assertNumQueries(2):
+            self.client.get(reverse('core:hot_resources'), {'sort': 'collects'})
+
+    def test_search(self):
+        # 当前页资源
+        with self.assertNumQueries(1):
+            self.client.get(reverse('core:search_resources'), {'q': '科幻'})
+
+    def test_resource_detail(self):
+        # 资源 + 相关资源 + 评论
+        with self.assertNumQueries(3):
+            self.client.get(reverse('core:resource_detail', args=[self.resource.id]))
+
+    def test_sitemap(self):
+        # 最大 id + 分片内容，之后直接读缓存
+        with self.assertNumQueries(2):
+            self.client.get('/sitemap.xml')
+        with self.assertNumQueries(0):
+            self.client.get('/sitemap.xml')
+
+    def test_card_columns_projected(self):
+        resource = Resource.objects.for_cards().get(id=self.resource.id)
+        self.assertEqual(len(resource.description_excerpt), 120)
+        self.assertIn('description', resource.get_deferred_fields())
+
+
+class LookupCacheTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        lookups.invalidate_lookups(*lookups.LOADERS)
+
+    def expire(self, name):
+        """让共享缓存中的条目软过期，并清空进程内缓存"""
+        value, _ = cache.get(lookups.KEY % name)
+        cache.set(lookups.KEY % name, (value, time.time() - 1))
+        lookups._local.clear()
+
+    def test_two_level_cache(self):
+        with self.assertNumQueries(1):
+            lookups.get_categories()
+        with self.assertNumQueries(0):
+            self.assertEqual(lookups.get_categories(), [self.category])
+        # 进程内缓存过期后从共享缓存读取
+        lookups._local.clear()
+        with self.assertNumQueries(0):
+            lookups.get_categories()
+
+    def test_changes_reloaded_by_writer(self):
+        lookups.get_cloud_types()
+        with self.captureOnCommitCallbacks(execute=True):
+            CloudType.objects.create(name='夸克网盘', is_active=False)
+        with self.assertNumQueries(0):
+            self.assertEqual([c.name for c in lookups.get_cloud_types()], ['夸克网盘', '百度网盘'])
+            self.assertEqual(lookups.get_cloud_types(active_only=True), [self.cloud_type])
+
+    def test_expired_entry_served_while_another_process_reloads(self):
+        lookups.get_categories()
+        self.expire('categories')
+        cache.add(lookups.LOCK_KEY % 'categories', 1)
+        Category.objects.filter(id=self.category.id).update(name='纪录片')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(lookups.get_categories()[0].name, '电影')
+
+        cache.delete(lookups.LOCK_KEY % 'categories')
+        self.expire('categories')
+        with self.assertNumQueries(1):
+            self.assertEqual(lookups.get_categories()[0].name, '纪录片')
+        self.assertIsNone(cache.get(lookups.LOCK_KEY % 'categories'))
+
+    def test_missing_entry_waits_for_lock_holder(self):
+        cache.add(lookups.LOCK_KEY % 'categories', 1)
+
+        def holder_finishes(seconds):
+            cache.set(lookups.KEY % 'categories', ([self.category], time.time() + 60))
+
+        with patch('core.lookups.time.sleep', side_effect=holder_finishes) as sleep:
+            with self.assertNumQueries(0):
+                self.assertEqual(lookups.get_categories(), [self.category])
+        sleep.assert_called_once()
+
+    def test_lock_wait_timeout_queries_directly(self):
+        cache.add(lookups.LOCK_KEY % 'categories', 1)
+        with patch('core.lookups.LOCK_WAIT', 0):
+            with self.assertNumQueries(1):
+                self.assertEqual(lookups.get_categories(), [self.category])
+
+    def test_upload_form_choices(self):
+        CloudType.objects.create(name='停用网盘', is_active=False)
+        lookups.refresh_lookups()
+        with self.assertNumQueries(0):
+            form = ResourceUploadForm()
+            html = str(form['cloud_type'])
+        self.assertIn('百度网盘', html)
+        self.assertNotIn('停用网盘', html)
+
+        form = ResourceUploadForm(data={
+            'title': '资源', 'category': self.category.id, 'cloud_type': self.cloud_type.id,
+            'keywords': '电影', 'resource_url': 'https://pan.baidu.com/s/test',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_cards_use_cached_names(self):
+        self.make_resource(title='卡片资源')
+        lookups.refresh_lookups()
+        resources = list(Resource.objects.for_cards())
+        with self.assertNumQueries(0):
+            html = render_cards(resources, 'resource', desc_length=60)
+        self.assertIn(self.category.name, html)
+        self.assertIn(self.cloud_type.name, html)
+
+
+class HotScoreTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_weights_and_decay(self):
+        now = timezone.now()
+        fresh = compute_hot_score(10, 1, 1, 1, now, now)
+        self.assertAlmostEqual(fresh, (10 + 3 + 5 + 2) / 2 ** 1.5)
+        older = compute_hot_score(10, 1, 1, 1, now - timezone.timedelta(days=1), now)
+        self.assertLess(older, fresh)
+        self.assertEqual(compute_hot_score(0, 0, 0, 0, now, now), 0)
+
+    def test_refresh_writes_changed_scores(self):
+        resource = self.make_resource(view_count=100)
+        self.assertEqual(refresh_hot_scores(), 1)
+        resource.refresh_from_db()
+        self.assertGreater(resource.hot_score, 0)
+        # 分数没有明显变化时不重复写回
+        self.assertEqual(refresh_hot_scores(now=resource.created_at), 0)
+
+    def test_hot_page_orders_by_score(self):
+        cold = self.make_resource(title='冷门', view_count=1)
+        hot = self.make_resource(title='热门', view_count=1, like_count=50)
+        refresh_hot_scores()
+
+        response = self.client.get(reverse('core:hot_resources'))
+        self.assertEqual(list(response.context['resources']), [hot, cold])
+
+        response = self.client.get(reverse('core:category_resources', args=[self.category.id]), {'sort': 'hot'})
+        self.assertEqual(list(response.context['resources']), [hot, cold])
+
+    def test_like_refreshes_score(self):
+        resource = self.make_resource()
+        self.client.force_login(self.user)
+        self.client.post(reverse('core:like_resource', args=[resource.id]))
+        resource.refresh_from_db()
+        self.assertGreater(resource.hot_score, 0)
+
+
+class CounterReconcileTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        self.other = CustomUser.objects.create_user(username='other', password='pass12345')
+
+    def test_fixes_drifted_counters(self):
+        drifted = self.make_resource(like_count=5, comment_count=0, report_count=3)
+        Like.objects.create(user=self.user, resource=drifted)
+        Like.objects.create(user=self.other, resource=drifted)
+        Comment.objects.create(user=self.user, resource=drifted, content='好')
+        exact = self.make_resource(collect_count=1)
+        Favorite.objects.create(user=self.user, resource=exact)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            scanned, stats = reconcile_counters(batch_size=1)
+
+        self.assertEqual(scanned, 2)
+        self.assertEqual((stats['like_count'].rows, stats['like_count'].max_drift), (1, -3))
+        self.assertEqual(stats['comment_count'].max_resource_id, drifted.id)
+        self.assertEqual(stats['report_count'].total, 3)
+        self.assertEqual(stats['collect_count'].rows, 0)
+
+        drifted.refresh_from_db()
+        self.assertEqual((drifted.like_count, drifted.comment_count, drifted.report_count), (2, 1, 0))
+        self.assertGreater(drifted.hot_score, 0)
+
+        # 再次执行不再有偏差
+        _, stats = reconcile_counters()
+        self.assertFalse(any(drift.rows for drift in stats.values()))
+
+    def test_concurrent_change_between_reads_not_written_as_drift(self):
+        resource = self.make_resource(like_count=3)
+        Like.objects.create(user=self.user, resource=resource)
+        real_actual_counts = reconcile._actual_counts
+
+        def concurrent_like(model, first_id, last_id):
+            # 模拟读出计数之后、分组统计之前提交的一次点赞（READ COMMITTED 下两次读取看到不同的数据）
+            if model is Like and not Like.objects.filter(user=self.other).exists():
+                Like.objects.create(user=self.other, resource=resource)
+                Resource.objects.filter(id=resource.id).update(like_count=F('like_count') + 1)
+            return real_actual_counts(model, first_id, last_id)
+
+        with patch('core.reconcile._actual_counts', side_effect=concurrent_like):
+            reconcile_counters(counters=['like_count'])
+
+        resource.refresh_from_db()
+        self.assertEqual(resource.like_count, 2)
+
+    def test_command_dry_run(self):
+        resource = self.make_resource(comment_count=4)
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', '--counter', 'comment_count', stdout=out)
+
+        self.assertIn('comment_count: 1个资源有偏差', out.getvalue())
+        resource.refresh_from_db()
+        self.assertEqual(resource.comment_count, 4)
+
+
+class BulkActionTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username='admin', password='pass12345')
+        self.client.force_login(self.admin)
+
+    def seed(self, size):
+        """size 个资源，每个资源一条评论和一条举报"""
+        resources = [self.make_resource(title=f'资源{i}', comment_count=1, report_count=1) for i in range(size)]
+        Comment.objects.bulk_create([Comment(user=self.user, resource=r, content='评论') for r in resources])
+        Report.objects.bulk_create([Report(user=self.user, resource=r) for r in resources])
+        return resources
+
+    def post_action(self, model, action, ids):
+        return self.client.post(reverse(f'admin:core_{model}_changelist'), {
+            'action': action,
+            '_selected_action': list(ids),
+        })
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def test_toggle_featured(self):
+        featured = self.make_resource(is_featured=True)
+        plain = self.make_resource()
+        self.post_action('resource', 'toggle_featured', [featured.id, plain.id])
+
+        featured.refresh_from_db()
+        plain.refresh_from_db()
+        self.assertEqual((featured.is_featured, plain.is_featured), (False, True))
+
+    def test_approval_chunked_into_transactions(self):
+        resources = [self.make_resource(is_approved=False) for _ in range(5)]
+        ids = [r.id for r in resources]
+        with patch('core.bulk.BULK_CHUNK_SIZE', 2), patch('core.bulk.resources_changed') as changed:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(bulk.set_approval(ids, True), 5)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 3)
+        # 每块一个事务（测试中表现为保存点）
+        self.assertEqual(sum(q['sql'].startswith('SAVEPOINT') for q in queries), 3)
+        changed.assert_called_once_with(ids)
+        self.assertEqual(Resource.objects.filter(is_approved=True).count(), 5)
+
+    def test_clear_reports(self):
+        resource, other = self.seed(2)
+        self.post_action('resource', 'clear_reports', [resource.id])
+
+        resource.refresh_from_db()
+        self.assertEqual(resource.report_count, 0)
+        self.assertEqual(list(Report.objects.values_list('resource_id', flat=True)), [other.id])
+
+    def test_delete_comments_decrements_grouped_counts(self):
+        resource, other = self.seed(2)
+        Comment.objects.create(user=self.user, resource=resource, content='第二条')
+        Resource.objects.filter(id=resource.id).update(comment_count=2)
+
+        ids = Comment.objects.filter(resource=resource).values_list('id', flat=True)
+        self.post_action('comment', 'delete_selected_comments', ids)
+
+        resource.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((resource.comment_count, other.comment_count), (0, 1))
+        self.assertFalse(Comment.objects.filter(resource=resource).exists())
+
+    def test_ignore_reports(self):
+        resource, _ = self.seed(2)
+        Report.objects.create(user=self.admin, resource=resource)
+        Resource.objects.filter(id=resource.id).update(report_count=2)
+
+        self.post_action('report', 'ignore_reports', Report.objects.filter(resource=resource).values_list('id', flat=True))
+
+        resource.refresh_from_db()
+        self.assertEqual(resource.report_count, 0)
+        self.assertEqual(Report.objects.count(), 1)
+
+    def test_process_reports_unapproves_resources(self):
+        resource, other = self.seed(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_action('report', 'process_reports', Report.objects.filter(resource=resource).values_list('id', flat=True))
+
+        resource.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((resource.is_approved, other.is_approved), (False, True))
+
+    def test_delete_reports_and_resources_refreshes_tags(self):
+        resources = self.seed(3)
+        Resource.objects.filter(id__in=[r.id for r in resources]).update(keywords='科幻')
+        for resource in resources:
+            resource.keywords = '科幻'
+            sync_resource_tags(resource)
+        refresh_tag_counts(Tag.objects.values_list('id', flat=True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reports, deleted = bulk.delete_reports_and_resources(
+                Report.objects.filter(resource__in=resources[:2]).values_list('id', flat=True)
+            )
+
+        self.assertEqual((reports, deleted), (2, 2))
+        self.assertEqual(list(Resource.objects.all()), [resources[2]])
+        self.assertEqual(Tag.objects.get(name='科幻').resource_count, 1)
+
+    def test_query_count_does_not_grow_with_selection(self):
+        actions = [
+            lambda ids: bulk.toggle_featured(ids),
+            lambda ids: bulk.clear_reports(ids),
+            lambda ids: bulk.delete_comments(Comment.objects.filter(resource_id__in=ids).values_list('id', flat=True)),
+            lambda ids: bulk.ignore_reports(Report.objects.filter(resource_id__in=ids).values_list('id', flat=True)),
+            lambda ids: bulk.process_reports(Report.objects.filter(resource_id__in=ids).values_list('id', flat=True)),
+            lambda ids: bulk.delete_reports_and_resources(
+                Report.objects.filter(resource_id__in=ids).values_list('id', flat=True)),
+        ]
+        small = [r.id for r in self.seed(2)]
+        large = [r.id for r in self.seed(20)]
+        for action in actions:
+            self.assertEqual(self.count_queries(lambda: action(small)), self.count_queries(lambda: action(large)))
+
+    def test_large_selection_chunked(self):
+        ids = [r.id for r in self.seed(5)]
+        with patch.object(bulk, 'BULK_CHUNK_SIZE', 2):
+            self.assertEqual(list(bulk.chunked(ids)), [ids[:2], ids[2:4], ids[4:]])
+            self.assertEqual(bulk.delete_comments(Comment.objects.values_list('id', flat=True)), 5)
+        self.assertFalse(Resource.objects.filter(comment_count__gt=0).exists())
+
+
+class AdminScalingTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username='admin', password='pass12345')
+        self.client.force_login(self.admin)
+
+    def seed(self, size, start=0):
+        for i in range(start, start + size):
+            user = CustomUser.objects.create_user(username=f'reporter{i}', password='pass12345')
+            uploader = CustomUser.objects.create_user(username=f'uploader{i}', password='pass12345')
+            resource = create_resource(uploader, self.category, self.cloud_type, title=f'资源{i}')
+            Comment.objects.create(user=user, resource=resource, content='评论')
+            Report.objects.create(user=user, resource=resource)
+
+    def changelist_queries(self, model, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:core_{model}_changelist'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.seed(2)
+        small = {model: self.changelist_queries(model) for model in ('comment', 'report', 'resource', 'favorite')}
+        self.seed(8, start=2)
+        large = {model: self.changelist_queries(model) for model in ('comment', 'report', 'resource', 'favorite')}
+        self.assertEqual(small, large)
+
+    def test_autocomplete_filters_render_only_selected_option(self):
+        self.seed(3)
+        reporter = CustomUser.objects.get(username='reporter1')
+
+        response = self.client.get(reverse('admin:core_comment_changelist'), {'user__id__exact': reporter.id})
+        html = response.content.decode()
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertIn('data-ajax--url', html)
+        self.assertIn(f'<option value="{reporter.id}" selected>reporter1</option>', html)
+        self.assertNotIn('reporter2', html)
+
+        response = self.client.get(reverse('admin:core_report_changelist'), {
+            'resource__user__id__exact': CustomUser.objects.get(username='uploader2').id,
+        })
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_resource_form_uses_autocomplete_for_user(self):
+        self.seed(3)
+        resource = Resource.objects.first()
+        response = self.client.get(reverse('admin:core_resource_change', args=[resource.id]))
+        html = response.content.decode()
+        self.assertIn('admin-autocomplete', html)
+        self.assertNotIn('reporter0', html)
+
+    def test_paginator_uses_estimate_for_unfiltered_lists(self):
+        self.seed(2)
+        with patch('core.admin_tools.estimate_row_count', return_value=5000000):
+            response = self.client.get(reverse('admin:core_comment_changelist'))
+            self.assertEqual(response.context['cl'].result_count, 5000000)
+
+            # 有筛选条件时仍然计数（有上限）
+            response = self.client.get(reverse('admin:core_comment_changelist'), {'q': '评论'})
+            self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_paginator_bounds_exact_count(self):
+        self.seed(3)
+        with patch('core.admin_tools.MAX_EXACT_COUNT', 2):
+            paginator = EstimatedCountPaginator(Comment.objects.filter(content='评论'), 10)
+            self.assertEqual(paginator.count, 2)
+
+
+def explain(sql):
+    """返回查询计划中每一步的描述"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+        cursor.execute(f'EXPLAIN {sql}')
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def plan_problems(plan, ignore_tables=()):
+    """找出计划中的全表扫描和文件排序"""
+    problems = []
+    for step in plan:
+        if connection.vendor == 'sqlite':
+            if step.startswith('SCAN ') and step.split()[1] not in ignore_tables and 'INDEX' not in step:
+                problems.append(step)
+            elif 'TEMP B-TREE' in step:
+                problems.append(step)
+        else:
+            if step.get('table') in ignore_tables:
+                continue
+            extra = step.get('Extra') or ''
+            if step.get('type') == 'ALL' or 'filesort' in extra:
+                problems.append(step)
+    return problems
+
+
+class QueryPlanTests(ResourceTestMixin, TestCase):
+    """对各公开页面实际执行的查询做 EXPLAIN，出现全表扫描或文件排序即失败"""
+
+    # 分类、网盘类型是只有几十行的字典表，全表读取（如首页的分类列表）是预期行为
+    LOOKUP_TABLES = ('core_category', 'core_cloudtype')
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        categories = [cls.category] + [Category.objects.create(name=f'分类{i}') for i in range(4)]
+        resources = [
+            Resource(user=cls.user, category=categories[i % len(categories)], cloud_type=cls.cloud_type,
+                     title=f'资源{i}', keywords='', resource_url='https://pan.baidu.com/s/test',
+                     is_approved=i % 10 != 0, view_count=i % 37, like_count=i % 11, copy_count=i % 7,
+                     collect_count=i % 5, comment_count=i % 3, hot_score=i % 13)
+            for i in range(300)
+        ]
+        Resource.objects.bulk_create(resources)
+        cls.resource = Resource.objects.filter(category=cls.category, is_approved=True).first()
+        RelatedResource.objects.bulk_create([
+            RelatedResource(resource=cls.resource, related=related, rank=rank, score=0.5)
+            for rank, related in enumerate(Resource.objects.exclude(id=cls.resource.id)[:6])
+        ])
+
+    def setUp(self):
+        cache.clear()
+        caches['counters'].clear()
+
+    def assert_plans_clean(self, path, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            if any(f'FROM "{table}"' in sql or f'FROM `{table}`' in sql for table in self.LOOKUP_TABLES):
+                continue
+            plan = explain(sql)
+            self.assertEqual(plan_problems(plan, self.LOOKUP_TABLES), [], f'{path} {params}\n{sql}\n{plan}')
+        return response
+
+    def test_index(self):
+        response = self.assert_plans_clean(reverse('core:index'))
+        self.assert_plans_clean(f"{reverse('core:index')}?{response.context['resources'].next_query}")
+
+    def test_category_sorts(self):
+        url = reverse('core:category_resources', args=[self.category.id])
+        for sort in ('newest', 'hot', 'views', 'likes', 'copies'):
+            response = self.assert_plans_clean(url, {'sort': sort})
+            self.assert_plans_clean(f"{url}?{response.context['resources'].next_query}")
+
+    def test_hot_sorts(self):
+        url = reverse('core:hot_resources')
+        for sort in ('hot', 'newest', 'views', 'likes', 'collects', 'comments', 'copies'):
+            response = self.assert_plans_clean(url, {'sort': sort})
+            self.assert_plans_clean(f"{url}?{response.context['resources'].next_query}")
+
+    def test_tag_page(self):
+        tag = Tag.objects.create(name='科幻')
+        ResourceTag.objects.bulk_create([
+            ResourceTag(tag=tag, resource=resource) for resource in Resource.objects.all()[:50]
+        ])
+        self.assert_plans_clean(reverse('core:tag_resources', args=['科幻']))
+
+    def test_resource_detail(self):
+        self.assert_plans_clean(reverse('core:resource_detail', args=[self.resource.id]))
+        # 还没有推荐结果时退回到同分类最新资源
+        other = Resource.objects.filter(category=self.category, is_approved=True).last()
+        self.assert_plans_clean(reverse('core:resource_detail', args=[other.id]))
+
+    def test_comment_pages(self):
+        Comment.objects.bulk_create([
+            Comment(user=self.user, resource=self.resource, content=f'评论{i}') for i in range(30)
+        ])
+        response = self.assert_plans_clean(reverse('core:resource_detail', args=[self.resource.id]))
+        self.assert_plans_clean(reverse('core:resource_comments', args=[self.resource.id]),
+                                {'after': response.context['comments_next_cursor']})
+
+
+class CardCacheTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def card(self, resource_id):
+        return Resource.objects.for_cards().get(id=resource_id)
+
+    def test_cards_rendered_once_then_cached(self):
+        resource = self.make_resource(title='缓存卡片')
+        html = render_cards([self.card(resource.id)], 'resource', desc_length=60)
+        self.assertIn('缓存卡片', html)
+
+        key = card_cache_key('resource', self.card(resource.id), {'desc_length': 60})
+        self.assertEqual(cache.get(key), html)
+
+        with patch('core.cards.get_template') as get_template:
+            self.assertEqual(render_cards([self.card(resource.id)], 'resource', desc_length=60), html)
+        get_template.return_value.render.assert_not_called()
+
+    def test_version_changes_with_resource_and_lookups(self):
+        resource = self.make_resource()
+        key = card_cache_key('resource', self.card(resource.id), {})
+
+        Resource.objects.filter(id=resource.id).update(like_count=5)
+        self.assertNotEqual(card_cache_key('resource', self.card(resource.id), {}), key)
+
+        key = card_cache_key('resource', self.card(resource.id), {})
+        Category.objects.filter(id=self.category.id).update(name='纪录片')
+        self.assertNotEqual(card_cache_key('resource', self.card(resource.id), {}), key)
+
+    def test_render_params_are_part_of_key(self):
+        card = self.card(self.make_resource().id)
+        self.assertNotEqual(card_cache_key('search_result', card, {'query': 'a'}),
+                            card_cache_key('search_result', card, {'query': 'b'}))
+
+
+class PageCacheTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['counters'].clear()
+
+    def get(self, url, **params):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url, params)
+
+    def assert_cached(self, url, **params):
+        self.assertEqual(self.get(url, **params).get('X-Page-Cache'), 'hit')
+
+    def assert_not_cached(self, url, **params):
+        self.assertIsNone(self.get(url, **params).get('X-Page-Cache'))
+
+    def test_anonymous_pages_cached(self):
+        url = reverse('core:index')
+        self.assert_not_cached(url)
+        self.assert_cached(url)
+        # 不同页码分开缓存
+        self.assert_not_cached(url, page=2)
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.force_login(self.user)
+        url = reverse('core:index')
+        self.get(url)
+        self.assert_not_cached(url)
+
+    def test_new_resource_purges_lists_but_not_other_categories(self):
+        other = Category.objects.create(name='音乐')
+        index = reverse('core:index')
+        own_category = reverse('core:category_resources', args=[self.category.id])
+        other_category = reverse('core:category_resources', args=[other.id])
+        for url in (index, own_category, other_category):
+            self.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_resource(title='新资源')
+
+        self.assert_not_cached(index)
+        self.assert_not_cached(own_category)
+        self.assert_cached(other_category)
+
+    def test_comment_purges_detail_page(self):
+        resource = self.make_resource()
+        url = reverse('core:resource_detail', args=[resource.id])
+        self.get(url)
+        self.assert_cached(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.user, resource=resource, content='不错')
+        self.assert_not_cached(url)
+
+    def test_cached_detail_still_counts_views(self):
+        resource = self.make_resource()
+        url = reverse('core:resource_detail', args=[resource.id])
+        self.get(url)
+        self.get(url)
+        self.assertEqual(get_pending_views([resource.id]), {resource.id: 2})
+
+    def test_admin_approval_purges_pages(self):
+        resource = self.make_resource(is_approved=False)
+        url = reverse('core:index')
+        self.get(url)
+
+        admin_user = CustomUser.objects.create_superuser(username='admin', password='pass12345')
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:core_resource_changelist'), {
+            'action': 'approve_resources',
+            '_selected_action': [resource.id],
+        })
+        self.client.logout()
+
+        response = self.get(url)
+        self.assertIsNone(response.get('X-Page-Cache'))
+        self.assertContains(response, resource.title)
+
+    def test_filtered_admin_approval_purges_pages(self):
+        # 在“未审核”筛选下批量通过，更新后筛选条件不再匹配这些资源
+        resource = self.make_resource(is_approved=False)
+        url = reverse('core:index')
+        self.get(url)
+
+        admin_user = CustomUser.objects.create_superuser(username='admin', password='pass12345')
+        self.client.force_login(admin_user)
+        with patch('core.bulk.purge_resource_pages') as purge:
+            self.client.post(reverse('admin:core_resource_changelist') + '?is_approved__exact=0', {
+                'action': 'approve_resources',
+                '_selected_action': [resource.id],
+            })
+        self.assertEqual(purge.call_args[0][0], [resource.id])
+
+    def test_purge_tags(self):
+        url = reverse('core:resource_detail', args=[self.make_resource().id])
+        self.get(url)
+        purge_tags('lookups')
+        self.assert_not_cached(url)
+
+
+class ReplicaRouterTests(ResourceTestMixin, TestCase):
+
+    def test_reads_and_writes_default_outside_requests(self):
+        router = PrimaryReplicaRouter()
+        with override_settings(DATABASE_REPLICAS=['replica']):
+            self.assertEqual(router.db_for_read(Resource), 'default')
+            self.assertEqual(router.db_for_write(Resource), 'default')
+
+    def test_no_pin_cookie_without_replicas(self):
+        self.client.force_login(self.user)
+        resource = self.make_resource()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('core:like_resource', args=[resource.id]))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_async_handler_calls_process_view_without_thread(self):
+        handler = BaseHandler()
+        handler.load_middleware(is_async=True)
+        # 没有被 sync_to_async 包装，直接是中间件实例上的协程方法
+        methods = [method for method in handler._view_middleware
+                   if getattr(method, '__func__', None) is ReplicaRoutingMiddleware.aprocess_view]
+        self.assertEqual(len(methods), 1)
+
+
+# 测试运行器会收集被跳过的测试类的 databases，没有 replica 库时不能声明它
+HAS_REPLICA_DB = 'replica' in settings.DATABASES
+
+
+@skipUnless(HAS_REPLICA_DB, '需要名为 replica 的测试数据库，可设置 DB_ENGINE=sqlite 运行')
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(ResourceTestMixin, TestCase):
+    databases = {'default', 'replica'} if HAS_REPLICA_DB else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        # 副本与主库各有一条对方没有的资源，用来判断请求读的是哪个库
+        for model, obj in ((CustomUser, self.user), (Category, self.category), (CloudType, self.cloud_type)):
+            model.objects.using('replica').bulk_create([obj])
+        self.on_primary = self.make_resource(title='主库资源')
+        self.on_replica, = Resource.objects.using('replica').bulk_create([Resource(
+            user=self.user, category=self.category, cloud_type=self.cloud_type,
+            title='副本资源', resource_url='https://pan.baidu.com/s/test',
+        )])
+
+    def test_marked_views_read_replica(self):
+        response = self.client.get(reverse('core:index'))
+        self.assertContains(response, '副本资源')
+        self.assertNotContains(response, '主库资源')
+
+    async def test_marked_views_read_replica_under_asgi(self):
+        response = await self.async_client.get(reverse('core:index'))
+        self.assertContains(response, '副本资源')
+        self.assertNotContains(response, '主库资源')
+
+    def test_writes_pin_client_to_primary(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('core:like_resource', args=[self.on_primary.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+        response = self.client.get(reverse('core:index'))
+        self.assertContains(response, '主库资源')
+        self.assertNotContains(response, '副本资源')
+
+    def test_unmarked_views_read_primary(self):
+        Like.objects.create(user=self.user, resource=self.on_primary)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('core:interaction_states'), {'ids': self.on_primary.id})
+        self.assertTrue(response.json()['states'][str(self.on_primary.id)]['liked'])
+
+    async def test_async_views_pin_client_to_primary(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.post(reverse('core:like_resource', args=[self.on_primary.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+    def test_skip_page_cache_fill_after_purge(self):
+        url = reverse('core:index')
+        purge_tags(LIST_TAG)
+        self.client.get(url)
+        # 失效后的复制延迟窗口内从副本读到的页面不写入缓存
+        self.assertIsNone(self.client.get(url).get('X-Page-Cache'))
+
+        with patch('core.db_router.time.time', return_value=time.time() + 11):
+            self.client.get(url)
+            self.assertEqual(self.client.get(url).get('X-Page-Cache'), 'hit')
+
+
+class InteractionViewTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.resource = self.make_resource()
+
+    def post(self, name, *args, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse(f'core:{name}', args=args), data)
+
+    def test_like_toggles(self):
+        data = self.post('like_resource', self.resource.id).json()
+        self.assertEqual((data['liked'], data['like_count']), (True, 1))
+        data = self.post('like_resource', self.resource.id).json()
+        self.assertEqual((data['liked'], data['like_count']), (False, 0))
+        self.assertFalse(Like.objects.exists())
+
+    def test_favorite_toggles(self):
+        data = self.post('favorite_resource', self.resource.id).json()
+        self.assertEqual((data['favorited'], data['collect_count']), (True, 1))
+        self.resource.refresh_from_db()
+        self.assertGreater(self.resource.hot_score, 0)
+
+    def test_report_once(self):
+        self.assertEqual(self.post('report_resource', self.resource.id).json()['report_count'], 1)
+        self.assertEqual(self.post('report_resource', self.resource.id).status_code, 400)
+        self.resource.refresh_from_db()
+        self.assertEqual(self.resource.report_count, 1)
+
+    def test_comment_add_and_delete(self):
+        data = self.post('add_comment', self.resource.id, content='很好').json()
+        self.assertEqual(data['comment_count'], 1)
+        data = self.post('delete_comment', data['comment_id']).json()
+        self.assertEqual(data['comment_count'], 0)
+
+    def test_counter_never_negative(self):
+        comment = Comment.objects.create(user=self.user, resource=self.resource, content='很好')
+        # 计数与记录不一致时删除评论也不会出现负数
+        self.assertEqual(interactions.delete_comment(comment), 0)
+
+    def test_missing_resource_404(self):
+        self.assertEqual(self.post('like_resource', 999999).status_code, 404)
+        self.assertEqual(self.post('add_comment', 999999, content='很好').status_code, 404)
+
+    def test_like_query_budget(self):
+        # 会话、用户、保存点、锁资源行、删除点赞、插入点赞、写回计数和热度分、释放保存点；
+        # SQLite 没有 SELECT ... FOR UPDATE，锁行前多一条取得写锁的 UPDATE
+        locking = 0 if connection.features.has_select_for_update else 1
+        with CaptureQueriesContext(connection) as queries:
+            self.post('like_resource', self.resource.id)
+        self.assertEqual(len(queries), 8 + locking)
+        resource_queries = [q['sql'] for q in queries if q['sql'].split(' WHERE ')[0].count('core_resource')]
+        # 计数和热度分一条 UPDATE 写回，之后不再查询资源
+        self.assertEqual([sql.split()[0] for sql in resource_queries], ['UPDATE'] * locking + ['SELECT', 'UPDATE'])
+        self.assertIn('"hot_score"', resource_queries[-1])
+
+
+
+
+class AsyncInteractionViewTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        self.resource = self.make_resource()
+
+    async def post(self, name, *args, client=None, **data):
+        client = client or self.async_client
+        return await client.post(reverse(f'core:{name}', args=args), data)
+
+    async def login(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+
+    def test_views_are_async(self):
+        for view in (views.like_resource, views.favorite_resource, views.add_comment,
+                     views.report_resource, views.increase_copy_count):
+            self.assertTrue(asyncio.iscoroutinefunction(view), view.__name__)
+
+    async def test_login_and_method_required(self):
+        response = await self.post('like_resource', self.resource.id)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(settings.LOGIN_URL, response['Location'])
+
+        await self.login()
+        response = await self.async_client.get(reverse('core:like_resource', args=[self.resource.id]))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_like_and_report(self):
+        await self.login()
+        data = (await self.post('like_resource', self.resource.id)).json()
+        self.assertEqual((data['liked'], data['like_count']), (True, 1))
+        data = (await self.post('favorite_resource', self.resource.id)).json()
+        self.assertEqual((data['favorited'], data['collect_count']), (True, 1))
+
+        self.assertEqual((await self.post('report_resource', self.resource.id)).json()['report_count'], 1)
+        self.assertEqual((await self.post('report_resource', self.resource.id)).status_code, 400)
+        self.assertEqual((await self.post('like_resource', 999999)).status_code, 404)
+
+    async def test_comment(self):
+        await self.login()
+        data = (await self.post('add_comment', self.resource.id, content='很好')).json()
+        self.assertEqual((data['username'], data['comment_count']), (self.user.username, 1))
+        response = await self.post('add_comment', self.resource.id, content='看 https://example.com')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_copy_count_without_csrf_token(self):
+        client = AsyncClient(enforce_csrf_checks=True)
+        self.assertEqual((await self.post('increase_copy_count', self.resource.id, client=client)).json()['new_count'], 1)
+        self.assertEqual((await self.post('increase_copy_count', 999999, client=client)).status_code, 404)
+        await self.resource.arefresh_from_db()
+        self.assertEqual(self.resource.copy_count, 1)
+
+
+class CommentPaginationTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['counters'].clear()
+        self.resource = self.make_resource(is_approved=True)
+        now = timezone.now()
+        comments = Comment.objects.bulk_create([
+            Comment(user=self.user, resource=self.resource, content=f'评论{i}') for i in range(45)
+        ])
+        # 部分评论时间相同，检验 (created_at, id) 游标不会重复或遗漏
+        for i, comment in enumerate(comments):
+            comment.created_at = now - timezone.timedelta(minutes=i // 3)
+        Comment.objects.bulk_update(comments, ['created_at'])
+
+    def test_detail_renders_first_page_only(self):
+        response = self.client.get(reverse('core:resource_detail', args=[self.resource.id]))
+        self.assertEqual(len(response.context['comments']), 20)
+        self.assertIsNotNone(response.context['comments_next_cursor'])
+        self.assertContains(response, 'load-more-comments')
+
+    def test_cursor_walks_all_comments_in_order(self):
+        response = self.client.get(reverse('core:resource_detail', args=[self.resource.id]))
+        seen = [comment.id for comment in response.context['comments']]
+        cursor = response.context['comments_next_cursor']
+        url = reverse('core:resource_comments', args=[self.resource.id])
+        while cursor:
+            data = self.client.get(url, {'after': cursor}).json()
+            seen.extend(int(pk) for pk in re.findall(r'data-comment-id="(\d+)"', data['html']))
+            cursor = data['next_cursor']
+
+        expected = list(Comment.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_detail_query_count_independent_of_comments(self):
+        url = reverse('core:resource_detail', args=[self.resource.id])
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        Comment.objects.bulk_create([
+            Comment(user=self.user, resource=self.resource, content='更多') for _ in range(100)
+        ])
+        cache.clear()
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(len(before), len(after))
+        self.assertEqual(len(response.context['comments']), 20)
+
+    def test_unapproved_resource_404(self):
+        resource = self.make_resource(is_approved=False)
+        response = self.client.get(reverse('core:resource_comments', args=[resource.id]))
+        self.assertEqual(response.status_code, 404)
+
+class InteractionStateTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.resources = [self.make_resource(title=f'资源{i}') for i in range(5)]
+
+    def get_states(self, resources):
+        ids = ','.join(str(resource.id) for resource in resources)
+        response = self.client.get(reverse('core:interaction_states'), {'ids': ids})
+        return response.json()['states']
+
+    def test_one_query_per_table_then_cached(self):
+        first, second = self.resources[:2]
+        Like.objects.create(user=self.user, resource=first)
+        Favorite.objects.create(user=self.user, resource=second)
+
+        # 会话 + 用户 + 三张互动表各一条
+        with self.assertNumQueries(5):
+            states = self.get_states(self.resources)
+        self.assertEqual(states[str(first.id)], {'liked': True, 'favorited': False, 'reported': False})
+        self.assertEqual(states[str(second.id)], {'liked': False, 'favorited': True, 'reported': False})
+        self.assertEqual(len(states), 5)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get_states(self.resources), states)
+
+    def test_toggle_invalidates_cached_state(self):
+        resource = self.resources[0]
+        self.assertFalse(self.get_states([resource])[str(resource.id)]['liked'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:like_resource', args=[resource.id]))
+        self.assertTrue(self.get_states([resource])[str(resource.id)]['liked'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:report_resource', args=[resource.id]))
+        self.assertTrue(self.get_states([resource])[str(resource.id)]['reported'])
+
+    def test_anonymous_gets_no_states(self):
+        self.client.logout()
+        self.assertEqual(self.get_states(self.resources), {})
+
+    def test_detail_marks_buttons(self):
+        resource = self.resources[0]
+        Favorite.objects.create(user=self.user, resource=resource)
+        resource.is_approved = True
+        resource.save()
+        response = self.client.get(reverse('core:resource_detail', args=[resource.id]))
+        self.assertContains(response, 'action-btn favorite-btn favorited')
+        self.assertNotContains(response, 'action-btn like-btn liked')
+
+class InteractionConcurrencyTests(ResourceTestMixin, TransactionTestCase):
+    """多个线程同时点赞、收藏、评论，计数必须与记录数一致"""
+
+    THREADS = 8
+    ROUNDS = 5
+
+    def setUp(self):
+        self.setUpTestData()
+        self.resource = self.make_resource()
+        self.users = [
+            CustomUser.objects.create_user(username=f'user{i}', password='pass12345')
+            for i in range(self.THREADS)
+        ]
+
+    def run_threads(self, target, users=None):
+        """每个用户一个线程执行 ROUNDS 次；锁冲突只靠互动操作自带的有限次重试"""
+        errors = []
+
+        def worker(user):
+            try:
+                for _ in range(self.ROUNDS):
+                    target(user)
+            except Exception as exc:  # pragma: no cover - 失败时在主线程报告
+                errors.append(exc)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users or self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.resource.refresh_from_db()
+
+    def test_concurrent_toggles(self):
+        self.run_threads(lambda user: interactions.toggle_relation(Like, 'like_count', user, self.resource.id))
+        self.assertEqual(self.resource.like_count, Like.objects.count())
+
+        self.run_threads(lambda user: interactions.toggle_relation(Favorite, 'collect_count', user, self.resource.id))
+        self.assertEqual(self.resource.collect_count, Favorite.objects.count())
+
+    def test_same_user_toggles_concurrently(self):
+        user = self.users[0]
+        # 同一用户在多个线程中同时切换点赞，共 THREADS × ROUNDS 次（偶数次），最终回到未点赞
+        self.run_threads(lambda user: interactions.toggle_relation(Like, 'like_count', user, self.resource.id),
+                         users=[user] * self.THREADS)
+        self.assertEqual(self.resource.like_count, Like.objects.count())
+        self.assertFalse(Like.objects.filter(user=user).exists())
+
+    def test_concurrent_reports(self):
+        self.run_threads(lambda user: interactions.add_relation(Report, 'report_count', user, self.resource.id))
+        self.assertEqual(self.resource.report_count, Report.objects.count())
+        self.assertEqual(self.resource.report_count, self.THREADS)
+
+    def test_concurrent_comments(self):
+        self.run_threads(lambda user: interactions.add_comment(user, self.resource.id, '很好'))
+        self.assertEqual(self.resource.comment_count, self.THREADS * self.ROUNDS)
+        self.assertEqual(self.resource.comment_count, Comment.objects.count())
+
+
+
+class AhoCorasickTests(TestCase):
+
+    def test_finds_terms_anywhere(self):
+        automaton = AhoCorasick(['赌博', '博彩', 'he', 'she', 'hers'])
+        self.assertEqual(automaton.search('这里有博彩信息'), '博彩')
+        self.assertEqual(automaton.search('ushers'), 'she')
+        self.assertIsNone(automaton.search('正常的评论'))
+
+    def test_suffix_outputs_found_through_fail_links(self):
+        # “abcd” 不完整时要沿失败指针找到 “bc”
+        automaton = AhoCorasick(['abcd', 'bc'])
+        self.assertEqual(automaton.search('xabce'), 'bc')
+
+    def test_case_and_width_insensitive(self):
+        automaton = AhoCorasick(['VPN'])
+        self.assertEqual(automaton.search('免费ｖｐｎ'), 'vpn')
+
+    def test_empty_dictionary(self):
+        automaton = AhoCorasick(['', '  '])
+        self.assertEqual(len(automaton), 0)
+        self.assertIsNone(automaton.search('任何内容'))
+
+
+class ModerationTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def add_term(self, term):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BannedTerm.objects.create(term=term)
+
+    def test_links_and_emails_rejected(self):
+        for text in ('看 https://example.com', '访问 www.example.com', '联系 a.b@example.com', 'ＨＴＴＰ://x.cn'):
+            self.assertIsNotNone(check_text(text), text)
+        self.assertIsNone(check_text('版本 1.2 很好用'))
+        self.assertIsNone(check_text('见 https://example.com', allow_links=True))
+
+    def test_dictionary_changes_hot_reload(self):
+        self.assertIsNone(check_text('这是赌博网站'))
+        term = self.add_term('赌博')
+        self.assertIn('赌博', check_text('这是赌博网站'))
+
+        term.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            term.save()
+        self.assertIsNone(check_text('这是赌博网站'))
+
+    def test_comment_rejected(self):
+        self.add_term('赌博')
+        resource = self.make_resource()
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('core:add_comment', args=[resource.id]), {'content': '赌博'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_upload_form_rejected(self):
+        self.add_term('赌博')
+        data = {
+            'title': '正常标题',
+            'category': self.category.id,
+            'cloud_type': self.cloud_type.id,
+            'description': '下载见 https://example.com',
+            'keywords': '电影,赌博',
+            'resource_url': 'https://pan.baidu.com/s/test',
+        }
+        form = ResourceUploadForm(data)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors), ['keywords'])
+
+        data['keywords'] = '电影'
+        self.assertTrue(ResourceUploadForm(data).is_valid())
+
+
+
+def make_image(size=(2000, 1500), fmt='JPEG', exif=True, color=(200, 100, 50)):
+    """生成测试图片，默认带 EXIF"""
+    from PIL import Image
+
+    image = Image.new('RGB', size, color)
+    buffer = io.BytesIO()
+    options = {}
+    if exif:
+        data = Image.Exif()
+        data[0x010F] = 'TestCamera'  # Make
+        options['exif'] = data.tobytes()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+class ScreenshotDerivativeTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root, CELERY_TASK_ALWAYS_EAGER=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def upload(self, name='shot.jpg', **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.make_resource(screenshot=SimpleUploadedFile(name, make_image(**kwargs)))
+
+    def open_derived(self, resource, size, fmt):
+        from PIL import Image
+
+        from django.core.files.storage import default_storage
+        return Image.open(default_storage.open(derived_name(resource.screenshot.name, size, fmt)))
+
+    def test_derivatives_generated_on_upload(self):
+        resource = self.upload()
+        resource.refresh_from_db()
+        self.assertTrue(has_derivatives(resource))
+
+        for size, (width, height) in SIZES.items():
+            webp = self.open_derived(resource, size, 'webp')
+            jpeg = self.open_derived(resource, size, 'jpeg')
+            self.assertEqual(webp.format, 'WEBP')
+            self.assertEqual(jpeg.format, 'JPEG')
+            self.assertLessEqual(jpeg.width, width)
+            self.assertLessEqual(jpeg.height, height)
+            self.assertEqual(len(jpeg.getexif()), 0)
+
+    def test_picture_tag_falls_back_until_generated(self):
+        resource = self.upload()
+        resource.refresh_from_db()
+        html = screenshot_picture(resource, 'card', alt='截图')
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('_card.jpeg', html)
+
+        # 截图被替换但派生图还没生成时回退到原图
+        resource.screenshot.name = 'screenshots/other.jpg'
+        html = screenshot_picture(resource, 'card')
+        self.assertNotIn('<picture>', html)
+        self.assertIn('other.jpg', html)
+
+    def test_same_stem_gets_separate_derivatives(self):
+        names = {derived_name(name, 'card', 'webp')
+                 for name in ('screenshots/a.png', 'screenshots/a.jpg', 'screenshots/2024/a.png')}
+        self.assertEqual(len(names), 3)
+
+        first = self.upload('a.png', fmt='PNG', exif=False, color=(255, 0, 0))
+        second = self.upload('a.jpg', color=(0, 0, 255))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertNotEqual(self.open_derived(first, 'card', 'jpeg').getpixel((0, 0)),
+                            self.open_derived(second, 'card', 'jpeg').getpixel((0, 0)))
+
+    def test_render_rejects_oversized_dimensions_without_decoding(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('1', (30000, 30000)).save(buffer, 'PNG')
+        buffer.seek(0)
+        with patch('PIL.ImageFile.ImageFile.load') as load:
+            with self.assertRaises(ValidationError):
+                render_derivatives(buffer)
+        load.assert_not_called()
+
+    def test_backfill_command(self):
+        resource = self.upload()
+        Resource.objects.filter(id=resource.id).update(screenshot_derived='')
+        self.make_resource()  # 没有截图的资源不处理
+
+        out = StringIO()
+        call_command('backfill_screenshot_derivatives', workers=1, stdout=out)
+        self.assertIn('生成1张', out.getvalue())
+        resource.refresh_from_db()
+        self.assertTrue(has_derivatives(resource))
+
+        out = StringIO()
+        call_command('backfill_screenshot_derivatives', workers=1, stdout=out)
+        self.assertIn('没有需要处理的截图', out.getvalue())
+
+
+
+class ScreenshotValidationTests(ResourceTestMixin, TestCase):
+
+    def form(self, content, name='shot.jpg'):
+        data = {
+            'title': '标题',
+            'category': self.category.id,
+            'cloud_type': self.cloud_type.id,
+            'keywords': '电影',
+            'resource_url': 'https://pan.baidu.com/s/test',
+        }
+        return ResourceUploadForm(data, {'screenshot': SimpleUploadedFile(name, content)})
+
+    def assert_rejected(self, content, name='shot.jpg'):
+        form = self.form(content, name)
+        self.assertFalse(form.is_valid())
+        self.assertIn('screenshot', form.errors)
+        return form.errors['screenshot'][0]
+
+    def test_valid_images_accepted(self):
+        for fmt in ('JPEG', 'PNG', 'GIF', 'WEBP'):
+            self.assertTrue(self.form(make_image((64, 48), fmt, exif=False), 'a.img').is_valid(), fmt)
+
+    def test_format_detected_from_content_not_extension(self):
+        self.assertTrue(self.form(make_image((64, 48), 'PNG', exif=False), 'shot.jpg').is_valid())
+        self.assert_rejected(b'<?php echo 1; ?>' + b'0' * 100, 'shot.png')
+
+    def test_truncated_header_rejected(self):
+        self.assertIn('损坏', self.assert_rejected(b'\x89PNG\r\n\x1a\n' + b'\x00' * 20, 'shot.png'))
+
+    def test_oversized_dimensions_rejected_without_decoding(self):
+        from PIL import Image
+
+        # 尺寸巨大但高度压缩的 PNG：文件很小，解码后会占用数 GB 内存
+        buffer = io.BytesIO()
+        Image.new('1', (30000, 30000)).save(buffer, 'PNG')
+        self.assertLess(len(buffer.getvalue()), MAX_UPLOAD_SIZE)
+        with patch('PIL.ImageFile.ImageFile.load') as load:
+            self.assertIn('尺寸过大', self.assert_rejected(buffer.getvalue(), 'bomb.png'))
+        load.assert_not_called()
+
+        self.assertIn('尺寸过大', self.assert_rejected(make_image((9000, 10), 'PNG', exif=False), 'wide.png'))
+
+    def test_file_size_limit(self):
+        self.assertIn('大小', self.assert_rejected(b'\xff\xd8\xff' + b'0' * MAX_UPLOAD_SIZE))
+
+    def test_upload_handler_skips_file_past_limit(self):
+        from django.core.files.uploadhandler import SkipFile
+
+        from .uploads import BoundedTemporaryFileUploadHandler, get_oversized_uploads
+
+        request = RequestFactory().get('/')
+        handler = BoundedTemporaryFileUploadHandler(request)
+        handler.new_file('screenshot', 'big.jpg', 'image/jpeg', None)
+        chunk = b'0' * (1024 * 1024)
+        with self.assertRaises(SkipFile):
+            for i in range(8):
+                handler.receive_data_chunk(chunk, i * len(chunk))
+        self.assertEqual(i, MAX_UPLOAD_SIZE // len(chunk))
+        self.assertEqual(get_oversized_uploads(request), {'screenshot'})
+        handler.file.close()
+
+    def oversized_file(self):
+        return SimpleUploadedFile('big.jpg', b'\xff\xd8\xff' + b'0' * MAX_UPLOAD_SIZE)
+
+    def test_oversized_upload_reported_by_form(self):
+        self.user.upload_permission = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse('core:upload_resource'), {
+            'title': '标题', 'category': self.category.id, 'cloud_type': self.cloud_type.id,
+            'keywords': '电影', 'resource_url': 'https://pan.baidu.com/s/test',
+            'screenshot': self.oversized_file(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].errors['screenshot'], [FILE_TOO_LARGE_MESSAGE])
+        self.assertFalse(Resource.objects.exists())
+
+    def test_fields_after_oversized_upload_still_parsed(self):
+        self.user.upload_permission = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        # 测试客户端按字典顺序编码，截图之后还有其他字段
+        response = self.client.post(reverse('core:upload_resource'), {
+            'screenshot': self.oversized_file(),
+            'title': '标题', 'category': self.category.id, 'cloud_type': self.cloud_type.id,
+            'keywords': '电影', 'resource_url': 'https://pan.baidu.com/s/test',
+        })
+        form = response.context['form']
+        self.assertEqual(form.errors, {'screenshot': [FILE_TOO_LARGE_MESSAGE]})
+        self.assertEqual(form.data['title'], '标题')
+
+    def test_oversized_upload_reported_in_admin(self):
+        resource = self.make_resource(title='原标题')
+        self.client.force_login(CustomUser.objects.create_superuser(username='admin', password='pass12345'))
+
+        response = self.client.post(reverse('admin:core_resource_change', args=[resource.id]), {
+            'title': '新标题', 'description': '', 'keywords': '', 'user': self.user.id,
+            'category': self.category.id, 'cloud_type': self.cloud_type.id,
+            'resource_url': 'https://pan.baidu.com/s/test', 'extract_code': '', 'is_approved': 'on',
+            'screenshot': self.oversized_file(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['adminform'].form.errors['screenshot'], [FILE_TOO_LARGE_MESSAGE])
+        resource.refresh_from_db()
+        self.assertEqual(resource.title, '原标题')
+
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', 'example.com'])
+class SitemapTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url):
+        response = self.client.get(url, HTTP_HOST='example.com')
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        return response.content.decode()
+
+    def test_sharded_index_only_lists_approved(self):
+        approved = self.make_resource()
+        hidden = self.make_resource(is_approved=False)
+        far = self.make_resource()
+        Resource.objects.filter(id=far.id).update(id=sitemap.SHARD_SIZE * 2 + 5)
+
+        index = self.get(reverse('core:sitemap'))
+        self.assertIn('http://example.com/sitemap-resources-0.xml', index)
+        self.assertIn('http://example.com/sitemap-resources-2.xml', index)
+        # 中间没有资源的分片不列出
+        self.assertNotIn('sitemap-resources-1.xml', index)
+
+        shard = self.get(reverse('core:sitemap_shard', args=[0]))
+        self.assertIn(f'<loc>http://example.com/resource/{approved.id}/</loc>', shard)
+        self.assertNotIn(f'/resource/{hidden.id}/', shard)
+        self.assertIn('<lastmod>', shard)
+        self.assertIn(f'/resource/{sitemap.SHARD_SIZE * 2 + 5}/', self.get(reverse('core:sitemap_shard', args=[2])))
+
+        self.assertEqual(self.client.get(reverse('core:sitemap_shard', args=[9])).status_code, 404)
+
+    def test_changes_invalidate_only_their_shard(self):
+        self.make_resource()
+        resource = self.make_resource()
+        url = reverse('core:sitemap_shard', args=[0])
+        self.get(url)
+        with self.assertNumQueries(0):
+            self.get(url)
+
+        # 只更新计数不影响站点地图
+        with self.captureOnCommitCallbacks(execute=True):
+            resource.save(update_fields=['view_count'])
+        with self.assertNumQueries(0):
+            self.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resource.is_approved = False
+            resource.save()
+        self.assertNotIn(f'/resource/{resource.id}/', self.get(url))
+
+    def test_build_command(self):
+        self.make_resource()
+        call_command('build_sitemaps', stdout=StringIO())
+        with self.assertNumQueries(0):
+            self.get(reverse('core:sitemap'))
+
+
+
+class RecommendTests(ResourceTestMixin, TestCase):
+
+    TITLES = [
+        ('星际穿越 科幻电影', '科幻,太空'),
+        ('流浪地球 科幻电影', '科幻,太空'),
+        ('火星救援 科幻电影', '科幻,太空'),
+        ('Python 编程入门教程', 'python,编程'),
+        ('Python 数据分析教程', 'python,数据'),
+        ('Java 编程入门教程', 'java,编程'),
+        ('钢琴曲合集', '音乐,钢琴'),
+        ('古典钢琴曲精选', '音乐,钢琴'),
+    ]
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        override = override_settings(RECOMMEND_DATA_DIR=self.data_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        self.resources = [self.make_resource(title=title, keywords=keywords) for title, keywords in self.TITLES]
+
+    def related_titles(self, resource):
+        return list(RelatedResource.objects.filter(resource=resource).order_by('rank')
+                    .values_list('related__title', flat=True))
+
+    def test_rebuild_finds_similar_resources(self):
+        self.assertEqual(recommend.rebuild(k=2, chunk_size=3), len(self.TITLES))
+        self.assertEqual(set(self.related_titles(self.resources[0])), {'流浪地球 科幻电影', '火星救援 科幻电影'})
+        self.assertIn('Python 数据分析教程', self.related_titles(self.resources[3]))
+        self.assertEqual(self.related_titles(self.resources[6]), ['古典钢琴曲精选'])
+        scores = list(RelatedResource.objects.filter(resource=self.resources[0]).values_list('score', flat=True))
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_chunking_does_not_change_results(self):
+        vectors = recommend.vectorize(
+            [recommend.document_terms(title, keywords) for title, keywords in self.TITLES],
+            *recommend.build_vocabulary([recommend.document_terms(t, k) for t, k in self.TITLES]),
+        )
+        whole = list(recommend.nearest_neighbours(vectors, 3, chunk_size=100))
+        chunked = list(recommend.nearest_neighbours(vectors, 3, chunk_size=2))
+        self.assertEqual([[c for c, _ in row] for row in whole], [[c for c, _ in row] for row in chunked])
+
+    def test_scores_computed_in_tiles(self):
+        documents = [recommend.document_terms(title, keywords) for title, keywords in self.TITLES]
+        vectors = recommend.vectorize(documents, *recommend.build_vocabulary(documents))
+        widths = []
+        top_k = recommend._top_k
+
+        def record(scores, k):
+            widths.append(scores.shape[1])
+            return top_k(scores, k)
+
+        with patch('core.recommend._top_k', side_effect=record):
+            tiled = list(recommend.nearest_neighbours(vectors, 2, chunk_size=3))
+        self.assertLessEqual(max(widths), 3 + 2)
+
+        dense = vectors.dense(0, vectors.shape[0])
+        full = dense @ dense.T
+        np.fill_diagonal(full, -1)
+        for row, neighbours in zip(full, tiled):
+            expected = sorted(score for score in row if score >= recommend.MIN_SCORE)[::-1][:2]
+            self.assertEqual([round(score, 5) for _, score in neighbours], [round(score, 5) for score in expected])
+
+    def test_vectors_stored_sparse(self):
+        documents = [recommend.document_terms(title, keywords) for title, keywords in self.TITLES]
+        vectors = recommend.vectorize(documents, *recommend.build_vocabulary(documents))
+        self.assertIsInstance(vectors, recommend.SparseVectors)
+        self.assertLess(len(vectors.values), vectors.shape[0] * vectors.shape[1])
+
+        dense = vectors.dense(0, vectors.shape[0])
+        np.testing.assert_allclose(np.linalg.norm(dense, axis=1), 1, rtol=1e-5)
+        np.testing.assert_allclose(vectors.dense(2, 5), dense[2:5])
+        np.testing.assert_allclose(vectors.dot(dense[0]), dense @ dense[0], rtol=1e-5)
+
+    def test_rebuild_replaces_relations_in_batches(self):
+        stale = self.make_resource(title='星际穿越 科幻电影 旧版')
+        RelatedResource.objects.create(resource=stale, related=self.resources[0], rank=0, score=0.9)
+        Resource.objects.filter(id=stale.id).update(is_approved=False)
+
+        with patch('core.recommend.WRITE_BATCH_SIZE', 3):
+            with CaptureQueriesContext(connection) as queries:
+                recommend.rebuild(k=2)
+        # 8 个资源分 3 批替换，每批一个事务（测试中表现为保存点）
+        self.assertEqual(sum(q['sql'].startswith('SAVEPOINT') for q in queries), 3)
+        self.assertFalse(RelatedResource.objects.filter(resource=stale).exists())
+        self.assertEqual(set(self.related_titles(self.resources[0])), {'流浪地球 科幻电影', '火星救援 科幻电影'})
+
+    def test_new_upload_gets_neighbours_incrementally(self):
+        recommend.rebuild(k=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            new = self.make_resource(title='Python 爬虫教程', keywords='python,编程')
+        related = self.related_titles(new)
+        self.assertTrue(related)
+        self.assertTrue(all('教程' in title for title in related))
+        # 新资源也进入了相似旧资源的推荐列表
+        self.assertTrue(RelatedResource.objects.filter(related=new).exists())
+
+    def test_no_model_yet(self):
+        self.assertEqual(recommend.update_for_resource(self.resources[0].id), 0)
+
+    def test_detail_uses_recommendations(self):
+        recommend.rebuild(k=2)
+        response = self.client.get(reverse('core:resource_detail', args=[self.resources[6].id]))
+        self.assertEqual([r.title for r in response.context['related_resources']], ['古典钢琴曲精选'])
+
+
+
+class TagTests(ResourceTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def make_tagged(self, keywords, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.make_resource(keywords=keywords, **kwargs)
+
+    def counts(self):
+        return dict(Tag.objects.values_list('name', 'resource_count'))
+
+    def test_parse_keywords(self):
+        self.assertEqual(parse_keywords(' 科幻, 电影,,科幻, ' + 'x' * 21), ['科幻', '电影'])
+        self.assertEqual(len(parse_keywords(','.join(str(i) for i in range(15)))), 10)
+
+    def test_keywords_synced_to_tags_with_counts(self):
+        first = self.make_tagged('科幻,电影')
+        self.make_tagged('科幻,动画')
+        self.make_tagged('科幻', is_approved=False)
+        self.assertEqual(self.counts(), {'科幻': 2, '电影': 1, '动画': 1})
+
+        first.keywords = '电影,纪录片'
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertEqual(set(first.tags.values_list('name', flat=True)), {'电影', '纪录片'})
+        self.assertEqual(self.counts(), {'科幻': 1, '电影': 1, '动画': 1, '纪录片': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.counts(), {'科幻': 1, '电影': 0, '动画': 1, '纪录片': 0})
+
+    def test_counter_only_save_skips_sync(self):
+        resource = self.make_tagged('科幻')
+        with self.assertNumQueries(1):
+            with self.captureOnCommitCallbacks(execute=True):
+                resource.save(update_fields=['view_count'])
+
+    def tag_queries(self, resource):
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                resource.save()
+        return [q['sql'] for q in ctx.captured_queries if 'core_tag' in q['sql'] or 'core_resourcetag' in q['sql']]
+
+    def test_save_without_tag_changes_skips_sync(self):
+        resource = Resource.objects.get(id=self.make_tagged('科幻,电影').id)
+        resource.title = '新标题'
+        self.assertEqual(self.tag_queries(resource), [])
+        self.assertEqual(self.counts(), {'科幻': 1, '电影': 1})
+
+    def test_tag_counts_adjusted_by_delta(self):
+        self.make_tagged('科幻')
+        resource = Resource.objects.get(id=self.make_tagged('科幻,电影').id)
+
+        resource.is_approved = False
+        queries = self.tag_queries(resource)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        self.assertEqual(self.counts(), {'科幻': 1, '电影': 0})
+
+        # 未审核资源的关键词变化只改关联，不影响计数
+        resource.keywords = '科幻,动画'
+        self.tag_queries(resource)
+        self.assertEqual(set(resource.tags.values_list('name', flat=True)), {'科幻', '动画'})
+        self.assertEqual(self.counts(), {'科幻': 1, '电影': 0, '动画': 0})
+
+        resource.is_approved = True
+        resource.keywords = '动画,纪录片'
+        self.tag_queries(resource)
+        self.assertEqual(self.counts(), {'科幻': 1, '电影': 0, '动画': 1, '纪录片': 1})
+
+        # 重新读出后在其他进程的修改之上继续增减
+        Resource.objects.filter(id=resource.id).update(is_approved=False)
+        Tag.objects.filter(name__in=['动画', '纪录片']).update(resource_count=0)
+        resource.refresh_from_db()
+        resource.is_approved = True
+        self.tag_queries(resource)
+        self.assertEqual(self.counts(), {'科幻': 1, '电影': 0, '动画': 1, '纪录片': 1})
+
+    def test_deleting_unapproved_resource_keeps_counts(self):
+        self.make_tagged('科幻')
+        hidden = self.make_tagged('科幻', is_approved=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            hidden.delete()
+        self.assertEqual(self.counts(), {'科幻': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            Resource.objects.all().delete()
+        self.assertEqual(self.counts(), {'科幻': 0})
+
+    def test_tag_page(self):
+        tagged = self.make_tagged('科幻,电影', title='星际穿越')
+        self.make_tagged('音乐', title='钢琴曲')
+        hidden = self.make_tagged('科幻', title='未审核资源', is_approved=False)
+
+        response = self.client.get(reverse('core:tag_resources', args=['科幻']))
+        self.assertContains(response, tagged.title)
+        self.assertNotContains(response, '钢琴曲')
+        self.assertNotContains(response, hidden.title)
+        self.assertEqual(response.context['resources'].paginator.count, 1)
+
+        self.assertEqual(self.client.get(reverse('core:tag_resources', args=['不存在'])).status_code, 404)
+
+    def test_tag_cloud(self):
+        for i in range(3):
+            self.make_tagged('科幻')
+        self.make_tagged('音乐')
+        self.make_tagged('冷门', is_approved=False)
+        response = self.client.get(reverse('core:tag_cloud'))
+        levels = {tag.name: tag.level for tag in response.context['tags']}
+        self.assertEqual(levels, {'科幻': 5, '音乐': 1})
+
+    def test_admin_approval_refreshes_counts(self):
+        resource = self.make_tagged('科幻', is_approved=False)
+        admin_user = CustomUser.objects.create_superuser(username='admin', password='pass12345')
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:core_resource_changelist'), {
+            'action': 'approve_resources',
+            '_selected_action': [resource.id],
+        })
+        self.assertEqual(self.counts(), {'科幻': 1})
+
+    def test_tag_names_case_insensitive(self):
+        self.assertEqual(parse_keywords('Python, python, ＰＹＴＨＯＮ, Django'), ['python', 'django'])
+        self.make_tagged('python')
+        resource = self.make_tagged('Python, Django')
+        self.assertEqual(set(resource.tags.values_list('name', flat=True)), {'python', 'django'})
+        self.assertEqual(self.counts(), {'python': 2, 'django': 1})
+        self.assertEqual(self.client.get(reverse('core:tag_resources', args=['Python'])).status_code, 200)
+
+    def test_existing_tag_matched_by_database_collation(self):
+        # 模拟数据库排序规则认为相等、字面不同的已有标签（如 MySQL 上的 “Python”）
+        Tag.objects.create(name='Python')
+        tag_filter = Tag.objects.filter
+
+        def collated_filter(**kwargs):
+            if 'name' in kwargs:
+                return tag_filter(name__iexact=kwargs.pop('name'), **kwargs)
+            if 'name__in' in kwargs:
+                names = kwargs.pop('name__in')
+                return tag_filter(Q(*[('name__iexact', name) for name in names], _connector=Q.OR), **kwargs)
+            return tag_filter(**kwargs)
+
+        # 唯一索引冲突，插入被忽略
+        with patch.object(Tag.objects, 'filter', side_effect=collated_filter), \
+                patch.object(Tag.objects, 'bulk_create'):
+            resource = self.make_tagged('python')
+        self.assertEqual(list(resource.tags.values_list('name', flat=True)), ['Python'])
+
+    def test_backfill_migration(self):
+        from importlib import import_module
+
+        from django.apps import apps
+
+        self.make_resource(keywords='科幻, 电影, Python')
+        self.make_resource(keywords='科幻, python', is_approved=False)
+        ResourceTag.objects.all().delete()
+        Tag.objects.all().delete()
+
+        import_module('core.migrations.0010_tags').backfill_tags(apps, None)
+        self.assertEqual(self.counts(), {'科幻': 1, '电影': 1, 'python': 1})
+        self.assertEqual(ResourceTag.objects.count(), 5)
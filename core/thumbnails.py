@@ -0,0 +1,121 @@
+"""
+资源截图的派生图
+
+上传的原图最大 5MB，直接用在页面上既浪费带宽又拖慢渲染。每张截图在后台生成
+卡片、详情两种尺寸，各有 WebP 和 JPEG（兼容不支持 WebP 的浏览器）两种格式，
+并去掉 EXIF 等元数据。解码前与上传校验一样检查宽高，管理后台等未经
+``inspect_image`` 校验的截图也不会以解压炸弹的方式耗尽内存。
+
+派生图的路径由原图在存储中的完整路径确定（文件名加完整路径的哈希，扩展名、目录不同的
+同名文件不会共用派生图），``Resource.screenshot_derived`` 记录已生成派生图的
+原图文件名；截图被替换后两者不一致，模板会回退到原图，直到新的派生图生成完毕。
+"""
+import hashlib
+import io
+import os
+import warnings
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .uploads import TOO_LARGE_MESSAGE, check_dimensions
+
+# 派生图尺寸（最大宽, 最大高），按比例缩放，不放大
+SIZES = {
+    'card': (400, 300),
+    'detail': (1200, 900),
+}
+
+# 派生图格式及保存参数，按优先级排列
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+DERIVED_DIR = 'screenshots/derived'
+
+
+def derived_name(screenshot_name, size, fmt):
+    """派生图在存储中的路径"""
+    stem = os.path.splitext(os.path.basename(screenshot_name))[0]
+    digest = hashlib.sha1(screenshot_name.encode()).hexdigest()[:12]
+    return f'{DERIVED_DIR}/{stem}_{digest}_{size}.{fmt}'
+
+
+def has_derivatives(resource):
+    return bool(resource.screenshot) and resource.screenshot_derived == resource.screenshot.name
+
+
+def derived_urls(resource, size):
+    """返回 {格式: URL}，派生图未生成时返回空字典"""
+    if not has_derivatives(resource):
+        return {}
+    return {fmt: default_storage.url(derived_name(resource.screenshot.name, size, fmt)) for fmt in FORMATS}
+
+
+def _encode(image, fmt):
+    options = dict(FORMATS[fmt])
+    if options['format'] == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    # 不传 exif 参数，保存时不会带上原图的元数据
+    image.save(buffer, **options)
+    return buffer.getvalue()
+
+
+def render_derivatives(source):
+    """从原图文件生成全部派生图，返回 {(尺寸, 格式): 图片数据}
+
+    尺寸超过上限时抛出 ValidationError，不解码像素。
+    """
+    try:
+        with warnings.catch_warnings():
+            # 超大图片由下面的尺寸检查拒绝
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            original = Image.open(source)
+    except Image.DecompressionBombError:
+        raise ValidationError(TOO_LARGE_MESSAGE)
+    with original:
+        check_dimensions(*original.size)
+        # 按 EXIF 方向旋转后再丢弃 EXIF
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        results = {}
+        for size, bounds in SIZES.items():
+            resized = image.copy()
+            resized.thumbnail(bounds, Image.LANCZOS)
+            for fmt in FORMATS:
+                results[(size, fmt)] = _encode(resized, fmt)
+        return results
+
+
+def generate_derivatives(resource_id, force=False):
+    """为资源截图生成派生图，返回是否生成"""
+    from .models import Resource
+    from .page_cache import purge_tags, resource_tag
+
+    resource = Resource.objects.only('id', 'screenshot', 'screenshot_derived').filter(id=resource_id).first()
+    if resource is None or not resource.screenshot:
+        return False
+    if has_derivatives(resource) and not force:
+        return False
+
+    name = resource.screenshot.name
+    with resource.screenshot.open('rb') as source:
+        rendered = render_derivatives(source)
+
+    for (size, fmt), data in rendered.items():
+        path = derived_name(name, size, fmt)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(data))
+
+    # 生成期间截图可能又被替换，只在原图未变时登记
+    if Resource.objects.filter(id=resource_id, screenshot=name).update(screenshot_derived=name):
+        purge_tags(resource_tag(resource_id))
+        return True
+    return False
@@ -0,0 +1,105 @@
+"""
+截图上传的流式处理与校验
+
+- 上传文件按块写入临时文件，不在内存中缓冲；超过大小上限时跳过该文件（不会得到
+  截断的文件），请求体中其后的字段照常解析。字段名记录在 ``request.oversized_uploads``
+  中，由表单返回错误，磁盘和内存占用都有上限。
+- 校验只读取图片头：根据文件开头的特征字节判断真实格式（不信任扩展名），
+  用 Pillow 的惰性打开读取宽高，在解码像素之前拒绝超大尺寸（解压炸弹）的图片。
+"""
+import warnings
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from PIL import Image, UnidentifiedImageError
+
+# 截图文件大小上限
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+# 截图尺寸上限
+MAX_DIMENSION = 8000
+MAX_PIXELS = 24_000_000
+TOO_LARGE_MESSAGE = f'图片尺寸过大，宽高不能超过{MAX_DIMENSION}像素'
+FILE_TOO_LARGE_MESSAGE = f'图片大小不能超过{MAX_UPLOAD_SIZE // (1024 * 1024)}MB'
+
+# 特征字节 -> Pillow 格式名
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """把上传文件分块写入临时文件，超过 MAX_UPLOAD_SIZE 时跳过该文件"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > MAX_UPLOAD_SIZE:
+            if self.request is not None:
+                self.request.oversized_uploads = get_oversized_uploads(self.request) | {self.field_name}
+            # 临时文件由解析器关闭并删除，该文件剩余的数据被读取丢弃，之后的字段继续解析
+            raise SkipFile()
+        self.file.write(raw_data)
+
+
+def get_oversized_uploads(request):
+    """因超过大小上限被丢弃的上传字段名"""
+    # 上传处理器在解析请求体时记录，访问 request.FILES 确保已经解析
+    if request.method == 'POST':
+        request.FILES
+    return getattr(request, 'oversized_uploads', frozenset())
+
+
+def check_dimensions(width, height):
+    """宽高超过上限（解压炸弹）时抛出 ValidationError"""
+    if width > MAX_DIMENSION or height > MAX_DIMENSION or width * height > MAX_PIXELS:
+        raise ValidationError(TOO_LARGE_MESSAGE)
+
+
+def sniff_format(head):
+    """根据文件开头的字节判断图片格式，无法识别时返回 None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    for signature, fmt in SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    return None
+
+
+def inspect_image(file):
+    """只读取图片头完成校验，返回 (格式, 宽, 高)，不合格时抛出 ValidationError"""
+    if file.size > MAX_UPLOAD_SIZE:
+        raise ValidationError(FILE_TOO_LARGE_MESSAGE)
+
+    file.seek(0)
+    fmt = sniff_format(file.read(16))
+    if fmt not in ALLOWED_FORMATS:
+        raise ValidationError('只支持JPG、PNG、GIF、WebP格式的图片')
+
+    file.seek(0)
+    try:
+        with warnings.catch_warnings():
+            # 超大图片由下面的尺寸检查给出明确提示
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            # Image.open 是惰性的，只解析文件头，不解码像素
+            with Image.open(file) as image:
+                width, height = image.size
+                actual = image.format
+    except Image.DecompressionBombError:
+        raise ValidationError(TOO_LARGE_MESSAGE)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise ValidationError('图片文件已损坏或格式不正确')
+    finally:
+        file.seek(0)
+
+    if actual != fmt:
+        raise ValidationError('图片内容与文件格式不符')
+    check_dimensions(width, height)
+    return fmt, width, height
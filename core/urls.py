@@ -1,29 +1,28 @@
 from django.urls import path
 from . import views
-from django.contrib.sitemaps.views import sitemap
-from .sitemap import ResourceSitemap
-
 
 
 app_name = 'core'
 
 
-sitemaps = {
-    'resources': ResourceSitemap,
-}
-
 urlpatterns = [
     path('', views.index, name='index'),
     path('resource/<int:resource_id>/', views.resource_detail, name='resource_detail'),
     path('category/<int:category_id>/', views.category_resources, name='category_resources'),
+    path('tags/', views.tag_cloud, name='tag_cloud'),
+    path('tag/<path:name>/', views.tag_resources, name='tag_resources'),
     path('search/', views.search_resources, name='search_resources'),
+    path('search/suggest/', views.search_suggestions, name='search_suggestions'),
     path('upload/', views.upload_resource, name='upload_resource'),  # 添加上传页面
     path('resource/<int:resource_id>/like/', views.like_resource, name='like_resource'),
     path('resource/<int:resource_id>/favorite/', views.favorite_resource, name='favorite_resource'),
+    path('resource/<int:resource_id>/comments/', views.resource_comments, name='resource_comments'),
     path('resource/<int:resource_id>/comment/', views.add_comment, name='add_comment'),  # 添加评论
     path('comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),  # 删除评论
     path('resource/<int:resource_id>/report/', views.report_resource, name='report_resource'),
     path('resource/<int:resource_id>/increase-copy/', views.increase_copy_count, name='increase_copy_count'),
-    #path('hot/', views.hot_resources, name='hot_resources'),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('interactions/state/', views.interaction_states, name='interaction_states'),
+    path('hot/', views.hot_resources, name='hot_resources'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap'),
+    path('sitemap-resources-<int:shard>.xml', views.sitemap_shard, name='sitemap_shard'),
 ]
\ No newline at end of file
@@ -1,34 +1,43 @@
+import math
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_GET
 from django.db.models import Count
 from .models import Category, Resource
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .forms import ResourceUploadForm
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Category, CloudType, Resource, Favorite, Comment, Report
+from .models import Category, CloudType, Resource, Favorite, Comment, Report, Like, Tag
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from .search import SearchResultList
+from .suggest import get_suggestion_index
+from .counters import record_view
+from .db_router import use_read_replica
+from .lookups import get_categories
+from .tags import normalize_tag
+from .uploads import get_oversized_uploads
+from .pagination import load_more, paginate_keyset
+from .page_cache import LIST_TAG, cache_anonymous_page, category_tag, resource_tag, tag_page
 
 
+# 游标分页相关的查询参数
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+@use_read_replica
+@cache_anonymous_page(params=PAGE_PARAMS)
 def index(request):
     """首页视图"""
-    # 获取所有分类
-    categories = Category.objects.all()
+    # 获取所有分类（来自查询缓存）
+    categories = get_categories()
 
-    # 获取所有已审核资源，按创建时间倒序排列
-    resources_list = Resource.objects.filter(is_approved=True).order_by('-created_at')
+    # 获取所有已审核资源（只取卡片需要的列），按创建时间倒序排列
+    resources_list = Resource.objects.approved().for_cards()
 
-    # 分页处理 - 每页12条
-    paginator = Paginator(resources_list, 12)
-    page_number = request.GET.get('page')
-
-    try:
-        resources = paginator.page(page_number)
-    except PageNotAnInteger:
-        # 如果页码不是整数，显示第一页
-        resources = paginator.page(1)
-    except EmptyPage:
-        # 如果页码超出范围，显示最后一页
-        resources = paginator.page(paginator.num_pages)
+    # 游标分页 - 每页12条，总数来自短时缓存
+    resources = paginate_keyset(request, resources_list, 'created_at', 'count:index')
+    tag_page(request, LIST_TAG, *(resource_tag(resource.id) for resource in resources))
 
     context = {
         'categories': categories,
@@ -37,36 +46,90 @@ def index(request):
     return render(request, 'core/index.html', context)
 
 
+def _record_cached_view(request, resource_id):
+    """详情页命中页面缓存时仍然记录浏览次数"""
+    record_view(resource_id)
+
+
+@use_read_replica
+@cache_anonymous_page(timeout=60, on_hit=_record_cached_view)
 def resource_detail(request, resource_id):
     """资源详情页面"""
     # 获取资源对象，如果不存在则返回404
     resource = get_object_or_404(Resource.objects.select_related('category', 'cloud_type', 'user'),
                                  id=resource_id, is_approved=True)
 
-    # 增加查看次数
-    resource.view_count += 1
-    resource.save(update_fields=['view_count'])
+    # 增加查看次数：先写入缓冲计数器，由定时任务批量写回数据库
+    # 页面上显示数据库中的值加上尚未写回的增量
+    resource.view_count += record_view(resource.id)
 
-    # 获取相关资源（同一分类下的其他资源，排除当前资源）
-    related_resources = Resource.objects.filter(
-        category=resource.category,
-        is_approved=True
-    ).exclude(id=resource.id).order_by('-created_at')[:6]
+    # 相关资源：按 (resource, rank) 读取预先计算的内容相似资源
+    related_resources = list(Resource.objects.approved().for_cards().filter(
+        recommended_for__resource_id=resource.id,
+    ).order_by('recommended_for__rank')[:6])
+    if not related_resources:
+        # 还没有计算过推荐的资源，退回到同一分类下的最新资源
+        related_resources = list(Resource.objects.approved().for_cards().filter(
+            category=resource.category,
+        ).exclude(id=resource.id).order_by('-created_at')[:6])
 
-    # 获取评论，按创建时间倒序排列（最新的在最前面）
-    comments = resource.comment_set.all().order_by('-created_at').select_related('user')
+    # 只渲染最新的一页评论，其余由评论接口按游标加载
+    comments, comments_next_cursor = _comment_page(resource.id)
+
+    tag_page(request, resource_tag(resource.id), *(resource_tag(related.id) for related in related_resources))
 
     context = {
         'resource': resource,
         'related_resources': related_resources,
         'comments': comments,  # 添加评论到上下文
+        'comments_next_cursor': comments_next_cursor,
     }
     return render(request, 'core/resource_detail.html', context)
 
 
 
+# 详情页首屏和每次“加载更多”的评论条数
+COMMENTS_PER_PAGE = 20
+
+
+def _comment_page(resource_id, after=None):
+    """按 (created_at, id) 倒序取一页评论，走 (resource, created_at, id) 索引"""
+    comments = Comment.objects.filter(resource_id=resource_id).select_related('user').only(
+        'id', 'content', 'created_at', 'resource_id', 'user_id', 'user__username',
+    )
+    return load_more(comments, 'created_at', after, COMMENTS_PER_PAGE)
+
 
+@use_read_replica
+@require_GET
+@cache_anonymous_page(params=('after',))
+def resource_comments(request, resource_id):
+    """详情页评论的游标分页接口，返回评论列表的 HTML 片段和下一页游标"""
+    get_object_or_404(Resource.objects.approved().only('id'), id=resource_id)
+    comments, next_cursor = _comment_page(resource_id, request.GET.get('after'))
+    tag_page(request, resource_tag(resource_id))
 
+    html = render_to_string('core/comments/items.html', {'comments': comments}, request=request)
+    return JsonResponse({
+        'status': 'success',
+        'html': html,
+        'count': len(comments),
+        'next_cursor': next_cursor,
+    })
+
+
+# 分类页排序参数与排序列的对应关系（均为倒序）
+CATEGORY_SORT_FIELDS = {
+    'newest': 'created_at',
+    'hot': 'hot_score',
+    'views': 'view_count',
+    'likes': 'like_count',
+    'copies': 'copy_count',
+}
+
+
+@use_read_replica
+@cache_anonymous_page(params=('sort',) + PAGE_PARAMS)
 def category_resources(request, category_id):
     """分类页面"""
     # 获取分类对象
@@ -75,32 +138,14 @@ def category_resources(request, category_id):
     # 获取排序参数
     sort = request.GET.get('sort', 'newest')
 
-    # 获取该分类下的资源，根据排序参数排序
-    resources = Resource.objects.filter(category=category, is_approved=True)
-
-    if sort == 'newest':
-        resources = resources.order_by('-created_at')
-    elif sort == 'hot':
-        resources = resources.order_by('-view_count')
-    elif sort == 'views':
-        resources = resources.order_by('-view_count')
-    elif sort == 'likes':
-        resources = resources.order_by('-like_count')
-    elif sort == 'copies':
-        resources = resources.order_by('-copy_count')
-    else:
-        resources = resources.order_by('-created_at')
+    # 获取该分类下的资源，根据排序参数确定游标分页的排序列
+    resources = Resource.objects.filter(category=category).approved().for_cards()
+    order_field = CATEGORY_SORT_FIELDS.get(sort, 'created_at')
 
-    # 分页处理
-    paginator = Paginator(resources, 12)  # 每页12个资源
-    page = request.GET.get('page')
-
-    try:
-        resources = paginator.page(page)
-    except PageNotAnInteger:
-        resources = paginator.page(1)
-    except EmptyPage:
-        resources = paginator.page(paginator.num_pages)
+    # 游标分页，每页12个资源；同一分类各种排序共用一个缓存的总数
+    resources = paginate_keyset(request, resources, order_field, f'count:category:{category.id}',
+                                params={'sort': sort})
+    tag_page(request, category_tag(category.id), *(resource_tag(resource.id) for resource in resources))
 
     context = {
         'category': category,
@@ -110,9 +155,7 @@ def category_resources(request, category_id):
     return render(request, 'core/category.html', context)
 
 
-from django.db.models import Q
-
-
+@use_read_replica
 def search_resources(request):
     """搜索资源"""
     query = request.GET.get('q', '').strip()
@@ -121,15 +164,10 @@ def search_resources(request):
         # 如果没有输入搜索词，返回首页
         return redirect('core:index')
 
-    # 构建搜索查询
-    # 搜索标题、描述和关键词
-    resources = Resource.objects.filter(is_approved=True).filter(
-        Q(title__icontains=query) |
-        Q(description__icontains=query) |
-        Q(keywords__icontains=query)
-    ).distinct().order_by('-created_at')
+    # 通过倒排索引搜索标题、描述和关键词，按相关度排序
+    resources = SearchResultList(query, Resource.objects.for_search_results())
 
-    # 统计搜索到的资源数量
+    # 统计搜索到的资源数量（直接取自索引，不再执行 COUNT 查询）
     total_count = resources.count()
 
     # 分页处理
@@ -147,10 +185,22 @@ def search_resources(request):
         'query': query,
         'resources': resources,
         'total_count': total_count,
+        # 只渲染当前页附近的页码
+        'page_range': paginator.get_elided_page_range(resources.number, on_each_side=2, on_ends=1),
     }
     return render(request, 'core/search_results.html', context)
 
 
+@use_read_replica
+@require_GET
+def search_suggestions(request):
+    """搜索框输入联想，返回以输入内容开头的热门标题和关键词"""
+    return JsonResponse({
+        'status': 'success',
+        'suggestions': get_suggestion_index().suggest(request.GET.get('q', '')),
+    })
+
+
 @login_required
 def upload_resource(request):
     """上传资源视图"""
@@ -160,7 +210,8 @@ def upload_resource(request):
         return redirect('core:index')
 
     if request.method == 'POST':
-        form = ResourceUploadForm(request.POST, request.FILES)
+        form = ResourceUploadForm(request.POST, request.FILES,
+                                  oversized_uploads=get_oversized_uploads(request))
 
         if form.is_valid():
             # 保存资源基本信息（包括截图）
@@ -183,74 +234,76 @@ def upload_resource(request):
     return render(request, 'core/upload_resource.html', context)
 
 
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from functools import wraps
 
-
-@login_required
-@require_POST
-def like_resource(request, resource_id):
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.utils.log import log_response
+from django.views.decorators.http import require_POST
+from . import interactions, sitemap
+from .moderation import check_text
+
+
+def async_post_view(login=True, csrf_exempt=False):
+    """异步视图用的 @require_POST（以及 @login_required、@csrf_exempt）
+
+    Django 4.2 自带的这几个装饰器只能包装同步视图。request.user 是惰性对象，首次访问
+    会读取会话并查询用户，这里在线程中完成，之后视图中可以直接使用 request.user。
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'POST':
+                response = HttpResponseNotAllowed(['POST'])
+                log_response('Method Not Allowed (%s): %s', request.method, request.path,
+                             response=response, request=request)
+                return response
+            if login and not await sync_to_async(lambda: request.user.is_authenticated)():
+                return redirect_to_login(request.get_full_path())
+            return await view(request, *args, **kwargs)
+
+        if csrf_exempt:
+            wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@async_post_view()
+async def like_resource(request, resource_id):
     """点赞或取消点赞资源"""
-    resource = get_object_or_404(Resource, id=resource_id)
-    user = request.user
-
-    # 检查用户是否已经点赞过该资源
-    from .models import Like
-    like, created = Like.objects.get_or_create(user=user, resource=resource)
-
-    if not created:
-        # 如果已经点赞过，则取消点赞（删除记录）
-        like.delete()
-        resource.like_count -= 1
-        liked = False
-    else:
-        # 新增点赞
-        resource.like_count += 1
-        liked = True
-
-    resource.save(update_fields=['like_count'])
+    # 在一个事务内切换点赞记录并原子更新计数
+    try:
+        liked, like_count = await interactions.atoggle_relation(Like, 'like_count', request.user, resource_id)
+    except Resource.DoesNotExist:
+        raise Http404('资源不存在')
 
     return JsonResponse({
         'status': 'success',
         'liked': liked,
-        'like_count': resource.like_count
+        'like_count': like_count
     })
 
 
-@login_required
-@require_POST
-def favorite_resource(request, resource_id):
+@async_post_view()
+async def favorite_resource(request, resource_id):
     """收藏或取消收藏资源"""
-    resource = get_object_or_404(Resource, id=resource_id)
-    user = request.user
-
-    # 检查用户是否已经收藏过该资源
-    favorite, created = Favorite.objects.get_or_create(user=user, resource=resource)
-
-    if not created:
-        # 如果已经收藏过，则取消收藏（删除记录）
-        favorite.delete()
-        resource.collect_count -= 1
-        favorited = False
-    else:
-        # 新增收藏
-        resource.collect_count += 1
-        favorited = True
-
-    resource.save(update_fields=['collect_count'])
+    try:
+        favorited, collect_count = await interactions.atoggle_relation(
+            Favorite, 'collect_count', request.user, resource_id)
+    except Resource.DoesNotExist:
+        raise Http404('资源不存在')
 
     return JsonResponse({
         'status': 'success',
         'favorited': favorited,
-        'collect_count': resource.collect_count
+        'collect_count': collect_count
     })
 
 
-@login_required
-@require_POST
-def add_comment(request, resource_id):
+@async_post_view()
+async def add_comment(request, resource_id):
     """添加评论"""
-    resource = get_object_or_404(Resource, id=resource_id)
     content = request.POST.get('content', '').strip()
 
     if not content:
@@ -266,31 +319,19 @@ def add_comment(request, resource_id):
             'message': '评论内容不能超过200字'
         }, status=400)
 
-    # 检查是否包含链接
-    import re
-    link_patterns = [
-        r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
-        r'www\\.(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
-        r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}',  # 邮箱地址
-    ]
-
-    for pattern in link_patterns:
-        if re.search(pattern, content):
-            return JsonResponse({
-                'status': 'error',
-                'message': '评论内容不能包含链接或邮箱地址'
-            }, status=400)
-
-    # 创建评论
-    comment = Comment.objects.create(
-        user=request.user,
-        resource=resource,
-        content=content
-    )
+    # 检查是否包含链接、邮箱地址或违禁词（违禁词表变化后会从数据库重新加载，需在线程中执行）
+    error = await sync_to_async(check_text)(content)
+    if error:
+        return JsonResponse({
+            'status': 'error',
+            'message': error
+        }, status=400)
 
-    # 更新资源的评论计数
-    resource.comment_count += 1
-    resource.save(update_fields=['comment_count'])
+    # 创建评论并原子更新资源的评论计数
+    try:
+        comment, comment_count = await interactions.aadd_comment(request.user, resource_id, content)
+    except Resource.DoesNotExist:
+        raise Http404('资源不存在')
 
     return JsonResponse({
         'status': 'success',
@@ -298,7 +339,7 @@ def add_comment(request, resource_id):
         'username': request.user.username,
         'content': content,
         'created_at': comment.created_at.strftime('%Y-%m-%d %H:%M'),
-        'comment_count': resource.comment_count
+        'comment_count': comment_count
     })
 
 
@@ -306,41 +347,33 @@ def add_comment(request, resource_id):
 @require_POST
 def delete_comment(request, comment_id):
     """删除评论"""
-    comment = get_object_or_404(Comment, id=comment_id)
+    comment = get_object_or_404(Comment.objects.only('id', 'user_id', 'resource_id'), id=comment_id)
 
     # 检查用户是否有权限删除（评论作者或管理员）
-    if comment.user != request.user and not request.user.is_staff:
+    if comment.user_id != request.user.id and not request.user.is_staff:
         return JsonResponse({
             'status': 'error',
             'message': '您没有权限删除此评论'
         }, status=403)
 
-    # 获取关联的资源，以便更新评论计数
-    resource = comment.resource
-
-    # 删除评论
-    comment.delete()
-
-    # 更新资源的评论计数
-    resource.comment_count = max(0, resource.comment_count - 1)  # 确保不为负数
-    resource.save(update_fields=['comment_count'])
+    # 删除评论并原子更新资源的评论计数（不会小于0）
+    comment_count = interactions.delete_comment(comment)
 
     return JsonResponse({
         'status': 'success',
         'message': '评论已删除',
-        'comment_count': resource.comment_count
+        'comment_count': comment_count
     })
 
 
-@login_required
-@require_POST
-def report_resource(request, resource_id):
+@async_post_view()
+async def report_resource(request, resource_id):
     """举报资源"""
-    resource = get_object_or_404(Resource, id=resource_id)
-    user = request.user
-
-    # 检查用户是否已经举报过该资源
-    report, created = Report.objects.get_or_create(user=user, resource=resource)
+    # 插入举报记录，唯一约束冲突说明用户已经举报过
+    try:
+        created, report_count = await interactions.aadd_relation(Report, 'report_count', request.user, resource_id)
+    except Resource.DoesNotExist:
+        raise Http404('资源不存在')
 
     if not created:
         # 用户已经举报过，返回错误
@@ -348,43 +381,102 @@ def report_resource(request, resource_id):
             'status': 'error',
             'message': '您已经举报过此资源'
         }, status=400)
-    else:
-        # 新增举报，更新举报计数
-        resource.report_count += 1
-        resource.save(update_fields=['report_count'])
 
-        return JsonResponse({
-            'status': 'success',
-            'message': '举报成功，感谢您的反馈',
-            'report_count': resource.report_count
-        })
+    return JsonResponse({
+        'status': 'success',
+        'message': '举报成功，感谢您的反馈',
+        'report_count': report_count
+    })
 
 
-# 复制次数统计 API 视图
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.views.decorators.csrf import csrf_exempt
-from django.db.models import F
-from .models import Resource
+@require_GET
+def interaction_states(request):
+    """批量查询当前用户对一组资源的点赞/收藏/举报状态
 
+    列表页的卡片对所有用户共用缓存，渲染后由前端用 ?ids=1,2,3 一次取回当前用户的状态。
+    """
+    resource_ids = []
+    for value in request.GET.get('ids', '').split(','):
+        if value.strip().isdigit():
+            resource_ids.append(int(value))
 
-@csrf_exempt
-@require_POST
-def increase_copy_count(request, resource_id):
+    states = interactions.get_interaction_states(request.user, resource_ids)
+    return JsonResponse({
+        'status': 'success',
+        'states': {str(pk): state for pk, state in states.items()}
+    })
+
+
+@use_read_replica
+@cache_anonymous_page(params=PAGE_PARAMS)
+def tag_resources(request, name):
+    """标签页面"""
+    tag = get_object_or_404(Tag, name=normalize_tag(name))
+
+    # 从 (tag, resource) 索引连接资源；总数直接使用标签上维护的资源数
+    resources = Resource.objects.approved().for_cards().filter(resourcetag__tag=tag)
+    resources = paginate_keyset(request, resources, 'created_at', f'count:tag:{tag.id}', count=tag.resource_count)
+    tag_page(request, LIST_TAG, *(resource_tag(resource.id) for resource in resources))
+
+    context = {
+        'tag': tag,
+        'resources': resources,
+    }
+    return render(request, 'core/tag.html', context)
+
+
+# 标签云显示的标签数和字号级别数
+TAG_CLOUD_SIZE = 100
+TAG_CLOUD_LEVELS = 5
+
+
+@use_read_replica
+@cache_anonymous_page()
+def tag_cloud(request):
+    """标签云：资源数最多的标签，走 resource_count 索引"""
+    tags = list(Tag.objects.filter(resource_count__gt=0).order_by('-resource_count', 'name')[:TAG_CLOUD_SIZE])
+
+    # 按资源数的对数划分字号级别
+    if tags:
+        low = math.log(tags[-1].resource_count)
+        high = math.log(tags[0].resource_count)
+        span = (high - low) or 1
+        for tag in tags:
+            tag.level = 1 + int((math.log(tag.resource_count) - low) / span * (TAG_CLOUD_LEVELS - 1))
+        tags.sort(key=lambda tag: tag.name)
+    tag_page(request, LIST_TAG)
+
+    return render(request, 'core/tag_cloud.html', {'tags': tags})
+
+
+@use_read_replica
+@require_GET
+def sitemap_index(request):
+    """站点地图索引"""
+    return HttpResponse(sitemap.render(request, sitemap.get_index()), content_type='application/xml')
+
+
+@use_read_replica
+@require_GET
+def sitemap_shard(request, shard):
+    """站点地图分片"""
+    if shard >= sitemap.shard_count():
+        raise Http404('站点地图不存在')
+    return HttpResponse(sitemap.render(request, sitemap.get_shard(shard)['xml']), content_type='application/xml')
+
+
+# 复制次数统计 API 视图
+@async_post_view(login=False, csrf_exempt=True)
+async def increase_copy_count(request, resource_id):
     """API接口：增加指定资源的复制次数"""
     try:
-        resource = Resource.objects.get(id=resource_id)
-        # 使用 F() 表达式避免并发问题，原子性地增加计数
-        resource.copy_count = F('copy_count') + 1
-        resource.save(update_fields=['copy_count'])
-
-        # 重新从数据库获取以得到更新后的计数值
-        resource.refresh_from_db()
+        # 使用 F() 表达式原子地增加计数并读回最新值
+        copy_count = await interactions.aincrease_copy_count(resource_id)
 
         return JsonResponse({
             'status': 'success',
             'message': '复制次数已更新',
-            'new_count': resource.copy_count
+            'new_count': copy_count
         })
     except Resource.DoesNotExist:
         return JsonResponse({
@@ -397,53 +489,40 @@ def increase_copy_count(request, resource_id):
             'message': f'服务器内部错误: {str(e)}'
         }, status=500)
 
-# def hot_resources(request):
-#     """热门资源排行榜"""
-#     # 获取排序参数
-#     sort_by = request.GET.get('sort', 'hot')  # 默认按热度排序
-#
-#     # 构建查询
-#     resources = Resource.objects.filter(is_approved=True)
-#
-#     if sort_by == 'newest':
-#         resources = resources.order_by('-created_at')
-#         sort_name = '最新资源'
-#     elif sort_by == 'views':
-#         resources = resources.order_by('-view_count')
-#         sort_name = '浏览最多'
-#     elif sort_by == 'likes':
-#         resources = resources.order_by('-like_count')
-#         sort_name = '点赞最多'
-#     elif sort_by == 'collects':
-#         resources = resources.order_by('-collect_count')
-#         sort_name = '收藏最多'
-#     elif sort_by == 'comments':
-#         resources = resources.order_by('-comment_count')
-#         sort_name = '评论最多'
-#     elif sort_by == 'copies':
-#         resources = resources.order_by('-copy_count')
-#         sort_name = '复制最多'
-#     else:  # 'hot' 热度排序（综合排序）
-#         # 热度算法：view_count*1 + like_count*3 + collect_count*5 + comment_count*2
-#         # 注意：由于Django不支持直接在查询中使用计算字段，我们先按时间排序，稍后在前端或另外处理
-#         resources = resources.order_by('-created_at')
-#         sort_name = '热门资源'
-#
-#     # 分页处理
-#     paginator = Paginator(resources, 20)  # 每页20个
-#     page = request.GET.get('page')
-#
-#     try:
-#         resources = paginator.page(page)
-#     except PageNotAnInteger:
-#         resources = paginator.page(1)
-#     except EmptyPage:
-#         resources = paginator.page(paginator.num_pages)
-#
-#     context = {
-#         'resources': resources,
-#         'sort_by': sort_by,
-#         'sort_name': sort_name,
-#         'total_count': paginator.count,
-#     }
-#     return render(request, 'core/hot_resources.html', context)
\ No newline at end of file
+# 排行榜排序参数：(排序列, 显示名称)，均为倒序
+HOT_SORTS = {
+    'hot': ('hot_score', '热门资源'),
+    'newest': ('created_at', '最新资源'),
+    'views': ('view_count', '浏览最多'),
+    'likes': ('like_count', '点赞最多'),
+    'collects': ('collect_count', '收藏最多'),
+    'comments': ('comment_count', '评论最多'),
+    'copies': ('copy_count', '复制最多'),
+}
+
+
+@use_read_replica
+@cache_anonymous_page(params=('sort',) + PAGE_PARAMS)
+def hot_resources(request):
+    """热门资源排行榜"""
+    # 获取排序参数，默认按热度排序
+    sort_by = request.GET.get('sort', 'hot')
+    if sort_by not in HOT_SORTS:
+        sort_by = 'hot'
+    order_field, sort_name = HOT_SORTS[sort_by]
+
+    # 热度分已预先计算并建有索引，直接按列排序
+    resources = Resource.objects.approved().for_cards()
+
+    # 游标分页，每页20个；与首页是同一批资源，共用缓存的总数
+    resources = paginate_keyset(request, resources, order_field, 'count:index', per_page=20,
+                                params={'sort': sort_by})
+    tag_page(request, LIST_TAG, *(resource_tag(resource.id) for resource in resources))
+
+    context = {
+        'resources': resources,
+        'sort_by': sort_by,
+        'sort_name': sort_name,
+        'total_count': resources.paginator.count,
+    }
+    return render(request, 'core/hot_resources.html', context)
@@ -0,0 +1,11 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'resource_share.settings')
+
+app = Celery('resource_share')
+
+# 读取 settings 中以 CELERY_ 开头的配置
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -98,6 +99,38 @@ DATABASES = {
     }
 }
 
+# 本地开发/测试：DB_ENGINE=sqlite 时使用 SQLite，并额外定义一个 replica 库。
+# replica 与主库是同一个文件，只用于测试读写分离：测试时两者各建一个测试库，测试分别写入数据，
+# 由 override_settings(DATABASE_REPLICAS=['replica']) 启用路由。
+# 测试库使用文件而不是内存库：内存库的共享缓存模式下并发写入直接报 “table is locked”，
+# 不会等待锁释放，并发测试无法模拟生产环境中排队等锁的行为。
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        alias: {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'TEST': {'NAME': BASE_DIR / f'test_{alias}.sqlite3'},
+        }
+        for alias in ('default', 'replica')
+    }
+
+# 只读副本：DB_REPLICA_HOSTS=host1,host2:3307（账号、库名与主库相同）
+# 只读页面的 GET 请求从副本读取，写操作后该客户端在 DB_REPLICA_STICKY_SECONDS 秒内回到主库读取
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, map(str.strip, os.getenv('DB_REPLICA_HOSTS', '').split(','))), 1):
+    _host, _, _port = _host.partition(':')
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        # 测试时副本直接指向主库的测试数据库
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -144,6 +177,9 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 上传文件一律分块写入临时文件，超过大小上限时跳过该文件并由表单报错，避免并发上传占用大量内存
+FILE_UPLOAD_HANDLERS = ['core.uploads.BoundedTemporaryFileUploadHandler']
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -152,3 +188,47 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # 自定义用户模型
 AUTH_USER_MODEL = 'accounts.CustomUser'
+
+
+# 缓存配置：设置了 REDIS_URL 时使用 Redis，否则退回本地内存缓存（开发/测试）
+# counters 用于浏览次数等写后缓冲计数，需要所有 worker 共享
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'counters': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'counters',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'counters': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'counters',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+
+
+# 站内搜索后端（进程内倒排索引）
+SEARCH_BACKEND = 'core.search.InvertedIndexBackend'
+
+
+# Celery 后台任务（截图派生图等），未配置消息队列时在当前进程中同步执行
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = TIME_ZONE
+
+
+# 相关资源推荐模型（词表、IDF、向量矩阵）的保存目录，由 rebuild_related_resources 命令生成
+RECOMMEND_DATA_DIR = os.getenv('RECOMMEND_DATA_DIR', os.path.join(BASE_DIR, 'var', 'recommend'))